@@ -0,0 +1,118 @@
+"""Benchmarks the Environment and Sample hot paths on synthetic BaseSpace data.
+
+Run with `python benchmarks/run.py`.  All data is generated locally (on a tmpfs when available)
+and no network access is needed.  Use --save to store the results as a baseline, and --compare to
+compare the results against a stored baseline.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from basespace_commons.environment import Environment
+from basespace_commons.sample import Sample
+from benchmarks import synthetic
+
+
+def measure(name: str, size: int, fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """ Times the given function (best of repeat), and measures its peak memory use. """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'name': name, 'size': size, 'seconds': min(seconds), 'peak_bytes': peak}
+
+
+def run(work_dir: Path, sizes: List[int], num_lanes: int, repeat: int) -> List[Dict[str, Any]]:
+    """ Runs all the benchmarks for each of the given sizes. """
+    results = []
+    for size in sizes:
+        for simple in [False, True]:
+            data = synthetic.sample_sheet(num_samples=size, simple=simple)
+            kind = 'csv' if simple else 'sheet'
+            results.append(measure(f'samples_from[{kind}]', size, lambda: Sample.samples_from(data=data, logging=False), repeat))
+            results.append(measure(f'iter_samples_from[{kind}]', size, lambda: sum(1 for _ in Sample.iter_samples_from(source=io.StringIO(data), logging=False)), repeat))
+
+        for basecalls in [True, False]:
+            layout = 'basecalls' if basecalls else 'flat'
+            root_dir = work_dir / f'{size}.{layout}'
+            root_dir.mkdir(parents=True)
+            app_session = synthetic.write_app_session(path=root_dir / 'AppSession.json', num_samples=size, num_padding_items=size)
+            synthetic.write_input_tree(root_dir=root_dir, num_samples=size, num_lanes=num_lanes, basecalls=basecalls)
+
+            if basecalls:
+                results.append(measure('from_json', size, lambda: Environment.from_json(app_session, root_dir=root_dir), repeat))
+                Environment.from_json(app_session, root_dir=root_dir, use_snapshot=True)
+                results.append(measure('from_json[snapshot]', size, lambda: Environment.from_json(app_session, root_dir=root_dir, use_snapshot=True), repeat))
+
+            env = Environment.from_json(app_session, root_dir=root_dir)
+            results.append(measure(f'input_sample_dir[{layout}]', size, lambda: [env.input_sample_dir(i) for i in range(env.num_samples())], repeat))
+            results.append(measure(f'input_sample_fastqs[{layout}]', size, lambda: [env.input_sample_fastqs(i) for i in range(env.num_samples())], repeat))
+            results.append(measure(f'all_input_fastqs[{layout}]', size, lambda: env.all_input_fastqs(), repeat))
+            results.append(measure(f'index_inputs[{layout}]', size, lambda: env.index_inputs(cache=False), repeat))
+            results.append(measure(f'input_sample_fastqs[{layout},indexed]', size, lambda: [env.input_sample_fastqs(i) for i in range(env.num_samples())], repeat))
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]]) -> None:
+    """ Prints the results relative to the baseline. """
+    expected = {(r['name'], r['size']): r for r in baseline}
+    print(f"{'benchmark':<45} {'size':>8} {'seconds':>10} {'baseline':>10} {'ratio':>7} {'peak MB':>8}")
+    for r in results:
+        b = expected.get((r['name'], r['size']))
+        base = f"{b['seconds']:10.4f}" if b else f"{'-':>10}"
+        ratio = f"{r['seconds'] / b['seconds']:7.2f}" if b and b['seconds'] > 0 else f"{'-':>7}"
+        print(f"{r['name']:<45} {r['size']:>8} {r['seconds']:10.4f} {base} {ratio} {r['peak_bytes'] / 2**20:8.2f}")
+
+
+def default_work_dir() -> Optional[str]:
+    """ Gets a directory on a tmpfs when one is available. """
+    return '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help='the numbers of samples')
+    parser.add_argument('--lanes', type=int, default=4, help='the number of lanes per sample')
+    parser.add_argument('--repeat', type=int, default=3, help='the number of times to time each benchmark')
+    parser.add_argument('--dir', type=Path, default=default_work_dir(), help='the directory in which to generate data')
+    parser.add_argument('--save', type=Path, help='save the results as a baseline to this path')
+    parser.add_argument('--compare', type=Path, help='compare the results to the baseline at this path')
+    args = parser.parse_args(argv)
+
+    work_dir = Path(tempfile.mkdtemp(prefix='basespace_commons.bench.', dir=args.dir))
+    try:
+        results = run(work_dir=work_dir, sizes=args.sizes, num_lanes=args.lanes, repeat=args.repeat)
+    finally:
+        shutil.rmtree(str(work_dir), ignore_errors=True)
+
+    baseline = []
+    if args.compare is not None:
+        with args.compare.open('r') as fh:
+            baseline = json.load(fh)
+    compare(results=results, baseline=baseline)
+
+    if args.save is not None:
+        with args.save.open('w') as fh:
+            json.dump(results, fh, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
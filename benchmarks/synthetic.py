@@ -0,0 +1,77 @@
+"""This module generates synthetic BaseSpace data for benchmarking.
+
+* AppSession.json files with N samples
+* Sample sheets with N rows
+* /data/input/samples trees with N samples x L lanes
+"""
+
+import json
+import itertools
+from typing import List, Tuple
+from pathlib import Path
+
+
+def sample_ids_and_names(num_samples: int) -> List[Tuple[str, str]]:
+    """ Gets the identifier and name for each of the given number of samples. """
+    return [(f'{100000 + i}', f'Sample-{i + 1}') for i in range(num_samples)]
+
+
+def barcodes(num_samples: int, length: int=8) -> List[str]:
+    """ Gets the given number of distinct barcodes of the given length. """
+    return [''.join(b) for b in itertools.islice(itertools.product('ACGT', repeat=length), num_samples)]
+
+
+def write_app_session(path: Path, num_samples: int, samples_key: str='Input.Samples', num_padding_items: int=0) -> Path:
+    """
+    Writes an AppSession.json with the given number of samples.  Additional App options may be
+    added to mimic the large Items arrays found in production.
+    """
+    if samples_key == 'Input.BioSamples':
+        samples = [{'Id': i, 'UserSampleId': n, 'Href': f'v2/biosamples/{i}'} for i, n in sample_ids_and_names(num_samples)]
+    else:
+        samples = [{'Id': i, 'Name': n, 'Href': f'v1pre3/samples/{i}'} for i, n in sample_ids_and_names(num_samples)]
+    items = [
+        {'Name': 'Input.project-id', 'Type': 'Project', 'Content': {'Id': '1234', 'Name': 'Project'}},
+        {'Name': samples_key, 'Type': 'Sample[]', 'Items': samples},
+    ]
+    items.extend({'Name': f'Input.option-{i}', 'Type': 'String', 'Content': 'x' * 64} for i in range(num_padding_items))
+    data = {
+        'Id': '5678',
+        'Name': 'Synthetic App Session',
+        'Properties': {'Items': items},
+        'References': [{'Rel': 'Input', 'Content': sample} for sample in samples]
+    }
+    with path.open('w') as fh:
+        json.dump(data, fh)
+    return path
+
+
+def sample_sheet(num_samples: int, simple: bool=False) -> str:
+    """ Gets the contents of an Illumina Experiment Manager Sample Sheet, or a simple CSV. """
+    lines = []
+    if not simple:
+        lines.extend(['[Header],,,,', 'IEMFileVersion,4,,,', 'Experiment Name,Synthetic,,,', ',,,,',
+                      '[Reads],,,,', '151,,,,', '151,,,,', ',,,,', '[Data],,,,'])
+    lines.append('Sample_ID,Sample_Name,Sample_Barcode,Sample_Project,Description')
+    for (sample_id, sample_name), barcode in zip(sample_ids_and_names(num_samples), barcodes(num_samples)):
+        lines.append(f'{sample_id},{sample_name},{barcode},Project,"A sample, with a comma"')
+    return '\n'.join(lines) + '\n'
+
+
+def write_input_tree(root_dir: Path, num_samples: int, num_lanes: int, basecalls: bool=True) -> List[Tuple[str, str]]:
+    """
+    Writes a /data/input/samples tree with the given number of samples and lanes, with empty
+    paired-end FASTQs.  If basecalls is True, FASTQs are placed in
+    <sample-id>/Data/Intensities/BaseCalls, otherwise directly in <sample-id>.  Returns the
+    identifier and name for each sample.
+    """
+    samples = sample_ids_and_names(num_samples)
+    for sample_num, (sample_id, sample_name) in enumerate(samples, start=1):
+        sample_dir = root_dir / 'input' / 'samples' / sample_id
+        if basecalls:
+            sample_dir = sample_dir / 'Data' / 'Intensities' / 'BaseCalls'
+        sample_dir.mkdir(parents=True, exist_ok=True)
+        for lane in range(1, num_lanes + 1):
+            for end in [1, 2]:
+                (sample_dir / f'{sample_name}_S{sample_num}_L{lane:03d}_R{end}_001.fastq.gz').touch()
+    return samples
@@ -21,6 +21,10 @@ setup(
     package_dir = {"basespace_commons" : "src/basespace_commons"},
     package_data = {},
     install_requires = [],
+    extras_require = {
+        "numpy" : ["numpy"],
+        "crc32c" : ["crc32c"],
+    },
     classifiers = [
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Developers",
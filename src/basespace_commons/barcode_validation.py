@@ -0,0 +1,156 @@
+"""This module implements validation of the sample barcodes in a sample sheet.
+
+* validate_barcodes checks that all sample barcodes are a minimum distance apart
+
+Requires numpy (install with the "numpy" extra).
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from basespace_commons.sample import Sample
+from basespace_commons.barcodes import BarcodeIndex
+
+
+class BarcodeCollision(NamedTuple):
+    """ A pair of samples, by index, whose barcodes are closer than the minimum distance. """
+    lane: Optional[str]
+    sample_idx1: int
+    sample_idx2: int
+    distance: int
+
+
+class BarcodeValidation(NamedTuple):
+    """ The result of validating sample barcodes. """
+    min_distance: int
+    collisions: List[BarcodeCollision]
+    sample_min_distances: List[Optional[int]]
+    lane_collisions: Dict[Optional[str], int]
+
+    def ok(self) -> bool:
+        """ True if no barcodes are closer than the minimum distance. """
+        return len(self.collisions) == 0
+
+
+# 2-bit codes for each base, with N (and anything else) being flagged separately
+_Codes = np.zeros(256, dtype=np.uint64)
+for _base, _code in zip(b'ACGT', range(4)):
+    _Codes[_base] = _code
+    _Codes[ord(chr(_base).lower())] = _code
+_IsNoCall = np.ones(256, dtype=bool)
+_IsNoCall[list(b'ACGTacgt')] = False
+
+# The low bit of each 2-bit slot in a 64-bit word
+_LowBits = np.uint64(0x5555555555555555)
+
+# The number of set bits in each byte, for numpy versions without bitwise_count
+_PopCounts = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def pack_barcodes(barcodes: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Packs barcodes of equal length into 2 bits per base, 32 bases per 64-bit word.  Returns the
+    packed bases and a mask with the low bit of each base's 2-bit slot set for no-calls (N), each
+    with shape (number of barcodes, number of words).
+    """
+    length = len(barcodes[0]) if len(barcodes) > 0 else 0
+    num_words = max(1, (length + 31) // 32)
+    raw = np.frombuffer(''.join(barcodes).encode('ascii'), dtype=np.uint8).reshape(len(barcodes), length)
+
+    padded = np.zeros((len(barcodes), num_words * 32), dtype=np.uint8)
+    padded[:, :length] = raw
+    codes = _Codes[padded].reshape(len(barcodes), num_words, 32)
+    no_calls = _IsNoCall[padded].astype(np.uint64)
+    no_calls[:, length:] = 0
+    no_calls = no_calls.reshape(len(barcodes), num_words, 32)
+
+    shifts = (np.arange(32, dtype=np.uint64) * np.uint64(2))
+    packed = np.bitwise_or.reduce(codes << shifts, axis=2)
+    masks = np.bitwise_or.reduce(no_calls << shifts, axis=2)
+    return packed, masks
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    """ Counts the set bits in each 64-bit word. """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words)
+    return _PopCounts[words.view(np.uint8)].reshape(words.shape + (8,)).sum(axis=-1)
+
+
+def _distances(packed1: np.ndarray, masks1: np.ndarray, packed2: np.ndarray, masks2: np.ndarray) -> np.ndarray:
+    """ Computes the matrix of Hamming distances between two blocks of packed barcodes. """
+    xor = packed1[:, None, :] ^ packed2[None, :, :]
+    mismatches = (xor | (xor >> np.uint64(1))) & _LowBits
+    mismatches |= masks1[:, None, :] | masks2[None, :, :]
+    return _popcount(mismatches).sum(axis=-1, dtype=np.int64)
+
+
+def validate_barcodes(samples: Sequence[Sample],
+                      min_distance: int,
+                      sample_barcode_column: Optional[str]=None,
+                      lane_column: Optional[str]='lane',
+                      block_size: int=2048) -> BarcodeValidation:
+    """
+    Validates that the barcodes of every pair of samples are at least the given number of
+    mismatches apart.  Samples are only compared to other samples in the same lane when the lane
+    column is present.  A no-call (N) mismatches every base, including another no-call.  Dual-index
+    barcodes are compared over the concatenation of their indexes.
+
+    The barcodes are 2-bit packed, and the pairwise distances computed in blocks of at most
+    block_size x block_size samples, so memory use is bounded regardless of the number of samples.
+    """
+    assert block_size > 0, f"block_size must be greater than zero, was {block_size}"
+    if sample_barcode_column is None and len(samples) > 0:
+        sample_barcode_column = samples[0].table().sample_barcode_column()
+    assert len(samples) == 0 or sample_barcode_column, "sample_barcode_column must be provided"
+
+    # Group the samples by lane
+    lanes: Dict[Optional[str], List[int]] = {}
+    for sample_idx, sample in enumerate(samples):
+        try:
+            lane = None if lane_column is None else sample.get(lane_column)
+        except KeyError:
+            lane = None
+        lanes.setdefault(lane, []).append(sample_idx)
+
+    collisions: List[BarcodeCollision] = []
+    sample_min_distances: List[Optional[int]] = [None] * len(samples)
+    lane_collisions: Dict[Optional[str], int] = {}
+
+    for lane, sample_indexes in lanes.items():
+        barcodes = [''.join(BarcodeIndex.split(samples[i].get(sample_barcode_column.lower()))) for i in sample_indexes]
+        if len(set(len(b) for b in barcodes)) > 1:
+            raise Exception(f"Found barcodes of different lengths in lane '{lane}': " + ', '.join(sorted(set(str(len(b)) for b in barcodes))))
+        packed, masks = pack_barcodes(barcodes)
+        min_distances = np.full(len(barcodes), np.iinfo(np.int64).max, dtype=np.int64)
+        num_collisions = 0
+
+        for start1 in range(0, len(barcodes), block_size):
+            end1 = min(start1 + block_size, len(barcodes))
+            for start2 in range(start1, len(barcodes), block_size):
+                end2 = min(start2 + block_size, len(barcodes))
+                distances = _distances(packed[start1:end1], masks[start1:end1], packed[start2:end2], masks[start2:end2])
+                if start1 == start2:
+                    # ignore each sample compared to itself, and each pair twice
+                    distances[np.tril_indices(end1 - start1)] = np.iinfo(np.int64).max
+                min_distances[start1:end1] = np.minimum(min_distances[start1:end1], distances.min(axis=1))
+                min_distances[start2:end2] = np.minimum(min_distances[start2:end2], distances.min(axis=0))
+                for i, j in zip(*np.nonzero(distances < min_distance)):
+                    collisions.append(BarcodeCollision(
+                            lane        = lane,
+                            sample_idx1 = sample_indexes[start1 + int(i)],
+                            sample_idx2 = sample_indexes[start2 + int(j)],
+                            distance    = int(distances[i, j])
+                            ))
+                    num_collisions += 1
+
+        for i, distance in zip(sample_indexes, min_distances):
+            if distance != np.iinfo(np.int64).max:
+                sample_min_distances[i] = int(distance)
+        lane_collisions[lane] = num_collisions
+
+    return BarcodeValidation(
+            min_distance         = min_distance,
+            collisions           = collisions,
+            sample_min_distances = sample_min_distances,
+            lane_collisions      = lane_collisions
+            )
@@ -0,0 +1,132 @@
+"""This module implements sample barcode lookups.
+
+* BarcodeIndex maps observed barcodes to samples, tolerating mismatches
+"""
+
+import re
+import itertools
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from basespace_commons.sample import Sample
+
+
+class BarcodeMatch(NamedTuple):
+    """ The result of looking up an observed barcode. """
+    status: str
+    sample: Optional[Sample]
+    mismatches: Optional[int]
+
+
+class BarcodeIndex(object):
+    """
+    Maps observed barcodes to samples in constant time per lookup.
+
+    The Hamming neighbourhood (all barcodes within the maximum number of mismatches) of each
+    sample's expected barcode is precomputed into a hash table.  An observed barcode within the
+    maximum number of mismatches of a single sample is matched to that sample, unless it is equally
+    close to another sample, in which case it is ambiguous.  An observed no-call (N) counts as a
+    mismatch.
+
+    Dual-index barcodes (ex. "ACGT-TTGA" or "ACGT+TTGA") are split into their indexes, with the
+    maximum number of mismatches applied to each index separately.  Observed barcodes may be given
+    with or without the delimiter between indexes.
+    """
+
+    Matched = 'matched'
+    Ambiguous = 'ambiguous'
+    Unmatched = 'unmatched'
+
+    Bases = 'ACGTN'
+
+    # The delimiters between the indexes of a dual-index barcode
+    __Delimiters = re.compile('[-+]')
+
+    # Values in the hash table are packed as (sample index << 8) | mismatches
+    __AmbiguousIndex = -1
+
+    def __init__(self, samples: Sequence[Sample], sample_barcode_column: Optional[str]=None, max_mismatches: int=1):
+        """
+        Builds the index for the given samples.  If sample_barcode_column is not given, the default
+        for the first sample (see Sample) is used.
+        """
+        assert 0 <= max_mismatches < 256, f"max_mismatches must be between 0 and 255, was {max_mismatches}"
+        if sample_barcode_column is None and len(samples) > 0:
+            sample_barcode_column = samples[0].table().sample_barcode_column()
+        assert len(samples) == 0 or sample_barcode_column, "sample_barcode_column must be provided"
+
+        self.__samples: List[Sample] = list(samples)
+        self.__max_mismatches: int = max_mismatches
+        self.__index_lengths: Optional[Tuple[int, ...]] = None
+        self.__table: Dict[str, int] = {}
+
+        for sample_idx, sample in enumerate(self.__samples):
+            indexes = BarcodeIndex.split(sample.get(sample_barcode_column.lower()))
+            lengths = tuple(len(index) for index in indexes)
+            if self.__index_lengths is None:
+                self.__index_lengths = lengths
+            elif self.__index_lengths != lengths:
+                raise Exception(f"Sample '{sample.sample_id()}' has barcode index lengths {lengths}, expected {self.__index_lengths}")
+            neighbourhoods = [list(BarcodeIndex.neighbours(index, max_mismatches)) for index in indexes]
+            for combination in itertools.product(*neighbourhoods):
+                barcode = ''.join(index for index, _ in combination)
+                mismatches = sum(m for _, m in combination)
+                self.__add(barcode=barcode, sample_idx=sample_idx, mismatches=mismatches)
+
+    def __add(self, barcode: str, sample_idx: int, mismatches: int) -> None:
+        """ Adds a barcode to the hash table, keeping the closest sample(s). """
+        existing = self.__table.get(barcode)
+        if existing is None or mismatches < (existing & 0xFF):
+            self.__table[barcode] = (sample_idx << 8) | mismatches
+        elif mismatches == (existing & 0xFF) and (existing >> 8) != sample_idx:
+            self.__table[barcode] = (BarcodeIndex.__AmbiguousIndex << 8) | mismatches
+
+    @staticmethod
+    def split(barcode: str) -> List[str]:
+        """ Splits a (dual-index) barcode into its upper-cased indexes. """
+        return BarcodeIndex.__Delimiters.split(barcode.upper())
+
+    @staticmethod
+    def neighbours(barcode: str, max_mismatches: int) -> Iterator[Tuple[str, int]]:
+        """
+        Yields every barcode within the given number of mismatches of the given barcode, along
+        with its number of mismatches.
+        """
+        yield (barcode, 0)
+        bases = list(barcode)
+        for num_mismatches in range(1, min(max_mismatches, len(barcode)) + 1):
+            for positions in itertools.combinations(range(len(barcode)), num_mismatches):
+                alternates = [[b for b in BarcodeIndex.Bases if b != barcode[p]] for p in positions]
+                for substitutions in itertools.product(*alternates):
+                    variant = list(bases)
+                    for p, b in zip(positions, substitutions):
+                        variant[p] = b
+                    yield (''.join(variant), num_mismatches)
+
+    def __len__(self) -> int:
+        """ The number of barcodes in the hash table. """
+        return len(self.__table)
+
+    def max_mismatches(self) -> int:
+        """ The maximum number of mismatches per index. """
+        return self.__max_mismatches
+
+    def samples(self) -> List[Sample]:
+        """ The samples in the index. """
+        return self.__samples
+
+    def lookup(self, barcode: str) -> BarcodeMatch:
+        """ Looks up the sample for the given observed barcode. """
+        value = self.__table.get(barcode)
+        if value is None:
+            normalized = ''.join(BarcodeIndex.split(barcode))
+            if normalized != barcode:
+                value = self.__table.get(normalized)
+        if value is None:
+            return BarcodeMatch(status=BarcodeIndex.Unmatched, sample=None, mismatches=None)
+        sample_idx = value >> 8
+        if sample_idx == BarcodeIndex.__AmbiguousIndex:
+            return BarcodeMatch(status=BarcodeIndex.Ambiguous, sample=None, mismatches=value & 0xFF)
+        return BarcodeMatch(status=BarcodeIndex.Matched, sample=self.__samples[sample_idx], mismatches=value & 0xFF)
+
+    def lookup_all(self, barcodes: Iterable[str]) -> Iterator[BarcodeMatch]:
+        """ Looks up the sample for each of the given observed barcodes. """
+        return (self.lookup(barcode) for barcode in barcodes)
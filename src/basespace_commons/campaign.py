@@ -0,0 +1,140 @@
+"""This module implements loading many AppSession.json files at once.
+
+* Campaign holds the environments for many app sessions, with their samples merged by sample id
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from pathlib import Path
+from collections import OrderedDict
+from basespace_commons.environment import Environment, EnvironmentDefaults, SampleFastqs
+
+
+class Campaign(object):
+    """
+    The environments for many app sessions (ex. a reprocessing campaign), with the samples across
+    all sessions merged by sample id, so that the input FASTQs for each unique sample are found
+    once no matter how many sessions contain it.
+
+    The merged samples are held in a single environment (see merged()), whose output project and
+    app result are those of the first session, and which should only be used to find inputs.  If
+    a sample id has different names across sessions, the first name is used.
+    """
+
+    def __init__(self, environments: 'OrderedDict[Path, Environment]', errors: Optional[Dict[Path, Exception]]=None, root_dir: Path=EnvironmentDefaults.DefaultRootDir):
+        """ Creates a new campaign from the environment for each session, by AppSession.json path. """
+        self.__environments: 'OrderedDict[Path, Environment]' = environments
+        self.__errors: Dict[Path, Exception] = errors if errors is not None else {}
+        self.__sessions_by_sample_id: 'OrderedDict[str, List[Path]]' = OrderedDict()
+        names: Dict[str, str] = {}
+        for path, env in environments.items():
+            for sample_name, sample_id in env.sample_names_and_ids():
+                names.setdefault(sample_id, sample_name)
+                sessions = self.__sessions_by_sample_id.setdefault(sample_id, [])
+                if not sessions or sessions[-1] != path:
+                    sessions.append(path)
+        first = next(iter(environments.values()), None)
+        sample_ids = list(self.__sessions_by_sample_id.keys())
+        self.__merged: Environment = Environment(
+                app_option_dict     = {},
+                sample_ids          = sample_ids,
+                sample_names        = [names[sample_id] for sample_id in sample_ids],
+                output_project_id   = '' if first is None else first.output_project_id(),
+                output_project_name = '' if first is None else first.output_project_name(),
+                app_result_name     = '' if first is None else first.app_result_name(),
+                root_dir            = root_dir if first is None else first.root_dir()
+                )
+        self.__sample_idx: Dict[str, int] = {sample_id: i for i, sample_id in enumerate(sample_ids)}
+        self.__fastqs: Optional[Dict[str, SampleFastqs]] = None
+
+    def __len__(self) -> int:
+        """ The number of sessions loaded. """
+        return len(self.__environments)
+
+    def environments(self) -> 'OrderedDict[Path, Environment]':
+        """ The environment for each session loaded, by AppSession.json path, in the order given. """
+        return self.__environments
+
+    def errors(self) -> Dict[Path, Exception]:
+        """ The error raised for each session that could not be loaded, by AppSession.json path. """
+        return self.__errors
+
+    def merged(self) -> Environment:
+        """ The environment with every unique sample across all sessions, for finding inputs. """
+        return self.__merged
+
+    def sample_ids(self) -> List[str]:
+        """ The unique sample ids, in order of first appearance. """
+        return list(self.__sessions_by_sample_id.keys())
+
+    def sessions(self, sample_id: str) -> List[Path]:
+        """ The AppSession.json paths for the sessions containing the given sample. """
+        return self.__sessions_by_sample_id.get(sample_id, [])
+
+    def index_inputs(self, cache: bool=True) -> None:
+        """ Indexes the input samples directory once for all sessions (see Environment.index_inputs()). """
+        self.__merged.index_inputs(cache=cache)
+
+    def input_sample_fastqs(self, sample_id: str) -> SampleFastqs:
+        """
+        Gets the input FASTQs for the sample with the given id, or the error raised finding them,
+        finding them for every unique sample on first use (see all_input_fastqs()).
+        """
+        return self.all_input_fastqs()[self.__sample_idx[sample_id]]
+
+    def all_input_fastqs(self, workers: int=EnvironmentDefaults.DefaultIoWorkers) -> List[SampleFastqs]:
+        """
+        Gets the input FASTQs for every unique sample (see Environment.all_input_fastqs()), in
+        order of sample id (see sample_ids()).  The FASTQs are found once, and reused thereafter.
+        """
+        if self.__fastqs is None:
+            self.__fastqs = {f.sample_id: f for f in self.__merged.all_input_fastqs(workers=workers)}
+        return [self.__fastqs[sample_id] for sample_id in self.__sessions_by_sample_id.keys()]
+
+    def session_input_fastqs(self, path: Path) -> List[SampleFastqs]:
+        """ Gets the input FASTQs for every sample in the given session, in the session's sample order. """
+        env = self.__environments[path]
+        fastqs = []
+        for sample_idx, (sample_name, sample_id) in enumerate(env.sample_names_and_ids()):
+            f = self.input_sample_fastqs(sample_id=sample_id)
+            fastqs.append(f._replace(sample_idx=sample_idx, sample_name=sample_name))
+        return fastqs
+
+    @staticmethod
+    def load(app_session_jsons: Iterable[Path],
+             root_dir: Path=EnvironmentDefaults.DefaultRootDir,
+             workers: int=EnvironmentDefaults.DefaultIoWorkers,
+             index: bool=False) -> 'Campaign':
+        """
+        Loads the given AppSession.json files (see Environment.from_json()).  The files are read and
+        parsed on a pool of at most the given number of threads, so that reads from slow storage
+        overlap.  Each file is small, so threads are used rather than processes, whose start-up and
+        pickling would cost more than the parsing.  A session that cannot be parsed does not stop
+        the others, but is instead recorded in errors().  If index is True, the input samples
+        directory is indexed once for all sessions (see index_inputs()).
+        """
+        assert workers > 0, f"workers must be greater than zero, was {workers}"
+        paths = list(app_session_jsons)
+        environments: 'OrderedDict[Path, Environment]' = OrderedDict()
+        errors: Dict[Path, Exception] = {}
+        if paths:
+            with ThreadPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+                futures: List[Tuple[Path, Future]] = [(path, executor.submit(Environment.from_json, path, root_dir)) for path in paths]
+                for path, future in futures:
+                    try:
+                        environments[path] = future.result()
+                    except Exception as e:
+                        errors[path] = e
+        campaign = Campaign(environments=environments, errors=errors, root_dir=root_dir)
+        if index:
+            campaign.index_inputs()
+        return campaign
+
+    @staticmethod
+    def load_dir(dir: Path,
+                 pattern: str='*.json',
+                 root_dir: Path=EnvironmentDefaults.DefaultRootDir,
+                 workers: int=EnvironmentDefaults.DefaultIoWorkers,
+                 index: bool=False) -> 'Campaign':
+        """ Loads the AppSession.json files in the given directory that match the given glob pattern, in sorted order.  See load(). """
+        return Campaign.load(app_session_jsons=sorted(dir.glob(pattern)), root_dir=root_dir, workers=workers, index=index)
@@ -0,0 +1,205 @@
+"""This module implements checksums of the files in the output project directory.
+
+* ChecksumManifest holds the MD5 and CRC32C of every file, rehashing only files that have changed
+
+The CRC32C checksums require the crc32c package (install with the "crc32c" extra), and are
+otherwise omitted.
+"""
+
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from pathlib import Path
+from basespace_commons.environment import Environment
+
+try:
+    import crc32c as _crc32c
+except ImportError:
+    _crc32c = None
+
+
+class FileChecksum(NamedTuple):
+    """ The checksums of a file, given by its path relative to the manifest's directory. """
+    path: str
+    size: int
+    mtime_ns: int
+    md5: str
+    crc32c: Optional[str]
+
+
+class ChecksumDefaults(object):
+
+    # The number of bytes to read at a time
+    BufferSize = 8 * 1024 * 1024
+
+    # The number of files to hash concurrently
+    Workers = 8
+
+    # The name of the persisted manifest in the temporary directory
+    ManifestFileName = 'basespace_commons.checksums.json'
+
+
+def checksum_file(path: Path, buffer_size: int=ChecksumDefaults.BufferSize) -> Tuple[str, Optional[str]]:
+    """
+    Computes the MD5 and CRC32C (or None if the crc32c package is not installed) of a file, as hex
+    strings, in a single pass.
+    """
+    md5 = hashlib.md5()
+    crc = 0
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(str(path), 'rb', buffering=0) as fh:
+        while True:
+            num_read = fh.readinto(buffer)
+            if not num_read:
+                break
+            md5.update(view[:num_read])
+            if _crc32c is not None:
+                crc = _crc32c.crc32c(view[:num_read], crc)
+    return md5.hexdigest(), None if _crc32c is None else f'{crc:08x}'
+
+
+class ChecksumManifest(object):
+    """
+    The checksums of every file under a directory (by default the output project directory; see
+    Environment.output_project_dir()), keyed by path relative to the directory.  A file's
+    checksums are reused from a previous manifest if its size and modification time are unchanged.
+    """
+
+    ManifestVersion = 1
+
+    def __init__(self, dir: Path, checksums: Optional[Dict[str, FileChecksum]]=None):
+        """ Creates a new manifest for the given directory with the given checksums. """
+        self.__dir: Path = dir
+        self.__checksums: Dict[str, FileChecksum] = checksums if checksums is not None else {}
+        self.__num_hashed: int = 0
+
+    def __len__(self) -> int:
+        return len(self.__checksums)
+
+    def __iter__(self) -> Iterator[FileChecksum]:
+        return iter(self.__checksums.values())
+
+    def dir(self) -> Path:
+        """ The directory containing the files. """
+        return self.__dir
+
+    def get(self, path: str) -> Optional[FileChecksum]:
+        """ Gets the checksums for the file with the given relative path, or None if not present. """
+        return self.__checksums.get(path)
+
+    def num_hashed(self) -> int:
+        """ The number of files hashed (rather than reused) by the last call to update(). """
+        return self.__num_hashed
+
+    @staticmethod
+    def __walk(dir: Path, exclude: Optional[Path]) -> Iterator[Tuple[str, os.stat_result]]:
+        """ Yields the relative path and stat of every file under the directory, in a single pass. """
+        exclude_str = None if exclude is None else str(exclude)
+        stack = [str(dir)]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.is_file() and entry.path != exclude_str:
+                    yield os.path.relpath(entry.path, str(dir)), entry.stat()
+
+    def update(self,
+               workers: int=ChecksumDefaults.Workers,
+               buffer_size: int=ChecksumDefaults.BufferSize,
+               exclude: Optional[Path]=None) -> int:
+        """
+        Walks the directory once, hashing (on a pool of at most the given number of threads) every
+        file that is new or whose size or modification time has changed, and removing any file that
+        no longer exists.  Files with checksums missing a CRC32C are rehashed if the crc32c package
+        is installed.  The given path (ex. the persisted manifest) is excluded.  Returns the number
+        of files hashed.
+        """
+        assert workers > 0, f"workers must be greater than zero, was {workers}"
+        checksums: Dict[str, FileChecksum] = {}
+        stale: List[Tuple[str, os.stat_result]] = []
+        for path, st in ChecksumManifest.__walk(dir=self.__dir, exclude=exclude):
+            existing = self.__checksums.get(path)
+            if (existing is not None and existing.size == st.st_size and existing.mtime_ns == st.st_mtime_ns
+                    and (existing.crc32c is not None or _crc32c is None)):
+                checksums[path] = existing
+            else:
+                stale.append((path, st))
+
+        def hash_file(path_and_stat: Tuple[str, os.stat_result]) -> FileChecksum:
+            path, st = path_and_stat
+            md5, crc = checksum_file(self.__dir / path, buffer_size=buffer_size)
+            return FileChecksum(path=path, size=st.st_size, mtime_ns=st.st_mtime_ns, md5=md5, crc32c=crc)
+
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(workers, len(stale))) as executor:
+                for checksum in executor.map(hash_file, stale):
+                    checksums[checksum.path] = checksum
+
+        self.__checksums = {path: checksums[path] for path in sorted(checksums.keys())}
+        self.__num_hashed = len(stale)
+        return self.__num_hashed
+
+    def save(self, path: Path) -> None:
+        """ Persists the manifest to the given path, atomically replacing any existing file. """
+        data = {
+            'version': ChecksumManifest.ManifestVersion,
+            'dir': str(self.__dir),
+            'files': [list(checksum) for checksum in self.__checksums.values()]
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        with tmp_path.open('w') as fh:
+            json.dump(data, fh)
+        os.replace(str(tmp_path), str(path))
+
+    @staticmethod
+    def load(path: Path, dir: Path) -> Optional['ChecksumManifest']:
+        """
+        Loads a persisted manifest for the given directory.  Returns None if the file does not
+        exist, cannot be read, or was built for a different directory.
+        """
+        try:
+            with path.open('r') as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != ChecksumManifest.ManifestVersion or data.get('dir') != str(dir):
+            return None
+        return ChecksumManifest(dir=dir, checksums={checksum[0]: FileChecksum(*checksum) for checksum in data['files']})
+
+    def write_md5sums(self, path: Path) -> None:
+        """ Writes the MD5s in the format read by `md5sum -c`, relative to the directory. """
+        with path.open('w') as fh:
+            for checksum in self.__checksums.values():
+                fh.write(f'{checksum.md5}  {checksum.path}\n')
+
+    @staticmethod
+    def build(env: Environment,
+              dir: Optional[Path]=None,
+              manifest_path: Optional[Path]=None,
+              workers: int=ChecksumDefaults.Workers,
+              buffer_size: int=ChecksumDefaults.BufferSize) -> 'ChecksumManifest':
+        """
+        Builds the manifest for the given directory, or the output project directory by default.
+        A previously persisted manifest at the given path, or <tmp-dir>/basespace_commons.checksums.json
+        by default, is loaded and updated (see update()), and the up-to-date manifest persisted
+        back to the path.
+        """
+        dir = dir if dir is not None else env.output_project_dir()
+        manifest_path = manifest_path if manifest_path is not None else env.tmp_dir() / ChecksumDefaults.ManifestFileName
+        manifest = ChecksumManifest.load(path=manifest_path, dir=dir)
+        if manifest is None:
+            manifest = ChecksumManifest(dir=dir)
+        num_hashed = manifest.update(workers=workers, buffer_size=buffer_size, exclude=manifest_path)
+        if num_hashed > 0 or not manifest_path.exists():
+            manifest.save(manifest_path)
+        return manifest
@@ -0,0 +1,203 @@
+"""This module implements writing the per-sample outputs of demultiplexing.
+
+* DemuxWriter writes BGZF-compressed FASTQ and BAM data for many samples, with a bounded number of
+  open files
+"""
+
+import zlib
+import struct
+from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+from collections import OrderedDict
+from basespace_commons.sample import Sample, SampleTable
+
+
+class DemuxWriterDefaults(object):
+
+    # The maximum number of output files open at once
+    MaxOpen = 128
+
+    # The number of bytes buffered for an output before it is compressed and written
+    BufferSize = 1024 * 1024
+
+    # The maximum number of bytes buffered across all outputs
+    MaxBuffered = 256 * 1024 * 1024
+
+    # The compression level
+    CompressLevel = 5
+
+
+# The maximum number of uncompressed bytes per BGZF block (as used by htslib)
+_BgzfBlockSize = 0xff00
+
+# The empty BGZF block that marks the end of a BGZF file
+BgzfEof = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+
+
+def bgzf_compress(data: bytes, compress_level: int=DemuxWriterDefaults.CompressLevel) -> bytes:
+    """ Compresses the data into BGZF blocks, without the end-of-file marker (see BgzfEof). """
+    blocks = []
+    for start in range(0, len(data), _BgzfBlockSize):
+        chunk = data[start:start + _BgzfBlockSize]
+        compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        deflated = compressor.compress(chunk) + compressor.flush()
+        blocks.append(b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00')
+        blocks.append(struct.pack('<H', 18 + len(deflated) + 8 - 1))
+        blocks.append(deflated)
+        blocks.append(struct.pack('<II', zlib.crc32(chunk) & 0xffffffff, len(chunk)))
+    return b''.join(blocks)
+
+
+class _Output(object):
+    """ The buffered data for, and the open handle (if any) to, an output file. """
+
+    __slots__ = ('path', 'buffer', 'buffered', 'handle', 'opened')
+
+    def __init__(self, path: Path):
+        self.path: Path = path
+        self.buffer: List[bytes] = []
+        self.buffered: int = 0
+        self.handle = None
+        self.opened: bool = False
+
+
+class DemuxWriter(object):
+    """
+    Writes the FASTQ and BAM outputs for many samples, at the paths given by Sample.fq() and
+    Sample.bam() in the given directory.
+
+    Data is buffered per output, and once an output's buffer is full, compressed into BGZF blocks
+    and written in a single write.  The buffers across all outputs are also capped, with the
+    largest buffers written first when the cap is reached.  At most max_open files are open at
+    once: when another is needed, the least recently used file is closed, and re-opened for
+    appending when next written (since BGZF blocks may be concatenated).  Each file is truncated
+    when first opened.
+
+    Data is written as given, so FASTQ data must be whole records and BAM data must be encoded.
+    On close(), all buffers are written and the BGZF end-of-file marker appended to every output.
+    The writer is not thread-safe, and may be used as a context manager, closing on exit.
+    """
+
+    def __init__(self,
+                 dir: Path,
+                 max_open: int=DemuxWriterDefaults.MaxOpen,
+                 buffer_size: int=DemuxWriterDefaults.BufferSize,
+                 max_buffered: int=DemuxWriterDefaults.MaxBuffered,
+                 compress_level: int=DemuxWriterDefaults.CompressLevel,
+                 illumina_naming: Optional[bool]=None,
+                 sample_barcode_column: Optional[str]=None):
+        """
+        Creates a new writer for outputs in the given directory.  See Sample.prefix() for
+        illumina_naming and sample_barcode_column.
+        """
+        assert max_open > 0, f"max_open must be greater than zero, was {max_open}"
+        assert buffer_size > 0, f"buffer_size must be greater than zero, was {buffer_size}"
+        self.__dir: Path = dir
+        self.__max_open: int = max_open
+        self.__buffer_size: int = buffer_size
+        self.__max_buffered: int = max_buffered
+        self.__compress_level: int = compress_level
+        self.__illumina_naming: Optional[bool] = illumina_naming
+        self.__sample_barcode_column: Optional[str] = sample_barcode_column
+        self.__outputs: Dict[Tuple[SampleTable, int, bool, str], _Output] = {}
+        self.__by_path: Dict[str, _Output] = {}
+        self.__open: 'OrderedDict[str, _Output]' = OrderedDict()
+        self.__buffered: int = 0
+        self.__closed: bool = False
+
+    def __enter__(self) -> 'DemuxWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __output(self, sample: Sample, unmatched: bool, kind: str) -> _Output:
+        """ Gets the output of the given kind (R1, R2 or BAM) for the sample, resolving its path once. """
+        key = (sample.table(), sample.sample_ordinal(), unmatched, kind)
+        output = self.__outputs.get(key)
+        if output is None:
+            if kind == 'BAM':
+                path = sample.bam(dir=self.__dir, unmatched=unmatched, illumina_naming=self.__illumina_naming, sample_barcode_column=self.__sample_barcode_column)
+            else:
+                path = sample.fq(dir=self.__dir, end=int(kind[1]), unmatched=unmatched, illumina_naming=self.__illumina_naming, sample_barcode_column=self.__sample_barcode_column)
+            # NB: samples whose outputs share a prefix (see OutputLayout.collisions()) share a file
+            output = self.__by_path.get(str(path))
+            if output is None:
+                output = _Output(path=path)
+                self.__by_path[str(path)] = output
+            self.__outputs[key] = output
+        return output
+
+    def write_fq(self, sample: Sample, end: int, data: bytes, unmatched: bool=False) -> None:
+        """ Writes FASTQ records to the FASTQ for the given end of the sample (see Sample.fq()). """
+        assert 1 == end or 2 == end, f"end must be 1 or 2, was {end}"
+        self.__write(self.__output(sample=sample, unmatched=unmatched, kind=f'R{end}'), data)
+
+    def write_bam(self, sample: Sample, data: bytes, unmatched: bool=False) -> None:
+        """ Writes encoded BAM data to the BAM for the sample (see Sample.bam()). """
+        self.__write(self.__output(sample=sample, unmatched=unmatched, kind='BAM'), data)
+
+    def paths(self) -> List[Path]:
+        """ The paths to all the outputs written to. """
+        return [output.path for output in self.__by_path.values()]
+
+    def num_open(self) -> int:
+        """ The number of files currently open. """
+        return len(self.__open)
+
+    def __write(self, output: _Output, data: bytes) -> None:
+        assert not self.__closed, "Cannot write to a closed DemuxWriter"
+        output.buffer.append(data)
+        output.buffered += len(data)
+        self.__buffered += len(data)
+        if output.buffered >= self.__buffer_size:
+            self.__flush(output)
+        while self.__buffered > self.__max_buffered:
+            self.__flush(max(self.__by_path.values(), key=lambda o: o.buffered))
+
+    def __flush(self, output: _Output) -> None:
+        """ Compresses and writes the output's buffered data, opening its file if necessary. """
+        if output.buffered == 0:
+            return
+        compressed = bgzf_compress(b''.join(output.buffer), compress_level=self.__compress_level)
+        self.__handle(output).write(compressed)
+        self.__buffered -= output.buffered
+        output.buffer = []
+        output.buffered = 0
+
+    def __handle(self, output: _Output):
+        """ Gets the open file for the output, closing the least recently used file if needed. """
+        key = str(output.path)
+        if output.handle is not None:
+            self.__open.move_to_end(key)
+            return output.handle
+        while len(self.__open) >= self.__max_open:
+            _, lru = self.__open.popitem(last=False)
+            lru.handle.close()
+            lru.handle = None
+        output.handle = output.path.open('ab' if output.opened else 'wb')
+        output.opened = True
+        self.__open[key] = output
+        return output.handle
+
+    def flush(self) -> None:
+        """ Writes all buffered data. """
+        for output in self.__by_path.values():
+            self.__flush(output)
+        for output in self.__open.values():
+            output.handle.flush()
+
+    def close(self) -> None:
+        """ Writes all buffered data, appends the BGZF end-of-file marker to every output, and closes all files. """
+        if self.__closed:
+            return
+        try:
+            for output in self.__by_path.values():
+                self.__flush(output)
+                self.__handle(output).write(BgzfEof)
+        finally:
+            self.__closed = True
+            for output in self.__open.values():
+                output.handle.close()
+                output.handle = None
+            self.__open.clear()
@@ -3,17 +3,43 @@
 * Environment container for the BaseSpace environment
 """
 
+import os
 import sys
 import json
-from typing import Any, Dict, Iterator, List, Tuple
+import pickle
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 from pathlib import Path
-from collections import MutableMapping, OrderedDict
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from basespace_commons import io_metrics
+from basespace_commons.fastq_names import group_fastqs, read_fastqs
+from basespace_commons.input_index import InputIndex
 
 
 class EnvironmentDefaults(object):
 
     DefaultRootDir = Path('/data')
 
+    # The name of the temporary directory within the root directory
+    TmpDirName = 'scratch'
+
+    # The number of threads to use when concurrently accessing the (network) file system
+    DefaultIoWorkers = 16
+
+
+class SampleFastqs(NamedTuple):
+    """ The input FASTQs for a sample, or the error raised when finding them. """
+    sample_idx: int
+    sample_name: str
+    sample_id: str
+    fastqs_r1: List[Path]
+    fastqs_r2: List[Path]
+    error: Optional[Exception]
+
+
 class Environment(MutableMapping):
     """ Contains information for the given BaseSpace Environment. """
 
@@ -35,6 +61,7 @@ class Environment(MutableMapping):
         self.__output_project_name = output_project_name
         self.__app_result_name = app_result_name
         self.__root_dir = root_dir
+        self.__input_index: Optional[InputIndex] = None
 
     def __getitem__(self, key: str) -> str:
         return self.__app_option_dict[key]
@@ -61,6 +88,10 @@ class Environment(MutableMapping):
         """ Gets a the name and id foreach sample. """
         return list(zip(self.__sample_names, self.__sample_ids))
 
+    def sample_name_and_id(self, sample_idx: int) -> Tuple[str, str]:
+        """ Gets the name and id for the ith sample. """
+        return (self.__sample_names[sample_idx], self.__sample_ids[sample_idx])
+
     def output_project_id(self) -> str:
         """ The output project identifier. """
         return self.__output_project_id
@@ -85,67 +116,222 @@ class Environment(MutableMapping):
         """ The path to the output directory for the given sample. """
         return self.output_project_dir() / sample_name
 
+    def make_output_sample_dirs(self, sample_names: Iterable[str]) -> List[Path]:
+        """
+        Creates the output directory for each of the given samples, if it does not already exist.
+        Duplicate sample names are ignored, and the output project directory is listed once so that
+        only missing directories are created.  Returns the directories in order of first appearance.
+        """
+        fs = io_metrics.filesystem.bind(operation='make_output_sample_dirs')
+        project_dir = self.output_project_dir()
+        fs.mkdir(project_dir, parents=True, exist_ok=True)
+        existing = set(entry.name for entry in fs.scandir(project_dir) if entry.is_dir())
+        sample_dirs = []
+        seen = set()
+        for sample_name in sample_names:
+            if sample_name in seen:
+                continue
+            seen.add(sample_name)
+            sample_dir = self.output_sample_dir(sample_name)
+            if sample_name not in existing:
+                fs.bind(operation='make_output_sample_dirs', sample=sample_name).mkdir(sample_dir, exist_ok=True)
+            sample_dirs.append(sample_dir)
+        return sample_dirs
+
     def tmp_dir(self) -> Path:
         """ The temporary directory to use for all analyses. """
-        return self.root_dir() / 'scratch'
+        return self.root_dir() / EnvironmentDefaults.TmpDirName
 
     def num_samples(self) -> int:
         """ Gets the number of samples. """
         return len(self.__sample_names)
 
+    def input_samples_dir(self) -> Path:
+        """ The path to the directory containing the input directory for each sample. """
+        return self.root_dir() / 'input' / 'samples'
+
+    def index_inputs(self, cache: bool=True) -> InputIndex:
+        """
+        Indexes the input samples directory in a single pass, after which input_sample_dir() and
+        input_sample_fastqs() are served from memory.  If cache is True, the index is persisted
+        under tmp_dir(), and a previously persisted index is revalidated rather than rebuilt, such
+        that only samples whose directories have changed are re-scanned.  Call this method again to
+        pick up any changes to the input samples directory.
+        """
+        cache_path = self.tmp_dir() / InputIndex.CacheFileName if cache else None
+        self.__input_index = InputIndex.build(samples_dir=self.input_samples_dir(), cache_path=cache_path)
+        return self.__input_index
+
     def input_sample_dir(self, sample_idx: int, try_alternate: bool=True) -> Path:
         """ Gets the path to the sample input directory containing the sample's FASTQ(s). """
         if len(self.__sample_ids) <= sample_idx or sample_idx < 0:
             raise Exception(f"Sample index '{sample_idx}' out of range (found {len(self.__sample_ids)} samples).")
         paths_tried = []
-        path = self.root_dir() / 'input' / 'samples' / self.__sample_ids[sample_idx] / 'Data' / 'Intensities' / 'BaseCalls'
+        path = self.input_samples_dir() / self.__sample_ids[sample_idx] / 'Data' / 'Intensities' / 'BaseCalls'
         paths_tried.append(path)
-        if (not path.exists() or not path.is_dir()) and try_alternate:
-            path = self.root_dir() / 'input' / 'samples' / self.__sample_ids[sample_idx]
-            paths_tried.append(path)
-        if not path.is_dir():
-            raise Exception(f"Could not sample input directory for sample idx '{sample_idx}', tried paths:\n" + '\n'.join(['\t' + str(p) for p in paths_tried]))
+        if self.__input_index is not None:
+            if try_alternate:
+                paths_tried.append(self.input_samples_dir() / self.__sample_ids[sample_idx])
+            path = self.__input_index.input_dir(sample_id=self.__sample_ids[sample_idx], try_alternate=try_alternate)
+            if path is not None:
+                return path
         else:
-            return path.resolve()
+            fs = io_metrics.filesystem.bind(operation='input_sample_dir', sample=self.__sample_names[sample_idx])
+            if (not fs.exists(path) or not fs.is_dir(path)) and try_alternate:
+                path = self.input_samples_dir() / self.__sample_ids[sample_idx]
+                paths_tried.append(path)
+            if fs.is_dir(path):
+                return fs.resolve(path)
+        raise Exception(f"Could not sample input directory for sample idx '{sample_idx}', tried paths:\n" + '\n'.join(['\t' + str(p) for p in paths_tried]))
 
     def input_sample_fastqs(self, sample_idx: int) -> Tuple[List[Path], List[Path]]:
         """
-        Gets the input sample FASTQ(s) for the ith sample.
+        Gets the input sample FASTQ(s) for the ith sample, sorted by lane and then chunk.  The
+        FASTQs are those whose Illumina file name (see FastqName) has exactly the sample's name.  If
+        there are R2 FASTQs, each R1 FASTQ must have an R2 FASTQ for the same lane and chunk.
         """
         sample_dir = self.input_sample_dir(sample_idx=sample_idx, try_alternate=True)
 
         # NB: basespace has a problem with underscores in basespace, as they are replaced with dashes
         sample_name = self.__sample_names[sample_idx].replace('_', '-')
 
-        def get_fastqs(end: int) -> List[Path]:
-            suffix = self.fq_ext(end=end)
-            fastqs = [p.resolve() for p in sample_dir.iterdir() if p.name.endswith(suffix) and p.name.startswith(sample_name)]
-            return [p for p in fastqs if p.exists() and p.is_file()]
+        # List the directory once, with the indexed FASTQs being resolved files already
+        if self.__input_index is not None:
+            candidates = [(f.name, Path(f.path)) for f in self.__input_index.fastqs(sample_id=self.__sample_ids[sample_idx])]
+        else:
+            fs = io_metrics.filesystem.bind(operation='input_sample_fastqs', sample=self.__sample_names[sample_idx])
+            candidates = [(entry.name, Path(entry.path)) for entry in fs.scandir(sample_dir)]
+        lanes = group_fastqs(candidates).get(sample_name, {})
 
-        fastqs_r1 = get_fastqs(end=1)
-        fastqs_r2 = get_fastqs(end=2)
+        def get_fastqs(read: str) -> List[Tuple[Tuple[int, int], Path]]:
+            fastqs = read_fastqs(lanes=lanes, read=read)
+            if self.__input_index is not None:
+                return fastqs
+            fastqs = [(order, fs.resolve(p)) for order, p in fastqs]
+            return [(order, p) for order, p in fastqs if fs.exists(p) and fs.is_file(p)]
+
+        fastqs_r1 = get_fastqs(read='R1')
+        fastqs_r2 = get_fastqs(read='R2')
 
         if len(fastqs_r1) == 0:
-            raise Exception(f"No FASTQs found for R1 for sample '{sample_name}' in '{sample_dir}'.  Found:\n\t" + '\n\t'.join([f for f in sample_dir.iterdir() if f.is_file()]))
+            raise Exception(f"No FASTQs found for R1 for sample '{sample_name}' in '{sample_dir}'.  Found:\n\t" + '\n\t'.join([name for name, _ in candidates]))
         elif len(fastqs_r2) > 0 and len(fastqs_r1) != len(fastqs_r2):
             raise Exception(f"Mismatching # of fastqs for R1 ({len(fastqs_r1)}) and R2 ({len(fastqs_r2)})")
+        elif len(fastqs_r2) > 0 and [order for order, _ in fastqs_r1] != [order for order, _ in fastqs_r2]:
+            raise Exception(f"Mismatching lanes and chunks for R1 and R2 FASTQs for sample '{sample_name}' in '{sample_dir}'")
         else:
-            return (fastqs_r1, fastqs_r2)
+            return ([p for _, p in fastqs_r1], [p for _, p in fastqs_r2])
+
+    def __sample_fastqs(self, sample_idx: int) -> SampleFastqs:
+        """ Gets the input sample FASTQ(s) for the ith sample, capturing any error. """
+        try:
+            fastqs_r1, fastqs_r2 = self.input_sample_fastqs(sample_idx=sample_idx)
+            error = None
+        except Exception as e:
+            fastqs_r1, fastqs_r2 = [], []
+            error = e
+        return SampleFastqs(
+                sample_idx  = sample_idx,
+                sample_name = self.__sample_names[sample_idx],
+                sample_id   = self.__sample_ids[sample_idx],
+                fastqs_r1   = fastqs_r1,
+                fastqs_r2   = fastqs_r2,
+                error       = error
+                )
+
+    def all_input_fastqs(self, workers: int=EnvironmentDefaults.DefaultIoWorkers) -> List[SampleFastqs]:
+        """
+        Gets the input sample FASTQ(s) for every sample, in sample order.  The samples are
+        resolved concurrently on a pool of at most the given number of threads.  An error for one
+        sample does not stop the others, but is instead returned in the sample's `error` field.
+        """
+        assert workers > 0, f"workers must be greater than zero, was {workers}"
+        if self.num_samples() == 0:
+            return []
+        with ThreadPoolExecutor(max_workers=min(workers, self.num_samples())) as executor:
+            return list(executor.map(self.__sample_fastqs, range(self.num_samples())))
+
+    async def all_input_fastqs_async(self, workers: int=EnvironmentDefaults.DefaultIoWorkers) -> List[SampleFastqs]:
+        """ The asyncio equivalent of all_input_fastqs(). """
+        assert workers > 0, f"workers must be greater than zero, was {workers}"
+        if self.num_samples() == 0:
+            return []
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=min(workers, self.num_samples()))
+        try:
+            futures = [loop.run_in_executor(executor, self.__sample_fastqs, sample_idx) for sample_idx in range(self.num_samples())]
+            return list(await asyncio.gather(*futures))
+        finally:
+            # NB: do not block the event loop waiting for the threads to exit
+            executor.shutdown(wait=False)
+
+    def map_samples(self,
+                    fn: Callable[['Environment', 'SampleTask'], Any],
+                    workers: Optional[int]=None,
+                    backend: str='thread',
+                    retries: int=0,
+                    sample_indexes: Optional[Iterable[int]]=None) -> Iterator['SampleResult']:
+        """
+        Runs the given function for each sample in parallel, yielding the results as they finish.
+        See basespace_commons.parallel.map_samples().
+        """
+        from basespace_commons.parallel import map_samples
+        return map_samples(env=self, fn=fn, workers=workers, backend=backend, retries=retries, sample_indexes=sample_indexes)
+
+    def run_tracker(self, state_dir: Optional[Path]=None) -> 'RunTracker':
+        """
+        Gets a tracker of which steps are complete and up to date for each sample, for resuming
+        runs.  See basespace_commons.tracker.RunTracker.
+        """
+        from basespace_commons.tracker import RunTracker
+        return RunTracker(env=self, state_dir=state_dir)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Gets a small picklable snapshot of the environment, from which an equivalent environment
+        can be created with from_snapshot().  The input index (see index_inputs()) is not included.
+        """
+        return {
+            'app_option_dict'     : self.__app_option_dict,
+            'sample_ids'          : self.__sample_ids,
+            'sample_names'        : self.__sample_names,
+            'output_project_id'   : self.__output_project_id,
+            'output_project_name' : self.__output_project_name,
+            'app_result_name'     : self.__app_result_name,
+            'root_dir'            : self.__root_dir
+        }
 
     @staticmethod
-    def from_json(app_session_json: Path, root_dir: Path=EnvironmentDefaults.DefaultRootDir) -> 'Environment':
+    def from_snapshot(snapshot: Dict[str, Any]) -> 'Environment':
+        """ Creates an environment from a snapshot created by snapshot(). """
+        return Environment(**snapshot)
+
+    @staticmethod
+    def enable_io_metrics(dump_path: Optional[Path]=None) -> io_metrics.IoMetrics:
+        """
+        Enables counting and timing the file system calls made by all environments, by sample and
+        operation, returning the metrics.  If a path is given, the metrics are written to it as JSON
+        at exit.  See basespace_commons.io_metrics.
+        """
+        return io_metrics.enable(dump_path=dump_path)
+
+    @staticmethod
+    def parse_app_session(app_session_json: Path, root_dir: Path=EnvironmentDefaults.DefaultRootDir) -> Dict[str, Any]:
         """
         Will read in the AppSession.json, parse out the input user App options (Properties -> Items),
-        and configure the BaseSpace drive structure (i.e. environment).
+        and return a snapshot of the environment (see snapshot()).
         """
 
-        # Read in the AppSession.json
-        with app_session_json.open('r') as fh:
-            json_data = json.loads(''.join(fh.readlines()), object_pairs_hook=OrderedDict)
+        # Read in the AppSession.json, keeping only the App options and the App session name
+        fs = io_metrics.filesystem.bind(operation='parse_app_session')
+        json_data = json.loads(fs.read_bytes(app_session_json).decode('utf-8'))
+        app_options = json_data['Properties']['Items']
+        app_result_name = json_data['Name']
+        del json_data
 
         # Get the sub-set of the JSON that contains the App options given by the user
         app_option_dict = OrderedDict()
-        for app_option in json_data['Properties']['Items']:
+        for app_option in app_options:
             name = app_option['Name']
             if 'Content' in app_option:
                 value = app_option['Content']
@@ -170,12 +356,53 @@ class Environment(MutableMapping):
         else:
             raise Exception('Could not find either Input.BioSamples or Input.sample-id key: ' + ', '.join(app_option_dict.keys()))
 
-        return Environment(
-                app_option_dict     = app_option_dict,
-                sample_ids          = sample_ids,
-                sample_names        = sample_names,
-                output_project_id   = app_option_dict['Input.project-id']['Id'],
-                output_project_name = app_option_dict['Input.project-id']['Name'],
-                app_result_name     = json_data['Name'],
-                root_dir            = root_dir
-                )
+        return {
+            'app_option_dict'     : app_option_dict,
+            'sample_ids'          : sample_ids,
+            'sample_names'        : sample_names,
+            'output_project_id'   : app_option_dict['Input.project-id']['Id'],
+            'output_project_name' : app_option_dict['Input.project-id']['Name'],
+            'app_result_name'     : app_result_name,
+            'root_dir'            : root_dir
+        }
+
+    @staticmethod
+    def from_json(app_session_json: Path, root_dir: Path=EnvironmentDefaults.DefaultRootDir, use_snapshot: bool=False) -> 'Environment':
+        """
+        Will read in the AppSession.json, parse out the input user App options (Properties -> Items),
+        and configure the BaseSpace drive structure (i.e. environment).
+
+        If use_snapshot is True, a binary snapshot of the environment is stored in the temporary
+        directory (see tmp_dir()), keyed by the path, size and modification time of the
+        AppSession.json, such that subsequent calls (ex. in worker processes) load the snapshot
+        rather than re-parsing the AppSession.json.
+        """
+        if not use_snapshot:
+            return Environment.from_snapshot(Environment.parse_app_session(app_session_json=app_session_json, root_dir=root_dir))
+
+        fs = io_metrics.filesystem.bind(operation='from_json')
+        path = fs.resolve(app_session_json)
+        stat = fs.stat(path)
+        key = (str(path), stat.st_size, stat.st_mtime_ns)
+        digest = hashlib.sha1(str(path).encode('utf-8')).hexdigest()
+        snapshot_path = root_dir / EnvironmentDefaults.TmpDirName / f'basespace_commons.app_session.{digest}.pickle'
+
+        # NB: the snapshot is only ever read from the local scratch directory that it is written to
+        try:
+            snapshot_key, snapshot = pickle.loads(fs.read_bytes(snapshot_path))
+            if snapshot_key == key:
+                snapshot['root_dir'] = root_dir
+                return Environment.from_snapshot(snapshot)
+        except Exception:
+            # a missing, stale, corrupt or foreign snapshot is a cache miss
+            pass
+
+        snapshot = Environment.parse_app_session(app_session_json=app_session_json, root_dir=root_dir)
+        try:
+            fs.mkdir(snapshot_path.parent, parents=True, exist_ok=True)
+            tmp_path = snapshot_path.with_name(f'.{snapshot_path.name}.{os.getpid()}.tmp')
+            fs.write_bytes(tmp_path, pickle.dumps((key, snapshot), protocol=pickle.HIGHEST_PROTOCOL))
+            fs.replace(tmp_path, snapshot_path)
+        except OSError:
+            pass
+        return Environment.from_snapshot(snapshot)
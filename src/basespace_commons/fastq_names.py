@@ -0,0 +1,78 @@
+"""This module implements parsing of Illumina FASTQ file names.
+
+* FastqName for the fields of a file name of the form <name>_S<number>_L<lane>_<read>_<chunk>.fastq.gz
+* group_fastqs groups FASTQs by sample name, lane, read and chunk
+"""
+
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from pathlib import Path
+
+
+class FastqName(NamedTuple):
+    """
+    The fields of an Illumina FASTQ file name.  The sample number and lane are None when not
+    present in the file name.  The read is one of R1, R2, I1 or I2.
+    """
+    name: str
+    sample_number: Optional[int]
+    lane: Optional[int]
+    read: str
+    chunk: int
+
+    @staticmethod
+    def parse(file_name: str) -> Optional['FastqName']:
+        """ Parses the given file name, returning None if not an Illumina FASTQ file name. """
+        match = _FastqNamePattern.match(file_name)
+        if match is None:
+            return None
+        number, lane = match.group('number'), match.group('lane')
+        return FastqName(
+                name          = match.group('name'),
+                sample_number = None if number is None else int(number),
+                lane          = None if lane is None else int(lane),
+                read          = match.group('read'),
+                chunk         = int(match.group('chunk'))
+                )
+
+    def order(self) -> Tuple[int, int]:
+        """ The key to sort FASTQs for the same sample and read by lane, then chunk. """
+        return (0 if self.lane is None else self.lane, self.chunk)
+
+
+_FastqNamePattern = re.compile(r'^(?P<name>.+?)(?:_S(?P<number>\d+))?(?:_L(?P<lane>\d{3}))?_(?P<read>[RI][12])_(?P<chunk>\d{3})\.fastq\.gz$')
+
+
+# The FASTQs for a sample, by lane (or None), then read (ex. R1), then chunk
+SampleFastqGroups = Dict[Optional[int], Dict[str, Dict[int, Path]]]
+
+
+def group_fastqs(fastqs: Iterable[Tuple[str, Path]]) -> Dict[str, SampleFastqGroups]:
+    """
+    Groups the given FASTQs, given as pairs of file name and path (ex. from a directory listing),
+    by sample name, then lane, then read, then chunk, in a single pass.  File names that are not
+    Illumina FASTQ file names are ignored.  The lanes for each sample are in sorted order.
+    """
+    groups: Dict[str, SampleFastqGroups] = {}
+    for file_name, path in fastqs:
+        fastq_name = FastqName.parse(file_name)
+        if fastq_name is None:
+            continue
+        lanes = groups.setdefault(fastq_name.name, {})
+        lanes.setdefault(fastq_name.lane, {}).setdefault(fastq_name.read, {})[fastq_name.chunk] = path
+    for name, lanes in groups.items():
+        groups[name] = {lane: lanes[lane] for lane in sorted(lanes.keys(), key=lambda lane: 0 if lane is None else lane)}
+    return groups
+
+
+def read_fastqs(lanes: SampleFastqGroups, read: str) -> List[Tuple[Tuple[int, int], Path]]:
+    """
+    Gets the FASTQs for the given read (ex. R1) across all lanes for a sample (see
+    group_fastqs()), sorted by lane and then chunk, each with its (lane, chunk) sort key.
+    """
+    fastqs = []
+    for lane, reads in lanes.items():
+        chunks = reads.get(read, {})
+        for chunk in sorted(chunks.keys()):
+            fastqs.append(((0 if lane is None else lane, chunk), chunks[chunk]))
+    return fastqs
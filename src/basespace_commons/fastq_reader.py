@@ -0,0 +1,134 @@
+"""This module implements reading the input FASTQs for a sample in batches of records.
+
+* read_batches reads a gzipped FASTQ in batches of records, decompressing on a background thread
+* sample_batches reads all the input FASTQs for a sample, both ends in lockstep, lane by lane
+
+Requires numpy (install with the "numpy" extra).
+"""
+
+import queue
+import threading
+from typing import Any, Iterator, NamedTuple, Optional
+from pathlib import Path
+import numpy as np
+from basespace_commons.environment import Environment
+from basespace_commons.fastq_stats import FastqStatsDefaults, line_batches
+
+
+class FastqBatch(NamedTuple):
+    """
+    A batch of FASTQ records, with the read names (the header lines without the leading '@'),
+    sequences, and qualities each stored in a numpy array of byte strings (dtype 'S').
+    """
+    names: np.ndarray
+    seqs: np.ndarray
+    quals: np.ndarray
+
+
+class SampleBatch(NamedTuple):
+    """ A batch of records from the R1 FASTQ, and the same records from the R2 FASTQ if paired. """
+    fastq_r1: Path
+    fastq_r2: Optional[Path]
+    r1: FastqBatch
+    r2: Optional[FastqBatch]
+
+
+class FastqReaderDefaults(object):
+
+    # The number of records per batch
+    BatchSize = 65536
+
+    # The number of compressed bytes to read at a time
+    BufferSize = FastqStatsDefaults.BufferSize
+
+    # The number of batches to decompress ahead of the consumer, per FASTQ
+    Prefetch = 4
+
+
+# Marks the end of the batches put on a queue by a background thread
+_End = object()
+
+
+def _put(out: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """ Puts the item on the queue, giving up (and returning False) if stop is set. """
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _produce(path: Path, batch_size: int, buffer_size: int, out: queue.Queue, stop: threading.Event) -> None:
+    """ Puts the batches of lines on the queue, followed by _End, or the error raised. """
+    try:
+        for lines in line_batches(path=path, batch_size=batch_size, buffer_size=buffer_size):
+            if not _put(out=out, item=lines, stop=stop):
+                return
+        _put(out=out, item=_End, stop=stop)
+    except BaseException as e:
+        _put(out=out, item=e, stop=stop)
+
+
+def read_batches(path: Path,
+                 batch_size: int=FastqReaderDefaults.BatchSize,
+                 buffer_size: int=FastqReaderDefaults.BufferSize,
+                 prefetch: int=FastqReaderDefaults.Prefetch) -> Iterator[FastqBatch]:
+    """
+    Reads a gzipped FASTQ, yielding batches of at most batch_size records.  The FASTQ is
+    decompressed and split into lines on a background thread, up to prefetch batches ahead.  The
+    background thread is stopped if the iterator is closed early.
+    """
+    assert batch_size > 0, f"batch_size must be greater than zero, was {batch_size}"
+    assert prefetch > 0, f"prefetch must be greater than zero, was {prefetch}"
+    out: queue.Queue = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    thread = threading.Thread(target=_produce, args=(path, batch_size, buffer_size, out, stop), daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = out.get()
+            if item is _End:
+                break
+            elif isinstance(item, BaseException):
+                raise item
+            yield FastqBatch(
+                    names = np.array([line[1:] for line in item[0::4]], dtype=np.bytes_),
+                    seqs  = np.array(item[1::4], dtype=np.bytes_),
+                    quals = np.array(item[3::4], dtype=np.bytes_)
+                    )
+    finally:
+        stop.set()
+        thread.join()
+
+
+def sample_batches(env: Environment,
+                   sample_idx: int,
+                   batch_size: int=FastqReaderDefaults.BatchSize,
+                   buffer_size: int=FastqReaderDefaults.BufferSize,
+                   prefetch: int=FastqReaderDefaults.Prefetch) -> Iterator[SampleBatch]:
+    """
+    Reads all the input FASTQs for the ith sample (see Environment.input_sample_fastqs()), lane
+    by lane, yielding batches of at most batch_size records.  For paired FASTQs, each batch holds
+    the same records from both ends, which are read in lockstep, each on its own background
+    thread (see read_batches()).  Raises an exception if a pair of FASTQs have different numbers
+    of records.
+    """
+    fastqs_r1, fastqs_r2 = env.input_sample_fastqs(sample_idx=sample_idx)
+    for i, fastq_r1 in enumerate(fastqs_r1):
+        fastq_r2 = fastqs_r2[i] if fastqs_r2 else None
+        batches_r1 = read_batches(path=fastq_r1, batch_size=batch_size, buffer_size=buffer_size, prefetch=prefetch)
+        batches_r2 = None if fastq_r2 is None else read_batches(path=fastq_r2, batch_size=batch_size, buffer_size=buffer_size, prefetch=prefetch)
+        try:
+            for r1 in batches_r1:
+                r2 = None if batches_r2 is None else next(batches_r2, None)
+                if batches_r2 is not None and (r2 is None or len(r2.names) != len(r1.names)):
+                    raise Exception(f"R2 FASTQ '{fastq_r2}' has fewer records than R1 FASTQ '{fastq_r1}'")
+                yield SampleBatch(fastq_r1=fastq_r1, fastq_r2=fastq_r2, r1=r1, r2=r2)
+            if batches_r2 is not None and next(batches_r2, None) is not None:
+                raise Exception(f"R2 FASTQ '{fastq_r2}' has more records than R1 FASTQ '{fastq_r1}'")
+        finally:
+            batches_r1.close()
+            if batches_r2 is not None:
+                batches_r2.close()
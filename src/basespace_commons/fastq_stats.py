@@ -0,0 +1,237 @@
+"""This module implements estimating the number of reads and bases in gzipped FASTQs.
+
+* estimate_fastq estimates from a few evenly spaced windows, without decompressing the whole file
+* count_fastq counts exactly, decompressing the whole file
+* sample_fastq_stats estimates or counts for all the input FASTQs for a sample
+* line_batches decompresses a FASTQ, yielding the lines of many records at a time
+"""
+
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+from pathlib import Path
+from basespace_commons.environment import Environment
+
+
+class FastqStats(NamedTuple):
+    """ The (estimated) number of reads and bases in a FASTQ. """
+    path: Path
+    file_size: int
+    reads: int
+    bases: int
+    exact: bool
+
+
+class SampleFastqStats(NamedTuple):
+    """ The (estimated) number of reads and bases across all the input FASTQs for a sample. """
+    sample_idx: int
+    sample_name: str
+    reads: int
+    bases: int
+    fastqs: List[FastqStats]
+
+
+class FastqStatsDefaults(object):
+
+    # The number of evenly spaced windows to decompress when estimating
+    NumWindows = 8
+
+    # The number of compressed bytes to read per window
+    WindowSize = 256 * 1024
+
+    # The number of compressed bytes to read at a time when counting exactly
+    BufferSize = 4 * 1024 * 1024
+
+
+# The magic bytes, and compression method (deflate), that start every gzip member (and BGZF block)
+_GzipMagic = b'\x1f\x8b\x08'
+
+
+def _inflate(data: bytes) -> Tuple[bytes, int]:
+    """
+    Decompresses as much as possible of the gzip members at the start of the given data, returning
+    the decompressed bytes and the number of compressed bytes consumed.  The last member may be
+    truncated.  Raises zlib.error if the data does not start with a valid gzip member.
+    """
+    chunks = []
+    consumed = 0
+    while consumed < len(data) and data.startswith(_GzipMagic, consumed):
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        try:
+            chunks.append(decompressor.decompress(data[consumed:]))
+        except zlib.error:
+            if consumed == 0:
+                raise
+            break
+        consumed = len(data) - len(decompressor.unused_data)
+        if not decompressor.eof:
+            break
+    if consumed == 0:
+        raise zlib.error("Data does not start with a gzip member")
+    return b''.join(chunks), consumed
+
+
+def _window(data: bytes, at_start: bool) -> Optional[Tuple[bytes, int]]:
+    """
+    Finds the first gzip member in the given data (or uses the start of the data if at_start is
+    True) and decompresses from there.  Returns None if no member could be decompressed.
+    """
+    offset = 0 if at_start else data.find(_GzipMagic)
+    while offset >= 0:
+        try:
+            uncompressed, consumed = _inflate(data[offset:])
+            if b'\n' in uncompressed:
+                return uncompressed, consumed
+        except zlib.error:
+            pass
+        if at_start:
+            return None
+        offset = data.find(_GzipMagic, offset + 1)
+    return None
+
+
+def _sequence_lengths(uncompressed: bytes, at_start: bool) -> List[int]:
+    """
+    Gets the lengths of the sequences of the complete FASTQ records in the given decompressed data,
+    which may start and end mid-record unless at_start is True.
+    """
+    lines = uncompressed.split(b'\n')[:-1]
+    if not at_start:
+        # drop the (possibly partial) first line, and find the start of a record
+        lines = lines[1:]
+        start = next((i for i in range(len(lines) - 3)
+                      if lines[i].startswith(b'@') and lines[i + 2].startswith(b'+') and len(lines[i + 1]) == len(lines[i + 3])), None)
+        if start is None:
+            return []
+        lines = lines[start:]
+    num_records = len(lines) // 4
+    return [len(line) for line in lines[1:num_records * 4:4]]
+
+
+def estimate_fastq(path: Path,
+                   num_windows: int=FastqStatsDefaults.NumWindows,
+                   window_size: int=FastqStatsDefaults.WindowSize) -> FastqStats:
+    """
+    Estimates the number of reads and bases in a gzipped FASTQ, by decompressing a few evenly
+    spaced windows.  The average number of compressed bytes per record, and the average sequence
+    length, in the windows are extrapolated to the size of the file.
+
+    Windows can only be decompressed from the start of a gzip member, so for a BGZF (or otherwise
+    multi-member) file every window is used, but for a single-member gzip file the same number of
+    bytes is instead decompressed from the start of the file.  Files no larger than the windows
+    combined are counted exactly.
+    """
+    assert num_windows > 0, f"num_windows must be greater than zero, was {num_windows}"
+    file_size = os.path.getsize(str(path))
+    if file_size <= num_windows * window_size:
+        return count_fastq(path=path)
+
+    windows: List[Tuple[bytes, int, bool]] = []
+    with open(str(path), 'rb') as fh:
+        for window in range(num_windows):
+            offset = (file_size - window_size) * window // max(1, num_windows - 1)
+            fh.seek(offset)
+            result = _window(data=fh.read(window_size), at_start=(offset == 0))
+            if result is not None:
+                windows.append(result + (offset == 0,))
+
+        # A single-member gzip file, so use all the windows' bytes from the start instead
+        if len(windows) == 1 and windows[0][2] and num_windows > 1:
+            fh.seek(0)
+            result = _window(data=fh.read(num_windows * window_size), at_start=True)
+            windows = [result + (True,)] if result is not None else []
+
+    total_consumed = sum(consumed for _, consumed, _ in windows)
+    total_newlines = sum(uncompressed.count(b'\n') for uncompressed, _, _ in windows)
+    lengths = [length for uncompressed, _, at_start in windows for length in _sequence_lengths(uncompressed=uncompressed, at_start=at_start)]
+
+    if total_consumed == 0:
+        raise Exception(f"Could not decompress any part of '{path}'")
+    reads = int(round(file_size * (total_newlines / 4) / total_consumed))
+    mean_length = sum(lengths) / len(lengths) if lengths else 0
+    return FastqStats(path=path, file_size=file_size, reads=reads, bases=int(round(reads * mean_length)), exact=False)
+
+
+def count_fastq(path: Path, buffer_size: int=FastqStatsDefaults.BufferSize) -> FastqStats:
+    """ Counts the number of reads and bases in a gzipped FASTQ, decompressing the whole file. """
+    num_lines = 0
+    bases = 0
+    for lines in _lines(path=path, buffer_size=buffer_size):
+        # the sequence is the second line of each record
+        bases += sum(map(len, lines[(1 - num_lines) % 4::4]))
+        num_lines += len(lines)
+    return FastqStats(path=path, file_size=os.path.getsize(str(path)), reads=(num_lines + 3) // 4, bases=bases, exact=True)
+
+
+def sample_fastq_stats(env: Environment, sample_idx: int, exact: bool=False, workers: int=4) -> SampleFastqStats:
+    """
+    Estimates (or counts, if exact is True) the number of reads and bases in all the input FASTQs
+    for the ith sample (see Environment.input_sample_fastqs()).  The reads and bases are summed
+    across all FASTQs, including both ends.  The FASTQs are processed concurrently on a pool of at
+    most the given number of threads.
+    """
+    assert workers > 0, f"workers must be greater than zero, was {workers}"
+    fastqs_r1, fastqs_r2 = env.input_sample_fastqs(sample_idx=sample_idx)
+    fastqs = fastqs_r1 + fastqs_r2
+    fn = count_fastq if exact else estimate_fastq
+    with ThreadPoolExecutor(max_workers=min(workers, len(fastqs))) as executor:
+        stats = list(executor.map(fn, fastqs))
+    return SampleFastqStats(
+            sample_idx  = sample_idx,
+            sample_name = env.sample_name_and_id(sample_idx)[0],
+            reads       = sum(s.reads for s in stats),
+            bases       = sum(s.bases for s in stats),
+            fastqs      = stats
+            )
+
+
+def _lines(path: Path, buffer_size: int=FastqStatsDefaults.BufferSize) -> Iterator[List[bytes]]:
+    """
+    Decompresses a gzipped (possibly multi-member) file, yielding its lines (without newlines) as
+    each chunk is decompressed.  A last line without a trailing newline is yielded last.  Raises an
+    exception if the last gzip member is truncated.
+    """
+    partial = b''
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    # True once the current member has consumed input, so a truncated last member can be detected
+    in_member = False
+    with open(str(path), 'rb') as fh:
+        while True:
+            data = fh.read(buffer_size)
+            if not data:
+                break
+            while data:
+                chunk = decompressor.decompress(data)
+                data = decompressor.unused_data
+                in_member = True
+                if decompressor.eof:
+                    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                    in_member = False
+                if not chunk:
+                    continue
+                lines = (partial + chunk).split(b'\n')
+                partial = lines.pop()
+                yield lines
+    if in_member:
+        raise Exception(f"Truncated gzip data at the end of '{path}'")
+    if partial:
+        yield [partial]
+
+
+def line_batches(path: Path, batch_size: int, buffer_size: int=FastqStatsDefaults.BufferSize) -> Iterator[List[bytes]]:
+    """
+    Decompresses a gzipped FASTQ, yielding the lines of batch_size records at a time (fewer for
+    the last batch).  Raises an exception if the last record is truncated.
+    """
+    num_lines = 4 * batch_size
+    lines: List[bytes] = []
+    for new_lines in _lines(path=path, buffer_size=buffer_size):
+        lines.extend(new_lines)
+        while len(lines) >= num_lines:
+            yield lines[:num_lines]
+            del lines[:num_lines]
+    if len(lines) % 4 != 0:
+        raise Exception(f"Truncated FASTQ record at the end of '{path}'")
+    if lines:
+        yield lines
@@ -0,0 +1,251 @@
+"""This module implements an index of the BaseSpace input samples directory.
+
+* InputIndex caches the layout of <root_dir>/input/samples, and can be persisted and revalidated
+"""
+
+import os
+import json
+import stat
+from typing import Dict, List, NamedTuple, Optional
+from pathlib import Path
+
+
+class IndexedFastq(NamedTuple):
+    """ A FASTQ found in a sample input directory. """
+    name: str
+    path: str
+    size: int
+    mtime_ns: int
+
+
+class IndexedSample(NamedTuple):
+    """ The input directory layout for a single sample. """
+    sample_id: str
+    sample_dir: str
+    basecalls_dir: Optional[str]
+    dir_mtimes: Dict[str, int]
+    fastqs: List[IndexedFastq]
+
+
+class InputIndex(object):
+    """
+    An in-memory index of <root_dir>/input/samples.
+
+    For each sample directory, the index records the directory to use for the sample's FASTQs
+    (<sample-id>/Data/Intensities/BaseCalls if present, <sample-id> otherwise), along with the
+    name, resolved path, size and modification time of every FASTQ in that directory.  The
+    modification time of every directory visited is also recorded, so that a persisted index can
+    be revalidated by re-scanning only the samples whose directories have changed.
+
+    Note: the contents of a file being re-written in place does not change the modification time
+    of its directory, so sizes and modification times of existing FASTQs may be stale.
+    """
+
+    CacheFileName = 'basespace_commons.input_index.json'
+    CacheVersion = 1
+    FastqSuffix = '.fastq.gz'
+
+    def __init__(self, samples_dir: Path):
+        """ Creates a new, empty, index for the given input samples directory. """
+        self.__samples_dir: Path = samples_dir
+        self.__samples_dir_mtime: Optional[int] = None
+        self.__samples: Dict[str, IndexedSample] = {}
+
+    def samples_dir(self) -> Path:
+        """ The input samples directory that is indexed. """
+        return self.__samples_dir
+
+    def sample_ids(self) -> List[str]:
+        """ The identifiers of all the indexed samples. """
+        return list(self.__samples.keys())
+
+    def sample(self, sample_id: str) -> Optional[IndexedSample]:
+        """ Gets the indexed sample, or None if there is no directory for the sample. """
+        return self.__samples.get(sample_id)
+
+    def input_dir(self, sample_id: str, try_alternate: bool=True) -> Optional[Path]:
+        """
+        Gets the resolved input directory for the sample, with the same semantics as
+        Environment.input_sample_dir(), or None if no such directory exists.
+        """
+        sample = self.__samples.get(sample_id)
+        if sample is None:
+            return None
+        elif sample.basecalls_dir is not None:
+            return Path(sample.basecalls_dir)
+        elif try_alternate:
+            return Path(sample.sample_dir)
+        else:
+            return None
+
+    def fastqs(self, sample_id: str) -> List[IndexedFastq]:
+        """ Gets the FASTQs in the input directory for the sample, sorted by name. """
+        sample = self.__samples.get(sample_id)
+        return [] if sample is None else sample.fastqs
+
+    def scan(self) -> int:
+        """ Re-scans the entire input samples directory.  Returns the number of samples scanned. """
+        self.__samples = {}
+        return self.refresh()
+
+    def refresh(self) -> int:
+        """
+        Revalidates the index against the file system, re-scanning only those samples whose
+        directories were added, removed, or modified.  Returns the number of samples re-scanned or
+        removed.
+        """
+        try:
+            mtime = os.stat(self.__samples_dir).st_mtime_ns
+        except FileNotFoundError:
+            num_removed = len(self.__samples)
+            self.__samples_dir_mtime = None
+            self.__samples = {}
+            return num_removed
+
+        # Only list the samples directory if samples may have been added or removed
+        if mtime != self.__samples_dir_mtime or not self.__samples:
+            with os.scandir(self.__samples_dir) as it:
+                sample_ids = sorted(entry.name for entry in it if entry.is_dir())
+            num_removed = len(set(self.__samples.keys()).difference(sample_ids))
+            self.__samples = {sample_id: self.__samples[sample_id] for sample_id in sample_ids if sample_id in self.__samples}
+            stale = [sample_id for sample_id in sample_ids if sample_id not in self.__samples]
+            self.__samples_dir_mtime = mtime
+        else:
+            sample_ids = list(self.__samples.keys())
+            num_removed = 0
+            stale = []
+
+        stale.extend(sample_id for sample_id, sample in self.__samples.items() if not InputIndex.__is_current(sample))
+
+        for sample_id in stale:
+            sample = self.__scan_sample(sample_id)
+            if sample is None:
+                num_removed += 1
+                self.__samples.pop(sample_id, None)
+            else:
+                self.__samples[sample_id] = sample
+
+        # keep the samples in sorted order
+        self.__samples = {sample_id: self.__samples[sample_id] for sample_id in sample_ids if sample_id in self.__samples}
+        return len(stale) + num_removed
+
+    @staticmethod
+    def __is_current(sample: IndexedSample) -> bool:
+        """ True if none of the directories visited when scanning the sample have changed. """
+        for path, mtime in sample.dir_mtimes.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    return False
+            except FileNotFoundError:
+                return False
+        return True
+
+    def __scan_sample(self, sample_id: str) -> Optional[IndexedSample]:
+        """ Scans the directory for a single sample. """
+        dir_mtimes: Dict[str, int] = {}
+        sample_dir = os.path.join(str(self.__samples_dir), sample_id)
+
+        # Walk down <sample-id>/Data/Intensities/BaseCalls, recording every directory that exists
+        levels = [sample_dir]
+        for name in ['Data', 'Intensities', 'BaseCalls']:
+            levels.append(os.path.join(levels[-1], name))
+        for current in levels:
+            try:
+                st = os.stat(current)
+            except FileNotFoundError:
+                break
+            if not stat.S_ISDIR(st.st_mode):
+                break
+            dir_mtimes[current] = st.st_mtime_ns
+
+        if sample_dir not in dir_mtimes:
+            return None
+
+        # NB: only a BaseCalls directory if every level down to it exists
+        basecalls_dir = levels[-1] if all(level in dir_mtimes for level in levels) else None
+        input_dir = os.path.realpath(basecalls_dir if basecalls_dir is not None else sample_dir)
+
+        fastqs = []
+        with os.scandir(input_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(InputIndex.FastqSuffix) or not entry.is_file():
+                    continue
+                st = entry.stat()
+                path = os.path.realpath(entry.path) if entry.is_symlink() else os.path.join(input_dir, entry.name)
+                fastqs.append(IndexedFastq(name=entry.name, path=path, size=st.st_size, mtime_ns=st.st_mtime_ns))
+        fastqs.sort(key=lambda f: f.name)
+
+        return IndexedSample(
+                sample_id     = sample_id,
+                sample_dir    = os.path.realpath(sample_dir),
+                basecalls_dir = input_dir if basecalls_dir is not None else None,
+                dir_mtimes    = dir_mtimes,
+                fastqs        = fastqs
+                )
+
+    def save(self, path: Path) -> None:
+        """ Persists the index to the given path, atomically replacing any existing file. """
+        data = {
+            'version': InputIndex.CacheVersion,
+            'samples_dir': str(self.__samples_dir),
+            'samples_dir_mtime_ns': self.__samples_dir_mtime,
+            'samples': [
+                {
+                    'sample_id': sample.sample_id,
+                    'sample_dir': sample.sample_dir,
+                    'basecalls_dir': sample.basecalls_dir,
+                    'dir_mtimes': sample.dir_mtimes,
+                    'fastqs': [list(fastq) for fastq in sample.fastqs]
+                }
+                for sample in self.__samples.values()
+            ]
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        with tmp_path.open('w') as fh:
+            json.dump(data, fh)
+        os.replace(str(tmp_path), str(path))
+
+    @staticmethod
+    def load(path: Path, samples_dir: Path) -> Optional['InputIndex']:
+        """
+        Loads a persisted index for the given input samples directory.  Returns None if the file
+        does not exist, cannot be read, or was built for a different directory.  The returned index
+        has not been revalidated; see refresh().
+        """
+        try:
+            with path.open('r') as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != InputIndex.CacheVersion or data.get('samples_dir') != str(samples_dir):
+            return None
+
+        index = InputIndex(samples_dir=samples_dir)
+        index.__samples_dir_mtime = data['samples_dir_mtime_ns']
+        for sample in data['samples']:
+            index.__samples[sample['sample_id']] = IndexedSample(
+                    sample_id     = sample['sample_id'],
+                    sample_dir    = sample['sample_dir'],
+                    basecalls_dir = sample['basecalls_dir'],
+                    dir_mtimes    = sample['dir_mtimes'],
+                    fastqs        = [IndexedFastq(*fastq) for fastq in sample['fastqs']]
+                    )
+        return index
+
+    @staticmethod
+    def build(samples_dir: Path, cache_path: Optional[Path]=None) -> 'InputIndex':
+        """
+        Builds an index of the given input samples directory.  If a cache path is given, a
+        previously persisted index is loaded and revalidated, and the up-to-date index is
+        persisted back to the cache path.
+        """
+        index = InputIndex.load(cache_path, samples_dir) if cache_path is not None else None
+        if index is None:
+            index = InputIndex(samples_dir=samples_dir)
+            num_scanned = index.scan()
+        else:
+            num_scanned = index.refresh()
+        if cache_path is not None and (num_scanned > 0 or not cache_path.exists()):
+            index.save(cache_path)
+        return index
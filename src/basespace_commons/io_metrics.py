@@ -0,0 +1,255 @@
+"""This module implements optional instrumentation of the file system calls made by Environment.
+
+* FileSystem performs the file system calls, and is a pass-through when instrumentation is disabled
+* IoMetrics counts and times the file system calls, by sample, operation and call
+* enable and disable turn instrumentation on and off
+
+Instrumentation may also be enabled by setting the BASESPACE_COMMONS_IO_METRICS environment variable
+to the path to which the metrics are written as JSON at exit.
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from pathlib import Path
+
+
+class IoStats(NamedTuple):
+    """ The number of file system calls and the total time spent in them. """
+    count: int
+    seconds: float
+
+
+class IoCallStats(NamedTuple):
+    """ The number of, and time spent in, a file system call for a sample within an operation. """
+    sample: Optional[str]
+    operation: str
+    call: str
+    count: int
+    seconds: float
+
+
+class IoMetrics(object):
+    """
+    Counts and times file system calls, keyed by sample (None if not sample-specific), operation
+    (ex. the Environment method), and call (ex. stat).  Safe to update from multiple threads.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__stats: Dict[Tuple[Optional[str], str, str], List[Any]] = {}
+
+    def record(self, sample: Optional[str], operation: str, call: str, seconds: float) -> None:
+        """ Records one file system call. """
+        key = (sample, operation, call)
+        with self.__lock:
+            stats = self.__stats.get(key)
+            if stats is None:
+                self.__stats[key] = [1, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+
+    def reset(self) -> None:
+        """ Removes all recorded calls. """
+        with self.__lock:
+            self.__stats.clear()
+
+    def calls(self) -> List[IoCallStats]:
+        """ The statistics for each sample, operation and call. """
+        with self.__lock:
+            items = [(key, tuple(stats)) for key, stats in self.__stats.items()]
+        items.sort(key=lambda item: ('' if item[0][0] is None else item[0][0], item[0][1], item[0][2]))
+        return [IoCallStats(sample=s, operation=o, call=c, count=count, seconds=seconds) for (s, o, c), (count, seconds) in items]
+
+    def total(self) -> IoStats:
+        """ The statistics across all calls. """
+        calls = self.calls()
+        return IoStats(count=sum(c.count for c in calls), seconds=sum(c.seconds for c in calls))
+
+    def by_sample(self) -> Dict[Optional[str], IoStats]:
+        """ The statistics for each sample. """
+        return IoMetrics.__group(self.calls(), lambda c: c.sample)
+
+    def by_operation(self) -> Dict[str, IoStats]:
+        """ The statistics for each operation. """
+        return IoMetrics.__group(self.calls(), lambda c: c.operation)
+
+    def by_call(self) -> Dict[str, IoStats]:
+        """ The statistics for each type of call. """
+        return IoMetrics.__group(self.calls(), lambda c: c.call)
+
+    @staticmethod
+    def __group(calls: List[IoCallStats], key: Any) -> Dict[Any, IoStats]:
+        groups: Dict[Any, IoStats] = {}
+        for c in calls:
+            stats = groups.get(key(c), IoStats(count=0, seconds=0.0))
+            groups[key(c)] = IoStats(count=stats.count + c.count, seconds=stats.seconds + c.seconds)
+        return groups
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ The statistics as a JSON-serializable dictionary. """
+        def to_dict(stats: IoStats) -> Dict[str, Any]:
+            return {'count': stats.count, 'seconds': stats.seconds}
+        return {
+            'total': to_dict(self.total()),
+            'by_operation': {operation: to_dict(stats) for operation, stats in self.by_operation().items()},
+            'by_call': {call: to_dict(stats) for call, stats in self.by_call().items()},
+            'by_sample': [dict(sample=sample, **to_dict(stats)) for sample, stats in self.by_sample().items()],
+            'calls': [c._asdict() for c in self.calls()]
+        }
+
+    def dump(self, path: Path) -> None:
+        """ Writes the statistics as JSON to the given path. """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        with tmp_path.open('w') as fh:
+            json.dump(self.to_dict(), fh, indent=2)
+        os.replace(str(tmp_path), str(path))
+
+
+class FileSystem(object):
+    """
+    Performs file system calls on behalf of Environment.  This implementation calls straight
+    through to pathlib/os, with bind() returning itself, so nothing is counted or timed.
+    """
+
+    def bind(self, operation: str, sample: Optional[str]=None) -> 'FileSystem':
+        """ Gets a file system that attributes its calls to the given operation and sample. """
+        return self
+
+    def exists(self, path: Path) -> bool:
+        return path.exists()
+
+    def is_dir(self, path: Path) -> bool:
+        return path.is_dir()
+
+    def is_file(self, path: Path) -> bool:
+        return path.is_file()
+
+    def resolve(self, path: Path) -> Path:
+        return path.resolve()
+
+    def stat(self, path: Path) -> os.stat_result:
+        return path.stat()
+
+    def scandir(self, path: Path) -> List[os.DirEntry]:
+        """ Lists the given directory. """
+        with os.scandir(str(path)) as it:
+            return list(it)
+
+    def mkdir(self, path: Path, parents: bool=False, exist_ok: bool=False) -> None:
+        path.mkdir(parents=parents, exist_ok=exist_ok)
+
+    def read_bytes(self, path: Path) -> bytes:
+        return path.read_bytes()
+
+    def write_bytes(self, path: Path, data: bytes) -> None:
+        path.write_bytes(data)
+
+    def replace(self, src: Path, dst: Path) -> None:
+        os.replace(str(src), str(dst))
+
+
+class _InstrumentedFileSystem(FileSystem):
+    """ Counts and times every file system call, attributing it to an operation and sample. """
+
+    def __init__(self, metrics: IoMetrics, operation: str='', sample: Optional[str]=None):
+        self.__metrics: IoMetrics = metrics
+        self.__operation: str = operation
+        self.__sample: Optional[str] = sample
+
+    def bind(self, operation: str, sample: Optional[str]=None) -> FileSystem:
+        return _InstrumentedFileSystem(metrics=self.__metrics, operation=operation, sample=sample)
+
+    def __timed(self, call: str, fn: Any, *args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.__metrics.record(sample=self.__sample, operation=self.__operation, call=call, seconds=time.perf_counter() - start)
+
+    def exists(self, path: Path) -> bool:
+        return self.__timed('exists', super().exists, path)
+
+    def is_dir(self, path: Path) -> bool:
+        return self.__timed('is_dir', super().is_dir, path)
+
+    def is_file(self, path: Path) -> bool:
+        return self.__timed('is_file', super().is_file, path)
+
+    def resolve(self, path: Path) -> Path:
+        return self.__timed('resolve', super().resolve, path)
+
+    def stat(self, path: Path) -> os.stat_result:
+        return self.__timed('stat', super().stat, path)
+
+    def scandir(self, path: Path) -> List[os.DirEntry]:
+        return self.__timed('scandir', super().scandir, path)
+
+    def mkdir(self, path: Path, parents: bool=False, exist_ok: bool=False) -> None:
+        return self.__timed('mkdir', super().mkdir, path, parents=parents, exist_ok=exist_ok)
+
+    def read_bytes(self, path: Path) -> bytes:
+        return self.__timed('read', super().read_bytes, path)
+
+    def write_bytes(self, path: Path, data: bytes) -> None:
+        return self.__timed('write', super().write_bytes, path, data)
+
+    def replace(self, src: Path, dst: Path) -> None:
+        return self.__timed('replace', super().replace, src, dst)
+
+
+# The environment variable that, if set, enables instrumentation and gives the path to dump to at exit
+EnvironmentVariable = 'BASESPACE_COMMONS_IO_METRICS'
+
+# The file system used by Environment, replaced when instrumentation is enabled
+filesystem: FileSystem = FileSystem()
+
+_metrics: Optional[IoMetrics] = None
+_dump_paths: List[Path] = []
+_dump_registered: bool = False
+
+
+def _dump_at_exit() -> None:
+    if _metrics is not None:
+        for path in _dump_paths:
+            _metrics.dump(path)
+
+
+def enable(dump_path: Optional[Path]=None) -> IoMetrics:
+    """
+    Enables instrumentation, returning the metrics being recorded.  If a path is given, the
+    metrics are written to it as JSON at exit.  Enabling when already enabled keeps the existing
+    metrics.
+    """
+    global filesystem, _metrics, _dump_registered
+    if _metrics is None:
+        _metrics = IoMetrics()
+        filesystem = _InstrumentedFileSystem(metrics=_metrics)
+    if dump_path is not None and dump_path not in _dump_paths:
+        if not _dump_registered:
+            atexit.register(_dump_at_exit)
+            _dump_registered = True
+        _dump_paths.append(dump_path)
+    return _metrics
+
+
+def disable() -> None:
+    """ Disables instrumentation, discarding the metrics, and any dump at exit. """
+    global filesystem, _metrics
+    filesystem = FileSystem()
+    _metrics = None
+    _dump_paths.clear()
+
+
+def metrics() -> Optional[IoMetrics]:
+    """ The metrics being recorded, or None if instrumentation is disabled. """
+    return _metrics
+
+
+if os.environ.get(EnvironmentVariable):
+    enable(dump_path=Path(os.environ[EnvironmentVariable]))
@@ -0,0 +1,152 @@
+"""This module implements merging the per-lane input FASTQs for a sample, without recompression.
+
+* concatenate concatenates files using kernel-side copies
+* merge_lanes merges the per-lane FASTQs for a sample into one FASTQ per read end
+* merge_all_lanes merges the per-lane FASTQs for every sample in parallel
+
+Concatenated gzip files are themselves valid gzip files, so the merged FASTQs are not decompressed
+and recompressed.
+"""
+
+import os
+import errno
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Sequence
+from pathlib import Path
+from basespace_commons.environment import Environment
+from basespace_commons.fastq_names import FastqName
+
+
+class MergedFastqs(NamedTuple):
+    """ The merged FASTQs for a sample, or the error raised when merging. """
+    sample_idx: int
+    sample_name: str
+    fastq_r1: Optional[Path]
+    fastq_r2: Optional[Path]
+    error: Optional[Exception]
+
+
+class MergeDefaults(object):
+
+    # The maximum number of bytes to copy per system call
+    BufferSize = 64 * 1024 * 1024
+
+    # The number of samples to merge concurrently
+    Workers = 4
+
+
+# The errors for which a kernel-side copy is not supported between two files
+_UnsupportedErrnos = set([errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSUP])
+
+
+def _copy(src_fd: int, dst_fd: int, size: int, buffer_size: int) -> None:
+    """
+    Appends the first size bytes of the source file to the destination file at its current
+    position, preferring copy_file_range, then sendfile, then a buffered read/write loop.
+    """
+    offset = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while offset < size:
+                copied = os.copy_file_range(src_fd, dst_fd, min(buffer_size, size - offset), offset)
+                if copied == 0:
+                    break
+                offset += copied
+        except OSError as e:
+            if e.errno not in _UnsupportedErrnos:
+                raise
+    if offset < size and hasattr(os, 'sendfile'):
+        try:
+            while offset < size:
+                copied = os.sendfile(dst_fd, src_fd, offset, min(buffer_size, size - offset))
+                if copied == 0:
+                    break
+                offset += copied
+        except OSError as e:
+            if e.errno not in _UnsupportedErrnos:
+                raise
+    if offset < size:
+        os.lseek(src_fd, offset, os.SEEK_SET)
+        while offset < size:
+            data = os.read(src_fd, min(buffer_size, size - offset))
+            if not data:
+                break
+            view = memoryview(data)
+            while view:
+                view = view[os.write(dst_fd, view):]
+            offset += len(data)
+    if offset < size:
+        raise Exception(f"Copied {offset} bytes but expected {size} bytes")
+
+
+def concatenate(sources: Sequence[Path], dest: Path, buffer_size: int=MergeDefaults.BufferSize) -> Path:
+    """
+    Concatenates the given files into the destination file, using kernel-side copies where
+    supported.  The destination is written to a temporary file and then atomically renamed.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest.with_name(f'.{dest.name}.{os.getpid()}.tmp')
+    dst_fd = os.open(str(tmp_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for source in sources:
+            src_fd = os.open(str(source), os.O_RDONLY)
+            try:
+                _copy(src_fd=src_fd, dst_fd=dst_fd, size=os.fstat(src_fd).st_size, buffer_size=buffer_size)
+            finally:
+                os.close(src_fd)
+    except BaseException:
+        os.close(dst_fd)
+        tmp_path.unlink()
+        raise
+    os.close(dst_fd)
+    os.replace(str(tmp_path), str(dest))
+    return dest
+
+
+def lane_order(fastqs: Sequence[Path]) -> List[Path]:
+    """ Sorts the given FASTQs by lane number and chunk (see FastqName), and then by name. """
+    def key(path: Path):
+        fastq_name = FastqName.parse(path.name)
+        return ((0, 0) if fastq_name is None else fastq_name.order(), path.name)
+    return sorted(fastqs, key=key)
+
+
+def merge_lanes(env: Environment, sample_idx: int, out_dir: Optional[Path]=None, buffer_size: int=MergeDefaults.BufferSize) -> MergedFastqs:
+    """
+    Merges the per-lane input FASTQs for the ith sample (see Environment.input_sample_fastqs()),
+    in lane order, into one FASTQ per read end named <sample-name>_R<end>_001.fastq.gz.  The FASTQs
+    are written to the given directory, or the sample's output directory by default.  Any error is
+    raised.
+    """
+    sample_name, _ = env.sample_name_and_id(sample_idx)
+    if out_dir is None:
+        out_dir = env.output_sample_dir(sample_name)
+    fastqs_r1, fastqs_r2 = env.input_sample_fastqs(sample_idx=sample_idx)
+    fastq_r1 = concatenate(sources=lane_order(fastqs_r1), dest=out_dir / (sample_name + Environment.fq_ext(end=1)), buffer_size=buffer_size)
+    fastq_r2 = None
+    if fastqs_r2:
+        fastq_r2 = concatenate(sources=lane_order(fastqs_r2), dest=out_dir / (sample_name + Environment.fq_ext(end=2)), buffer_size=buffer_size)
+    return MergedFastqs(sample_idx=sample_idx, sample_name=sample_name, fastq_r1=fastq_r1, fastq_r2=fastq_r2, error=None)
+
+
+def merge_all_lanes(env: Environment, to_tmp_dir: bool=False, workers: int=MergeDefaults.Workers, buffer_size: int=MergeDefaults.BufferSize) -> List[MergedFastqs]:
+    """
+    Merges the per-lane input FASTQs for every sample (see merge_lanes()), with samples merged
+    concurrently on a pool of at most the given number of threads.  The FASTQs are written to the
+    sample's output directory, or to <tmp-dir>/<sample-name> if to_tmp_dir is True.  An error for
+    one sample does not stop the others, but is instead returned in the sample's `error` field.
+    """
+    assert workers > 0, f"workers must be greater than zero, was {workers}"
+
+    def merge(sample_idx: int) -> MergedFastqs:
+        sample_name, _ = env.sample_name_and_id(sample_idx)
+        out_dir = env.tmp_dir() / sample_name if to_tmp_dir else None
+        try:
+            return merge_lanes(env=env, sample_idx=sample_idx, out_dir=out_dir, buffer_size=buffer_size)
+        except Exception as e:
+            return MergedFastqs(sample_idx=sample_idx, sample_name=sample_name, fastq_r1=None, fastq_r2=None, error=e)
+
+    if env.num_samples() == 0:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, env.num_samples())) as executor:
+        return list(executor.map(merge, range(env.num_samples())))
@@ -0,0 +1,155 @@
+"""This module implements planning of the output paths produced by fgbio's DemuxFastqs.
+
+* OutputLayout computes the output prefix, BAM and FASTQ paths for many samples at once
+"""
+
+import os
+import json
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+from pathlib import Path
+from basespace_commons.environment import Environment
+from basespace_commons.sample import Sample
+
+
+class OutputPaths(NamedTuple):
+    """ The output prefix and paths for a single sample. """
+    sample_id: str
+    sample_name: str
+    sample_ordinal: int
+    unmatched: bool
+    prefix: str
+    bam: Path
+    fq_r1: Path
+    fq_r2: Path
+
+
+class OutputLayout(object):
+    """
+    The output prefix and BAM/FASTQ paths for every sample, computed once, in sample order.  See
+    Sample.prefix() for how the prefix is generated.  The layout may be saved as a manifest and
+    loaded by downstream steps rather than being recomputed.
+    """
+
+    ManifestVersion = 1
+
+    def __init__(self, dir: Path, paths: List[OutputPaths]):
+        """ Creates a new layout with the given output directory and per-sample paths. """
+        self.__dir: Path = dir
+        self.__paths: List[OutputPaths] = paths
+        self.__by_prefix: Dict[str, List[OutputPaths]] = {}
+        for p in paths:
+            self.__by_prefix.setdefault(p.prefix, []).append(p)
+
+    def __len__(self) -> int:
+        return len(self.__paths)
+
+    def __iter__(self) -> Iterator[OutputPaths]:
+        return iter(self.__paths)
+
+    def __getitem__(self, index: int) -> OutputPaths:
+        return self.__paths[index]
+
+    def dir(self) -> Path:
+        """ The output directory. """
+        return self.__dir
+
+    def bam(self, index: int) -> Path:
+        """ The output BAM for the sample at the given index. """
+        return self.__paths[index].bam
+
+    def fq(self, index: int, end: int) -> Path:
+        """ The output FASTQ for the given end (1 or 2) for the sample at the given index. """
+        assert 1 == end or 2 == end, f"end must be 1 or 2, was {end}"
+        return self.__paths[index].fq_r1 if end == 1 else self.__paths[index].fq_r2
+
+    def by_prefix(self, prefix: str) -> Optional[OutputPaths]:
+        """ Gets the (first) sample with the given prefix, or None if there are none. """
+        paths = self.__by_prefix.get(prefix)
+        return None if paths is None else paths[0]
+
+    def collisions(self) -> Dict[str, List[OutputPaths]]:
+        """ Gets the samples that share an output prefix (and therefore output paths), by prefix. """
+        return {prefix: paths for prefix, paths in self.__by_prefix.items() if len(paths) > 1}
+
+    @staticmethod
+    def plan(samples: Iterable[Sample],
+             dir: Path,
+             illumina_naming: Optional[bool]=None,
+             sample_barcode_column: Optional[str]=None,
+             unmatched: Optional[Sample]=None,
+             allow_collisions: bool=False) -> 'OutputLayout':
+        """
+        Computes the output paths for every sample in a single pass.  If illumina_naming or
+        sample_barcode_column are not given, each sample's defaults are used.  If an unmatched
+        sample is given, its paths (with unmatched=True) are placed after those of the samples.
+        Raises an exception if two samples share an output prefix, unless allow_collisions is True.
+        """
+        dir_str = str(dir)
+
+        def to_paths(sample: Sample, is_unmatched: bool) -> OutputPaths:
+            prefix = sample.prefix(unmatched=is_unmatched, illumina_naming=illumina_naming, sample_barcode_column=sample_barcode_column)
+            return OutputPaths(
+                    sample_id      = sample.sample_id(),
+                    sample_name    = sample.sample_name(),
+                    sample_ordinal = sample.sample_ordinal(),
+                    unmatched      = is_unmatched,
+                    prefix         = prefix,
+                    bam            = Path(os.path.join(dir_str, prefix + '.bam')),
+                    fq_r1          = Path(os.path.join(dir_str, prefix + Environment.fq_ext(end=1))),
+                    fq_r2          = Path(os.path.join(dir_str, prefix + Environment.fq_ext(end=2)))
+                    )
+
+        paths = [to_paths(sample=s, is_unmatched=False) for s in samples]
+        if unmatched is not None:
+            paths.append(to_paths(sample=unmatched, is_unmatched=True))
+
+        layout = OutputLayout(dir=dir, paths=paths)
+        collisions = layout.collisions()
+        if collisions and not allow_collisions:
+            raise Exception(f"Found {len(collisions)} output prefix(es) shared by more than one sample:\n\t" +
+                            '\n\t'.join(f"{prefix}: " + ', '.join(p.sample_id for p in ps) for prefix, ps in collisions.items()))
+        return layout
+
+    def save(self, path: Path) -> None:
+        """ Saves the layout as a JSON manifest. """
+        data = {
+            'version': OutputLayout.ManifestVersion,
+            'dir': str(self.__dir),
+            'samples': [
+                {
+                    'sample_id': p.sample_id,
+                    'sample_name': p.sample_name,
+                    'sample_ordinal': p.sample_ordinal,
+                    'unmatched': p.unmatched,
+                    'prefix': p.prefix,
+                    'bam': str(p.bam),
+                    'fq_r1': str(p.fq_r1),
+                    'fq_r2': str(p.fq_r2)
+                }
+                for p in self.__paths
+            ]
+        }
+        with path.open('w') as fh:
+            json.dump(data, fh, indent=2)
+
+    @staticmethod
+    def load(path: Path) -> 'OutputLayout':
+        """ Loads a layout from a JSON manifest written by save(). """
+        with path.open('r') as fh:
+            data = json.load(fh)
+        if data.get('version') != OutputLayout.ManifestVersion:
+            raise Exception(f"Unsupported output layout manifest version '{data.get('version')}' in '{path}'")
+        paths = [
+            OutputPaths(
+                sample_id      = p['sample_id'],
+                sample_name    = p['sample_name'],
+                sample_ordinal = p['sample_ordinal'],
+                unmatched      = p['unmatched'],
+                prefix         = p['prefix'],
+                bam            = Path(p['bam']),
+                fq_r1          = Path(p['fq_r1']),
+                fq_r2          = Path(p['fq_r2'])
+            )
+            for p in data['samples']
+        ]
+        return OutputLayout(dir=Path(data['dir']), paths=paths)
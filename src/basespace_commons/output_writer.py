@@ -0,0 +1,153 @@
+"""This module implements writing per-sample result files in the background.
+
+* OutputWriter queues writes into the output directories on a bounded pool of threads
+"""
+
+import os
+import json
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Set
+from pathlib import Path
+from basespace_commons.environment import Environment
+
+
+class OutputWriterDefaults(object):
+
+    # The number of threads writing files
+    Workers = 4
+
+    # The maximum number of writes queued or in progress before new writes block
+    MaxPending = 256
+
+
+class OutputWriter(object):
+    """
+    Writes result files into the output sample directories (see Environment.output_sample_dir())
+    on a pool of background threads, so that the caller does not wait on slow file creation.
+
+    Each file is written to a temporary name in the destination directory and then atomically
+    renamed, so a file is either absent or complete.  Writes to the same path are applied in the
+    order they were queued, so the last write wins.  Each directory is created at most once.  At
+    most max_pending writes may be queued or in progress, after which new writes block until one
+    completes.  The data to write is captured (serialized) on the calling thread.
+
+    Errors are raised by flush() and close(), which wait for all queued writes to complete.  The
+    writer may be used as a context manager, closing on exit.
+    """
+
+    def __init__(self,
+                 env: Environment,
+                 workers: int=OutputWriterDefaults.Workers,
+                 max_pending: int=OutputWriterDefaults.MaxPending):
+        """ Creates a new writer for the output directories of the given environment. """
+        assert workers > 0, f"workers must be greater than zero, was {workers}"
+        assert max_pending > 0, f"max_pending must be greater than zero, was {max_pending}"
+        self.__env: Environment = env
+        self.__executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=workers)
+        self.__pending: threading.BoundedSemaphore = threading.BoundedSemaphore(max_pending)
+        self.__lock = threading.Lock()
+        self.__futures: List[Future] = []
+        self.__last: Dict[str, Future] = {}
+        self.__created_dirs: Set[str] = set()
+        self.__sequence = itertools.count()
+        self.__closed: bool = False
+
+    def __enter__(self) -> 'OutputWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def path(self, sample_name: Optional[str], relpath: str) -> Path:
+        """
+        The destination for the given path relative to the output directory for the given sample,
+        or to the output project directory if no sample is given.
+        """
+        dir = self.__env.output_project_dir() if sample_name is None else self.__env.output_sample_dir(sample_name)
+        return dir / relpath
+
+    def write_bytes(self, sample_name: Optional[str], relpath: str, data: bytes) -> Path:
+        """ Queues writing the given bytes to the given path (see path()), returning the path. """
+        assert not self.__closed, "Cannot write to a closed OutputWriter"
+        dest = self.path(sample_name=sample_name, relpath=relpath)
+        data = bytes(data)
+        key = str(dest)
+        self.__pending.acquire()
+        with self.__lock:
+            try:
+                # NB: the write waits for the previous write to the same path, which was queued first
+                future = self.__executor.submit(self.__write, dest, data, self.__last.get(key))
+            except BaseException:
+                self.__pending.release()
+                raise
+            self.__last[key] = future
+            self.__futures.append(future)
+        future.add_done_callback(lambda _: self.__done(key, future))
+        return dest
+
+    def __done(self, key: str, future: Future) -> None:
+        """ Frees the pending slot for the completed write, and forgets it if the last to its path. """
+        with self.__lock:
+            if self.__last.get(key) is future:
+                del self.__last[key]
+        self.__pending.release()
+
+    def write_text(self, sample_name: Optional[str], relpath: str, text: str, encoding: str='utf-8') -> Path:
+        """ Queues writing the given text to the given path (see path()), returning the path. """
+        return self.write_bytes(sample_name=sample_name, relpath=relpath, data=text.encode(encoding))
+
+    def write_json(self, sample_name: Optional[str], relpath: str, data: Any, indent: Optional[int]=2) -> Path:
+        """ Queues writing the given data as JSON to the given path (see path()), returning the path. """
+        return self.write_text(sample_name=sample_name, relpath=relpath, text=json.dumps(data, indent=indent))
+
+    def __make_dir(self, dir: Path) -> None:
+        """ Creates the given directory, unless it has already been created. """
+        key = str(dir)
+        with self.__lock:
+            if key in self.__created_dirs:
+                return
+        dir.mkdir(parents=True, exist_ok=True)
+        with self.__lock:
+            self.__created_dirs.add(key)
+
+    def __write(self, dest: Path, data: bytes, previous: Optional[Future]) -> None:
+        """
+        Waits for the previous write to the destination (if any) to complete, successfully or not,
+        then writes the data to a temporary file and renames it to the destination.
+        """
+        if previous is not None:
+            wait([previous])
+        self.__make_dir(dest.parent)
+        tmp_path = dest.with_name(f'.{dest.name}.{os.getpid()}.{next(self.__sequence)}.tmp')
+        try:
+            with open(str(tmp_path), 'wb') as fh:
+                fh.write(data)
+            os.replace(str(tmp_path), str(dest))
+        except BaseException:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+
+    def flush(self) -> None:
+        """
+        Waits for all queued writes to complete.  Raises an exception listing the failed writes, if
+        any.
+        """
+        with self.__lock:
+            futures, self.__futures = self.__futures, []
+        wait(futures)
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            raise Exception(f"Failed to write {len(errors)} output file(s):\n\t" + '\n\t'.join(str(e) for e in errors))
+
+    def close(self) -> None:
+        """ Waits for all queued writes to complete (see flush()), and stops the background threads. """
+        if self.__closed:
+            return
+        self.__closed = True
+        try:
+            self.flush()
+        finally:
+            self.__executor.shutdown(wait=True)
@@ -0,0 +1,154 @@
+"""This module implements validation that paired FASTQs contain the same reads in the same order.
+
+* validate_pair streams a pair of R1/R2 FASTQs in lockstep, reporting the first mismatch
+* validate_pairs validates every R1/R2 pair for every sample on a pool of processes
+"""
+
+import os
+import gzip
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from pathlib import Path
+from basespace_commons.environment import Environment
+
+
+class PairValidation(NamedTuple):
+    """
+    The result of validating a pair of R1/R2 FASTQs.  If the FASTQs do not pair, the (zero-based)
+    index of the first bad record and a description of the problem are given.
+    """
+    sample_idx: Optional[int]
+    sample_name: Optional[str]
+    fastq_r1: Optional[Path]
+    fastq_r2: Optional[Path]
+    records: int
+    mismatch_record: Optional[int]
+    mismatch: Optional[str]
+
+    def ok(self) -> bool:
+        """ True if the FASTQs pair. """
+        return self.mismatch is None
+
+
+def read_name(header: bytes) -> bytes:
+    """
+    Gets the read name from a FASTQ header line, without the leading '@', any comment (ex. the
+    Illumina '1:N:0:ACGT'), or any trailing '/1' or '/2'.
+    """
+    fields = header[1:].split(None, 1)
+    name = fields[0] if fields else b''
+    if name.endswith(b'/1') or name.endswith(b'/2'):
+        name = name[:-2]
+    return name
+
+
+def _read_record(fh) -> Tuple[bytes, int]:
+    """ Reads the header of the next record, along with the number of lines of the record read. """
+    header = fh.readline()
+    if not header:
+        return (header, 0)
+    num_lines = 1
+    for _ in range(3):
+        if not fh.readline():
+            break
+        num_lines += 1
+    return (header, num_lines)
+
+
+def validate_pair(fastq_r1: Path,
+                  fastq_r2: Path,
+                  sample_idx: Optional[int]=None,
+                  sample_name: Optional[str]=None) -> PairValidation:
+    """
+    Validates that a pair of gzipped FASTQs have the same number of records, and the same read
+    name for each record (see read_name()).  The FASTQs are streamed in lockstep in bounded memory,
+    stopping at the first mismatch.
+    """
+    records = 0
+    mismatch = None
+    with gzip.open(str(fastq_r1), 'rb') as fh1, gzip.open(str(fastq_r2), 'rb') as fh2:
+        while True:
+            header1, lines1 = _read_record(fh1)
+            header2, lines2 = _read_record(fh2)
+            if lines1 == 0 and lines2 == 0:
+                break
+            elif lines2 == 0:
+                mismatch = f"R2 ended after {records} records but R1 has more"
+            elif lines1 == 0:
+                mismatch = f"R1 ended after {records} records but R2 has more"
+            elif lines1 != 4 or lines2 != 4:
+                mismatch = f"Truncated record in {'R1' if lines1 != 4 else 'R2'}"
+            elif not header1.startswith(b'@') or not header2.startswith(b'@'):
+                mismatch = f"Malformed header in {'R1' if not header1.startswith(b'@') else 'R2'}: '{(header1 if not header1.startswith(b'@') else header2).rstrip().decode('utf-8', 'replace')}'"
+            elif read_name(header1) != read_name(header2):
+                mismatch = f"Read names differ: '{read_name(header1).decode('utf-8', 'replace')}' != '{read_name(header2).decode('utf-8', 'replace')}'"
+            if mismatch is not None:
+                break
+            records += 1
+    return PairValidation(
+            sample_idx      = sample_idx,
+            sample_name     = sample_name,
+            fastq_r1        = fastq_r1,
+            fastq_r2        = fastq_r2,
+            records         = records,
+            mismatch_record = None if mismatch is None else records,
+            mismatch        = mismatch
+            )
+
+
+def _validate_pair_or_error(fastq_r1: Path, fastq_r2: Path, sample_idx: int, sample_name: str) -> PairValidation:
+    """ Validates a pair of FASTQs, returning any error (ex. a corrupt gzip) as a mismatch. """
+    try:
+        return validate_pair(fastq_r1=fastq_r1, fastq_r2=fastq_r2, sample_idx=sample_idx, sample_name=sample_name)
+    except Exception as e:
+        return PairValidation(sample_idx=sample_idx, sample_name=sample_name, fastq_r1=fastq_r1, fastq_r2=fastq_r2,
+                              records=0, mismatch_record=None, mismatch=f"Could not read FASTQs: {e}")
+
+
+def sample_pairs(env: Environment, sample_idx: int) -> List[Tuple[Path, Path]]:
+    """
+    Pairs the R1 and R2 FASTQs for the ith sample, which Environment.input_sample_fastqs() returns
+    matched by lane and chunk (raising an exception if they cannot be).  Returns no pairs if the
+    sample has no R2 FASTQs.
+    """
+    fastqs_r1, fastqs_r2 = env.input_sample_fastqs(sample_idx=sample_idx)
+    return list(zip(fastqs_r1, fastqs_r2))
+
+
+def validate_pairs(env: Environment,
+                   workers: Optional[int]=None,
+                   sample_indexes: Optional[Iterable[int]]=None) -> List[PairValidation]:
+    """
+    Validates every pair of R1/R2 FASTQs (see sample_pairs() and validate_pair()) for every sample,
+    or only those with the given indexes.  The pairs across all samples and lanes are validated
+    concurrently on a pool of at most the given number of processes (by default the number of
+    CPUs).  Returns the results in sample then lane order.  A sample whose FASTQs cannot be paired
+    has a single result with no FASTQs and the error as its mismatch.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    assert workers > 0, f"workers must be greater than zero, was {workers}"
+    if sample_indexes is None:
+        sample_indexes = range(env.num_samples())
+
+    results: List[Optional[PairValidation]] = []
+    jobs: List[Tuple[int, Path, Path, int, str]] = []
+    for sample_idx in sample_indexes:
+        sample_name = env.sample_name_and_id(sample_idx)[0]
+        try:
+            pairs = sample_pairs(env=env, sample_idx=sample_idx)
+        except Exception as e:
+            results.append(PairValidation(sample_idx=sample_idx, sample_name=sample_name, fastq_r1=None, fastq_r2=None,
+                                          records=0, mismatch_record=None, mismatch=str(e)))
+            continue
+        for fastq_r1, fastq_r2 in pairs:
+            jobs.append((len(results), fastq_r1, fastq_r2, sample_idx, sample_name))
+            results.append(None)
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            futures = [(i, executor.submit(_validate_pair_or_error, r1, r2, sample_idx, sample_name))
+                       for i, r1, r2, sample_idx, sample_name in jobs]
+            for i, future in futures:
+                results[i] = future.result()
+    return results
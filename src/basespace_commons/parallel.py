@@ -0,0 +1,145 @@
+"""This module implements running a step for each sample in parallel.
+
+* map_samples runs a function per sample on a pool of threads or processes
+"""
+
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from pathlib import Path
+from collections import deque
+from basespace_commons.environment import Environment
+
+
+class SampleTask(NamedTuple):
+    """ The inputs and outputs for a single sample, given to the function run per sample. """
+    sample_idx: int
+    sample_name: str
+    sample_id: str
+    fastqs_r1: List[Path]
+    fastqs_r2: List[Path]
+    output_dir: Path
+
+
+class SampleResult(NamedTuple):
+    """ The result of running the function for a single sample, or the error raised. """
+    sample_idx: int
+    sample_name: str
+    value: Any
+    error: Optional[Exception]
+    attempts: int
+
+
+def _run_sample(env: Environment, fn: Callable[[Environment, SampleTask], Any], sample_idx: int) -> Any:
+    """ Resolves the inputs and outputs for a sample, and runs the function. """
+    sample_name, sample_id = env.sample_name_and_id(sample_idx)
+    fastqs_r1, fastqs_r2 = env.input_sample_fastqs(sample_idx=sample_idx)
+    task = SampleTask(
+            sample_idx  = sample_idx,
+            sample_name = sample_name,
+            sample_id   = sample_id,
+            fastqs_r1   = fastqs_r1,
+            fastqs_r2   = fastqs_r2,
+            output_dir  = env.output_sample_dir(sample_name)
+            )
+    return fn(env, task)
+
+
+# The environment in a worker process, created once from its snapshot (see _init_worker())
+_worker_env: Optional[Environment] = None
+
+
+def _init_worker(snapshot: Dict[str, Any]) -> None:
+    """ Re-creates the environment from its snapshot, once per worker process. """
+    global _worker_env
+    _worker_env = Environment.from_snapshot(snapshot)
+
+
+def _run_sample_in_worker(fn: Callable[[Environment, SampleTask], Any], sample_idx: int) -> Any:
+    """ Runs the sample in a worker process, with the environment created by _init_worker(). """
+    return _run_sample(env=_worker_env, fn=fn, sample_idx=sample_idx)
+
+
+def map_samples(env: Environment,
+                fn: Callable[[Environment, SampleTask], Any],
+                workers: Optional[int]=None,
+                backend: str='thread',
+                retries: int=0,
+                sample_indexes: Optional[Iterable[int]]=None) -> Iterator[SampleResult]:
+    """
+    Runs the given function for each sample in parallel, yielding the results as they finish.
+
+    The function is called with the environment and a SampleTask containing the sample's index,
+    name, id, input FASTQs (see Environment.input_sample_fastqs()) and output directory (see
+    Environment.output_sample_dir()).  The backend is either 'thread' or 'process'.  For the
+    'process' backend, the function must be picklable (ex. defined at the top level of a module),
+    and each worker process is sent a small snapshot of the environment (see
+    Environment.snapshot()) once when it starts, rather than re-reading the AppSession.json.
+
+    An error for one sample does not stop the others.  A sample whose function raises an error is
+    retried up to the given number of times, after which the last error is returned in the result's
+    `error` field.  By default all samples are run; otherwise only those with the given indexes.
+
+    At most `workers` samples are in flight at once.  If a worker process exits abruptly (ex. it is
+    killed), the process pool is broken: every sample in flight fails that attempt with a
+    BrokenProcessPool error, and a new pool is created for any retries and the remaining samples.
+    """
+    assert backend in ['thread', 'process'], f"backend must be 'thread' or 'process', was '{backend}'"
+    assert retries >= 0, f"retries must be non-negative, was {retries}"
+    if workers is None:
+        workers = os.cpu_count() or 1
+    assert workers > 0, f"workers must be greater than zero, was {workers}"
+    if sample_indexes is None:
+        sample_indexes = range(env.num_samples())
+
+    snapshot = env.snapshot() if backend == 'process' else None
+
+    def new_executor() -> Executor:
+        if backend == 'thread':
+            return ThreadPoolExecutor(max_workers=workers)
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(snapshot,))
+
+    executor = new_executor()
+    generation = 0
+
+    def submit(sample_idx: int) -> Future:
+        if backend == 'thread':
+            return executor.submit(_run_sample, env, fn, sample_idx)
+        return executor.submit(_run_sample_in_worker, fn, sample_idx)
+
+    # The samples still to be submitted, with the number of attempts made so far
+    queued: Deque[Tuple[int, int]] = deque((sample_idx, 0) for sample_idx in sample_indexes)
+    # The samples in flight, with the number of attempts and the pool (generation) running them
+    pending: Dict[Future, Tuple[int, int, int]] = {}
+    try:
+        while queued or pending:
+            while queued and len(pending) < workers:
+                sample_idx, attempts = queued.popleft()
+                pending[submit(sample_idx)] = (sample_idx, attempts + 1, generation)
+            done, _ = wait(pending.keys(), return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                sample_idx, attempts, future_generation = pending.pop(future)
+                try:
+                    value, error = future.result(), None
+                except Exception as e:
+                    value, error = None, e
+                    broken = broken or (isinstance(e, BrokenProcessPool) and future_generation == generation)
+                if error is not None and attempts <= retries:
+                    queued.append((sample_idx, attempts))
+                    continue
+                yield SampleResult(
+                        sample_idx  = sample_idx,
+                        sample_name = env.sample_name_and_id(sample_idx)[0],
+                        value       = value,
+                        error       = error,
+                        attempts    = attempts
+                        )
+            if broken:
+                # NB: the other samples in flight on the broken pool also fail with BrokenProcessPool
+                executor.shutdown(wait=True)
+                executor = new_executor()
+                generation += 1
+    finally:
+        executor.shutdown(wait=True)
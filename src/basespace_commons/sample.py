@@ -1,14 +1,24 @@
-"""This module implements a container for a sample. """
+"""This module implements a container for a sample.
 
+* Sample for the metadata of a single sample
+* SampleTable for the metadata of many samples stored column-wise
+"""
+
+import io
 import sys
 import csv
-from typing import Any, List, Optional
+import itertools
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple, Union
 from pathlib import Path
 from collections import OrderedDict
+from collections import abc
 from basespace_commons.environment import Environment
 
 class Sample:
-    """ Stores information about a sample. """
+    """ Stores information about a sample, as a view of a row in a SampleTable. """
+
+    __slots__ = ('__table', '__row')
 
     def __init__(self, sample_dict: dict, sample_ordinal: int, illumina_naming: bool=False, sample_barcode_column: Optional[str]=None):
         """ Creates a new sample with metadata in key-value pairs, and a given sample ordinal. Both
@@ -16,13 +26,22 @@ class Sample:
             sample_barcode_column are provided, then they will be used as defaults in bam(), fq() and
             prefix() when the same named parameters are not given.
         """
-        self.__dict: dict = sample_dict
-        self.__sample_ordinal: int = sample_ordinal
-        self.__illumina_naming: bool = illumina_naming
-        self.__sample_barcode_column: str = sample_barcode_column
-        assert sample_dict['sample_name'], "'sample_name' not in the sample dictionary"
-        assert sample_dict['sample_id'], "'sample_id' not in the sample dictionary"
-        assert 0 < self.__sample_ordinal, f"sample_ordinal must be greater than zero, was {sample_ordinal}"
+        table = SampleTable(columns=list(sample_dict.keys()), illumina_naming=illumina_naming, sample_barcode_column=sample_barcode_column)
+        table.append(values=list(sample_dict.values()), sample_ordinal=sample_ordinal)
+        self.__table: 'SampleTable' = table
+        self.__row: int = 0
+
+    @staticmethod
+    def _view(table: 'SampleTable', row: int) -> 'Sample':
+        """ Creates a sample that is a view of the given row in the given table. """
+        sample = Sample.__new__(Sample)
+        sample.__table = table
+        sample.__row = row
+        return sample
+
+    def table(self) -> 'SampleTable':
+        """ Gets the table storing the sample's metadata. """
+        return self.__table
 
     def bam(self, dir: Path, unmatched: bool=False, illumina_naming: Optional[bool]=None, sample_barcode_column: Optional[str]=None) -> Path:
         """
@@ -67,73 +86,280 @@ class Sample:
 
         If unmatched is True, the sample name used will be "unmatched".
         """
-        sample_name = "unmatched" if unmatched else self.__dict['sample_name']
+        sample_name = "unmatched" if unmatched else self.sample_name()
 
         if illumina_naming is None:
-            illumina_naming = self.__illumina_naming
+            illumina_naming = self.__table.illumina_naming()
         if sample_barcode_column is None:
-            sample_barcode_column = self.__sample_barcode_column
+            sample_barcode_column = self.__table.sample_barcode_column()
 
         if illumina_naming:
-            return f"{sample_name}_S{self.__sample_ordinal:d}_L001"
+            return f"{sample_name}_S{self.sample_ordinal():d}_L001"
         else:
             assert sample_barcode_column, "sample_barcode_column must be provided when illumina_naming is False"
             sample_barcode_column = sample_barcode_column.lower()
-            sample_id             = self.__dict['sample_id']
-            sample_barcode_bases  = self.__dict[sample_barcode_column]
+            sample_id             = self.sample_id()
+            sample_barcode_bases  = self.get(sample_barcode_column)
             return f"{sample_id}-{sample_name}-{sample_barcode_bases}"
 
     def sample_ordinal(self) -> int:
         """ Gets the sample ordinal. """
-        return self.__sample_ordinal
+        return self.__table.sample_ordinal(self.__row)
 
     def sample_name(self) -> str:
         """ Gets the sample name. """
-        return self.__dict['sample_name']
+        return self.__table.value(self.__row, 'sample_name')
 
     def sample_id(self) -> str:
         """ Gets the sample id. """
-        return self.__dict['sample_id']
+        return self.__table.value(self.__row, 'sample_id')
 
     def library_id(self) -> str:
         """ Gets the library id, or sample id if library id is missing. """
-        if 'library_id' in self.__dict:
-            return self.__dict['library_id']
+        if self.__table.has_value(self.__row, 'library_id'):
+            return self.__table.value(self.__row, 'library_id')
         else:
-            return self.__dict['sample_id']
+            return self.sample_id()
 
     def get(self, key: Any) -> Any:
         """ Gets the value for the given key. """
-        return self.__dict[key]
+        return self.__table.value(self.__row, key)
+
+    def to_dict(self) -> dict:
+        """ Gets the sample's metadata as key-value pairs. """
+        return self.__table.row(self.__row)
 
     @staticmethod
-    def samples_from(data: str, illumina_naming: bool=False, sample_barcode_column: Optional[str]=None, logging: bool=True) -> List['Sample']:
+    def samples_from(data: str, illumina_naming: bool=False, sample_barcode_column: Optional[str]=None, logging: bool=True, as_table: bool=False) -> Union[List['Sample'], 'SampleTable']:
         """
         Reads an Illumina Experiment Manager Sample Sheet or metadata input file and returns
-        a list of samples.
-        """
-        lines = [line.strip().rstrip("\r\n") for line in data.splitlines()]
-        lines = [line for line in lines if len(line) > 0]
-        line_iter = iter(line for line in lines)
-        try:
-            next(iter(line for line in lines if "[Data]" in line))
-            if logging:
+        a list of samples.  If as_table is True, the SampleTable storing the samples is returned
+        instead of a list.
+        """
+        rows = Sample._data_rows(lines=io.StringIO(data), logging=logging)
+        table = SampleTable.from_rows(rows=rows, illumina_naming=illumina_naming, sample_barcode_column=sample_barcode_column)
+        return table if as_table else list(table)
+
+    @staticmethod
+    def iter_samples_from(source: Union[Path, str, TextIO], illumina_naming: bool=False, sample_barcode_column: Optional[str]=None, logging: bool=True) -> Iterator['Sample']:
+        """
+        Reads an Illumina Experiment Manager Sample Sheet or metadata input file and lazily yields
+        the samples.  The source is either the path to the file or an open text stream (not the
+        contents of the file; see samples_from()).
+
+        The input is read in a single pass, and rows are parsed as CSV, so quoted fields may contain
+        commas.  If the first non-empty line is a section header (ex. "[Header]"), the input is
+        assumed to be a Sample Sheet and the samples are read from the "[Data]" section, which ends
+        at the next section header or empty row.  Otherwise, the input is assumed to be a simple CSV
+        file with a header line.
+        """
+        if isinstance(source, (Path, str)):
+            with open(str(source), 'r', newline='') as fh:
+                yield from Sample.iter_samples_from(source=fh, illumina_naming=illumina_naming, sample_barcode_column=sample_barcode_column, logging=logging)
+            return
+
+        rows = Sample._data_rows(lines=source, logging=logging)
+        header = next(rows, None)
+        if header is None:
+            return
+        # NB: each sample has its own one-row table, and its values are not interned, so nothing is
+        # retained once the sample is dropped
+        for sample_index, sample_data in enumerate(rows):
+            table = SampleTable(columns=header, illumina_naming=illumina_naming, sample_barcode_column=sample_barcode_column, intern=False)
+            yield Sample._view(table, table.append(values=sample_data, sample_ordinal=sample_index+1))
+
+    @staticmethod
+    def _sections(lines: Iterable[str]) -> Iterator[Tuple[str, Optional[List[str]]]]:
+        """
+        Tokenizes a Sample Sheet, or a simple CSV file, in a single pass.  Yields the name of each
+        section (ex. "Data" for "[Data]") with None when the section starts, and then with each of
+        its rows parsed as CSV.  Blank lines are skipped.  If the first non-blank line is not a
+        section header, the input is a simple CSV file, and its rows are in the "Data" section.
+        """
+        name = None
+        lines = (line.strip() for line in lines)
+        for row in csv.reader(line for line in lines if len(line) > 0):
+            if len(row) > 0 and row[0].startswith("["):
+                name = row[0].strip()[1:].split("]", 1)[0]
+                yield name, None
+            else:
+                if name is None:
+                    name = "Data"
+                yield name, row
+
+    @staticmethod
+    def _data_rows(lines: Iterable[str], logging: bool=True) -> Iterator[List[str]]:
+        """
+        Yields the lower-cased header and then each row of the "[Data]" section of a Sample Sheet,
+        or of a simple CSV file.  See iter_samples_from().
+        """
+        sections = Sample._sections(lines=lines)
+        first = next(sections, None)
+        if first is None:
+            return
+
+        is_sample_sheet = first[1] is None
+        if logging:
+            if is_sample_sheet:
                 sys.stderr.write("Assuming input metadata file is an Illumina Experiment Manager Sample Sheet.\n")
-            while line_iter:
-                line = next(line_iter)
-                if "[Data]" in line:
-                    break
-        except StopIteration:
-            if logging:
+            else:
                 sys.stderr.write("Assuming input metadata file is simple CSV file.\n")
 
-        samples = []
-        header = [line.lower() for line in next(line_iter).split(",")]
-        for sample_index, line in enumerate(line_iter):
-            if len(line) == 0:
+        # NB: stops consuming lines at the end of the "[Data]" section
+        found = not is_sample_sheet
+        header = None
+        for name, row in itertools.chain([first], sections):
+            if name != "Data" or row is None:
+                if header is not None:
+                    break
+                found = found or name == "Data"
+                continue
+            if header is None:
+                header = [column.lower() for column in row]
+                yield header
+            elif all(len(field) == 0 for field in row):
                 break
-            sample_data = line.split(",")
-            sample_dict = dict(zip(header, sample_data))
-            sample      = Sample(sample_dict, sample_ordinal=sample_index+1, illumina_naming=illumina_naming, sample_barcode_column=sample_barcode_column)
-            samples.append(sample)
-        return samples
+            else:
+                yield row
+        if not found:
+            raise Exception("Could not find the [Data] section in the Sample Sheet.")
+
+
+class SampleTable(abc.Sequence):
+    """
+    Stores the metadata for many samples column-wise.
+
+    Each column is stored as an array of integer codes into the column's distinct values, with
+    string values interned, so repeated values (ex. the sample project, or empty values) are stored
+    once per column rather than once per sample.  Indexing the table returns a Sample that is a view
+    of the row.
+    """
+
+    # The code for a value missing from a row (ex. a short row in a CSV)
+    __MissingCode = 0
+
+    def __init__(self, columns: List[str], illumina_naming: bool=False, sample_barcode_column: Optional[str]=None, intern: bool=True):
+        """ Creates an empty table with the given columns.  See Sample for illumina_naming and
+            sample_barcode_column.  If intern is False, string values are not interned (ex. for a
+            table of one row, where values are not shared).
+        """
+        self.__columns: List[str] = [sys.intern(column) if isinstance(column, str) else column for column in columns]
+        self.__column_index: Dict[Any, int] = {column: i for i, column in enumerate(self.__columns)}
+        self.__codes: List[array] = [array('I') for _ in self.__columns]
+        self.__values: List[List[Any]] = [[None] for _ in self.__columns]
+        self.__value_codes: List[Dict[Any, int]] = [{} for _ in self.__columns]
+        self.__sample_ordinals: array = array('l')
+        self.__illumina_naming: bool = illumina_naming
+        self.__sample_barcode_column: Optional[str] = sample_barcode_column
+        self.__intern: bool = intern
+
+    def __len__(self) -> int:
+        return len(self.__sample_ordinals)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Sample, List[Sample]]:
+        if isinstance(index, slice):
+            return [Sample._view(self, row) for row in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or len(self) <= index:
+            raise IndexError(f"Sample index '{index}' out of range (found {len(self)} samples).")
+        return Sample._view(self, index)
+
+    def __iter__(self) -> Iterator[Sample]:
+        return (Sample._view(self, row) for row in range(len(self)))
+
+    def columns(self) -> List[str]:
+        """ Gets the names of the columns. """
+        return list(self.__columns)
+
+    def illumina_naming(self) -> bool:
+        """ The default for illumina_naming for the samples in this table. """
+        return self.__illumina_naming
+
+    def sample_barcode_column(self) -> Optional[str]:
+        """ The default for sample_barcode_column for the samples in this table. """
+        return self.__sample_barcode_column
+
+    def sample_ordinal(self, row: int) -> int:
+        """ Gets the sample ordinal for the given row. """
+        return self.__sample_ordinals[row]
+
+    def has_value(self, row: int, column: Any) -> bool:
+        """ True if the given row has a value for the given column. """
+        index = self.__column_index.get(column)
+        return index is not None and self.__codes[index][row] != SampleTable.__MissingCode
+
+    def value(self, row: int, column: Any) -> Any:
+        """ Gets the value in the given row for the given column, raising a KeyError if missing. """
+        index = self.__column_index[column]
+        code = self.__codes[index][row]
+        if code == SampleTable.__MissingCode:
+            raise KeyError(column)
+        return self.__values[index][code]
+
+    def row(self, row: int) -> dict:
+        """ Gets the values in the given row as key-value pairs. """
+        return OrderedDict((column, self.__values[index][self.__codes[index][row]])
+                           for index, column in enumerate(self.__columns)
+                           if self.__codes[index][row] != SampleTable.__MissingCode)
+
+    def column(self, column: Any) -> List[Any]:
+        """ Gets the values for every row in the given column, with None for missing values. """
+        index = self.__column_index[column]
+        values = self.__values[index]
+        return [values[code] for code in self.__codes[index]]
+
+    def append(self, values: Sequence[Any], sample_ordinal: Optional[int]=None) -> int:
+        """
+        Appends a row with the given values, one per column, and returns the index of the new row.
+        If fewer values than columns are given, the trailing columns are missing values for the row.
+        The sample ordinal defaults to the number of rows in the table after appending.
+        """
+        if sample_ordinal is None:
+            sample_ordinal = len(self) + 1
+
+        def get(column: str) -> Any:
+            index = self.__column_index[column]
+            if len(values) <= index:
+                raise KeyError(column)
+            return values[index]
+
+        assert get('sample_name'), "'sample_name' not in the sample dictionary"
+        assert get('sample_id'), "'sample_id' not in the sample dictionary"
+        assert 0 < sample_ordinal, f"sample_ordinal must be greater than zero, was {sample_ordinal}"
+
+        for index, codes in enumerate(self.__codes):
+            if len(values) <= index:
+                codes.append(SampleTable.__MissingCode)
+                continue
+            value = values[index]
+            value_codes = self.__value_codes[index]
+            try:
+                code = value_codes.get(value)
+            except TypeError:
+                # an unhashable value (ex. a list) is stored once per row, rather than shared
+                code = len(self.__values[index])
+                self.__values[index].append(value)
+                codes.append(code)
+                continue
+            if code is None:
+                if self.__intern and isinstance(value, str):
+                    value = sys.intern(value)
+                code = len(self.__values[index])
+                self.__values[index].append(value)
+                value_codes[value] = code
+            codes.append(code)
+        self.__sample_ordinals.append(sample_ordinal)
+        return len(self) - 1
+
+    @staticmethod
+    def from_rows(rows: Iterable[List[str]], illumina_naming: bool=False, sample_barcode_column: Optional[str]=None) -> 'SampleTable':
+        """
+        Builds a table from the given rows, with the first row being the column names.  The sample
+        ordinals are assigned in row order, starting at one.
+        """
+        rows = iter(rows)
+        table = SampleTable(columns=next(rows, []), illumina_naming=illumina_naming, sample_barcode_column=sample_barcode_column)
+        for row in rows:
+            table.append(values=row)
+        return table
@@ -0,0 +1,189 @@
+"""This module implements a container for an Illumina Experiment Manager Sample Sheet.
+
+* SampleSheet for all the sections of a Sample Sheet, with the samples indexed for fast lookup
+"""
+
+import io
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple, Union
+from pathlib import Path
+from collections import OrderedDict
+from basespace_commons.sample import Sample, SampleTable
+
+
+class SampleSheet(object):
+    """
+    Stores every section of a Sample Sheet, with the "[Data]" section stored as a SampleTable.
+
+    The "[Header]" and "[Settings]" sections are stored as key-value pairs, the "[Reads]" section as
+    a list of read lengths, and every section (including any not listed here) as its raw rows.  The
+    samples are indexed by sample id, sample name, lane (if there is a "lane" column), and project
+    (if there is a "sample_project" column), so that each lookup takes constant time.
+
+    Sample names are indexed with underscores replaced by dashes, since BaseSpace does the same
+    (see Environment.input_sample_fastqs()), and looked up the same way, so a name with either
+    underscores or dashes finds the sample.
+    """
+
+    HeaderSection = 'Header'
+    ReadsSection = 'Reads'
+    SettingsSection = 'Settings'
+    DataSection = 'Data'
+
+    def __init__(self, sections: 'OrderedDict[str, List[List[str]]]', illumina_naming: bool=False, sample_barcode_column: Optional[str]=None):
+        """
+        Creates a new Sample Sheet from the raw rows of each section.  See Sample for
+        illumina_naming and sample_barcode_column.
+        """
+        if SampleSheet.DataSection not in sections:
+            raise Exception("Could not find the [Data] section in the Sample Sheet.")
+        self.__sections: 'OrderedDict[str, List[List[str]]]' = sections
+        self.__header: Dict[str, str] = SampleSheet.__key_values(sections.get(SampleSheet.HeaderSection, []))
+        self.__settings: Dict[str, str] = SampleSheet.__key_values(sections.get(SampleSheet.SettingsSection, []))
+        self.__reads: List[int] = [int(row[0]) for row in sections.get(SampleSheet.ReadsSection, []) if row and row[0]]
+
+        data = sections[SampleSheet.DataSection]
+        rows = [[column.lower() for column in data[0]]] + data[1:] if data else []
+        self.__table: SampleTable = SampleTable.from_rows(rows=rows, illumina_naming=illumina_naming, sample_barcode_column=sample_barcode_column)
+
+        self.__by_sample_id: Dict[str, List[int]] = {}
+        self.__by_sample_name: Dict[str, List[int]] = {}
+        self.__by_lane: 'OrderedDict[str, List[int]]' = OrderedDict()
+        self.__by_project: 'OrderedDict[str, List[int]]' = OrderedDict()
+        self.__by_sample_id_and_lane: Dict[Tuple[str, Optional[str]], int] = {}
+        columns = self.__table.columns()
+        sample_ids = self.__table.column('sample_id') if 'sample_id' in columns else []
+        sample_names = self.__table.column('sample_name') if 'sample_name' in columns else []
+        lanes = self.__table.column('lane') if 'lane' in columns else [None] * len(self.__table)
+        projects = self.__table.column('sample_project') if 'sample_project' in columns else [None] * len(self.__table)
+        for row, (sample_id, sample_name, lane, project) in enumerate(zip(sample_ids, sample_names, lanes, projects)):
+            self.__by_sample_id.setdefault(sample_id, []).append(row)
+            self.__by_sample_name.setdefault(SampleSheet.normalize_name(sample_name), []).append(row)
+            if lane is not None:
+                self.__by_lane.setdefault(lane, []).append(row)
+            if project is not None:
+                self.__by_project.setdefault(project, []).append(row)
+            self.__by_sample_id_and_lane.setdefault((sample_id, lane), row)
+
+    @staticmethod
+    def __key_values(rows: List[List[str]]) -> 'OrderedDict[str, str]':
+        """ Gets the first field of each row as the key, and the second (if any) as the value. """
+        return OrderedDict((row[0], row[1] if len(row) > 1 else '') for row in rows if row and row[0])
+
+    @staticmethod
+    def normalize_name(sample_name: str) -> str:
+        """ Normalizes a sample name as BaseSpace does, replacing underscores with dashes. """
+        return sample_name.replace('_', '-')
+
+    def __len__(self) -> int:
+        """ The number of samples. """
+        return len(self.__table)
+
+    def header(self) -> Dict[str, str]:
+        """ The key-value pairs in the "[Header]" section. """
+        return self.__header
+
+    def settings(self) -> Dict[str, str]:
+        """ The key-value pairs in the "[Settings]" section. """
+        return self.__settings
+
+    def reads(self) -> List[int]:
+        """ The read lengths in the "[Reads]" section. """
+        return self.__reads
+
+    def section_names(self) -> List[str]:
+        """ The names of the sections, in order. """
+        return list(self.__sections.keys())
+
+    def section(self, name: str) -> List[List[str]]:
+        """ The raw rows of the section with the given name.  See sections_from(). """
+        return self.__sections[name]
+
+    def table(self) -> SampleTable:
+        """ The samples in the "[Data]" section. """
+        return self.__table
+
+    def samples(self) -> List[Sample]:
+        """ The samples in the "[Data]" section. """
+        return list(self.__table)
+
+    def __samples(self, rows: Optional[List[int]]) -> List[Sample]:
+        return [] if rows is None else [self.__table[row] for row in rows]
+
+    def by_sample_id(self, sample_id: str) -> List[Sample]:
+        """ The samples (ex. one per lane) with the given sample id. """
+        return self.__samples(self.__by_sample_id.get(sample_id))
+
+    def by_sample_name(self, sample_name: str) -> List[Sample]:
+        """ The samples (ex. one per lane) with the given sample name (see normalize_name()). """
+        return self.__samples(self.__by_sample_name.get(SampleSheet.normalize_name(sample_name)))
+
+    def by_lane(self, lane: str) -> List[Sample]:
+        """ The samples in the given lane. """
+        return self.__samples(self.__by_lane.get(lane))
+
+    def by_project(self, project: str) -> List[Sample]:
+        """ The samples in the given project. """
+        return self.__samples(self.__by_project.get(project))
+
+    def lookup(self, sample_id: str, lane: Optional[str]=None) -> Optional[Sample]:
+        """
+        The (first) sample with the given sample id in the given lane, or None if there is none.
+        The lane should be None only if there is no lane column.
+        """
+        row = self.__by_sample_id_and_lane.get((sample_id, lane))
+        return None if row is None else self.__table[row]
+
+    def lanes(self) -> List[str]:
+        """ The lanes, in order of first appearance. """
+        return list(self.__by_lane.keys())
+
+    def projects(self) -> List[str]:
+        """ The projects, in order of first appearance. """
+        return list(self.__by_project.keys())
+
+    def samples_by_lane(self) -> 'OrderedDict[str, List[Sample]]':
+        """ The samples in each lane, with lanes in order of first appearance. """
+        return OrderedDict((lane, self.__samples(rows)) for lane, rows in self.__by_lane.items())
+
+    @staticmethod
+    def sections_from(lines: Iterable[str]) -> 'OrderedDict[str, List[List[str]]]':
+        """
+        Reads the raw rows of each section in a single pass (see Sample._sections()).  Trailing
+        empty fields are removed (except in the "[Data]" section), and empty rows skipped.  The
+        "[Data]" section ends at the first empty row, or the next section.  If the first non-empty
+        line is not a section header, the input is assumed to be a simple CSV file, and is read as
+        the "[Data]" section.
+        """
+        sections: 'OrderedDict[str, List[List[str]]]' = OrderedDict()
+        rows: Optional[List[List[str]]] = None
+        for name, row in Sample._sections(lines=lines):
+            if row is None or name not in sections:
+                rows = sections.setdefault(name, [])
+                if row is None:
+                    continue
+            fields = list(row)
+            while fields and len(fields[-1].strip()) == 0:
+                fields.pop()
+            if len(fields) == 0:
+                if name == SampleSheet.DataSection and rows:
+                    rows = None
+            elif rows is not None:
+                # NB: the samples keep their empty values, as when read by Sample.samples_from()
+                rows.append(row if name == SampleSheet.DataSection else fields)
+        return sections
+
+    @staticmethod
+    def read(source: Union[Path, str, TextIO], illumina_naming: bool=False, sample_barcode_column: Optional[str]=None) -> 'SampleSheet':
+        """
+        Reads a Sample Sheet from the given path or open text stream (not the contents of the file;
+        see from_string()).  See sections_from().
+        """
+        if isinstance(source, (Path, str)):
+            with open(str(source), 'r', newline='') as fh:
+                return SampleSheet.read(source=fh, illumina_naming=illumina_naming, sample_barcode_column=sample_barcode_column)
+        return SampleSheet(sections=SampleSheet.sections_from(source), illumina_naming=illumina_naming, sample_barcode_column=sample_barcode_column)
+
+    @staticmethod
+    def from_string(data: str, illumina_naming: bool=False, sample_barcode_column: Optional[str]=None) -> 'SampleSheet':
+        """ Reads a Sample Sheet from its contents.  See read(). """
+        return SampleSheet.read(source=io.StringIO(data), illumina_naming=illumina_naming, sample_barcode_column=sample_barcode_column)
@@ -0,0 +1,330 @@
+"""This module implements splitting the input FASTQs for a single sample into shards, and gathering
+the per-shard outputs.
+
+* scatter_fastqs writes the paired input FASTQs for a sample as shards with similar numbers of records
+* bgzf_shards finds the virtual offsets of similarly sized shards of BGZF input FASTQs, without writing
+* gather concatenates per-shard outputs into the sample's output directory
+
+Shards are only ever cut on record boundaries, with the same records in the R1 and R2 shards.
+"""
+
+import os
+import gzip
+import zlib
+import struct
+import bisect
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from pathlib import Path
+from basespace_commons.environment import Environment
+from basespace_commons.fastq_stats import count_fastq, estimate_fastq, line_batches
+from basespace_commons.merge import concatenate
+
+
+class FastqShard(NamedTuple):
+    """ A shard of the records for a sample, written to R1 (and R2, if paired) FASTQs. """
+    shard_idx: int
+    fastq_r1: Path
+    fastq_r2: Optional[Path]
+    first_record: int
+    records: int
+
+
+class BgzfRange(NamedTuple):
+    """
+    A range of a BGZF file, from the start virtual offset (inclusive) to the end virtual offset
+    (exclusive), or the end of the file if None.  A virtual offset is the offset of a BGZF block in
+    the file shifted left 16 bits, plus the offset within the decompressed block.
+    """
+    path: Path
+    start: int
+    end: Optional[int]
+
+
+class BgzfShard(NamedTuple):
+    """ A shard of the records for a sample, as ranges of the R1 (and R2, if paired) BGZF FASTQs. """
+    shard_idx: int
+    r1: List[BgzfRange]
+    r2: Optional[List[BgzfRange]]
+    first_record: int
+    records: int
+
+
+class ScatterDefaults(object):
+
+    # The gzip compression level for the shards, favouring speed since shards are intermediates
+    CompressLevel = 1
+
+    # The number of records to read and write at a time
+    BatchSize = 16384
+
+
+def _shard_starts(total: int, num_shards: int) -> List[int]:
+    """ The index of the first record in each of the given number of shards of the total records. """
+    return [total * i // num_shards for i in range(num_shards)]
+
+
+def _write_shards(fastqs: Sequence[Path], paths: Sequence[Path], starts: Sequence[int], compress_level: int) -> List[int]:
+    """
+    Writes the records in the given FASTQs, in order, to the shard paths, with each shard starting
+    at the given record index, and the last shard receiving all remaining records.  Returns the
+    number of records written to each shard.
+    """
+    records = [0] * len(paths)
+
+    def batches() -> Iterator[List[bytes]]:
+        for fastq in fastqs:
+            yield from line_batches(path=fastq, batch_size=ScatterDefaults.BatchSize)
+
+    shard_idx = 0
+    total = 0
+    fh = None
+    tmp_paths = [path.with_name(f'.{path.name}.{os.getpid()}.tmp') for path in paths]
+    try:
+        fh = gzip.open(str(tmp_paths[0]), 'wb', compresslevel=compress_level)
+        for lines in batches():
+            offset = 0
+            num_records = len(lines) // 4
+            while offset < num_records:
+                # move to the next shard when the current one is full
+                while shard_idx + 1 < len(paths) and starts[shard_idx + 1] <= total:
+                    fh.close()
+                    shard_idx += 1
+                    fh = gzip.open(str(tmp_paths[shard_idx]), 'wb', compresslevel=compress_level)
+                end = num_records if shard_idx + 1 == len(paths) else min(num_records, offset + starts[shard_idx + 1] - total)
+                fh.write(b'\n'.join(lines[offset * 4:end * 4]) + b'\n')
+                records[shard_idx] += end - offset
+                total += end - offset
+                offset = end
+        fh.close()
+        # create any remaining (empty) shards
+        for i in range(shard_idx + 1, len(paths)):
+            with gzip.open(str(tmp_paths[i]), 'wb', compresslevel=compress_level):
+                pass
+        for tmp_path, path in zip(tmp_paths, paths):
+            os.replace(str(tmp_path), str(path))
+    except BaseException:
+        if fh is not None:
+            fh.close()
+        for tmp_path in tmp_paths:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        raise
+    return records
+
+
+def scatter_fastqs(env: Environment,
+                   sample_idx: int,
+                   num_shards: int,
+                   out_dir: Optional[Path]=None,
+                   exact: bool=False,
+                   compress_level: int=ScatterDefaults.CompressLevel) -> List[FastqShard]:
+    """
+    Splits the input FASTQs for the ith sample (see Environment.input_sample_fastqs()), across all
+    lanes, into the given number of shards with similar numbers of records, written to
+    shard-<shard-idx>_R<end>_001.fastq.gz in the given directory, or <tmp-dir>/scatter/<sample-name>
+    by default.
+
+    The number of records is estimated (see estimate_fastq()), or counted if exact is True, from
+    the R1 FASTQs.  When estimated, the last shard receives all remaining records, and may be
+    larger or smaller than the others (or, rarely, a trailing shard may be empty).  The R1 and R2
+    FASTQs are written concurrently, and an exception raised if they have different numbers of
+    records.
+    """
+    assert num_shards > 0, f"num_shards must be greater than zero, was {num_shards}"
+    sample_name, _ = env.sample_name_and_id(sample_idx)
+    fastqs_r1, fastqs_r2 = env.input_sample_fastqs(sample_idx=sample_idx)
+    out_dir = out_dir if out_dir is not None else env.tmp_dir() / 'scatter' / sample_name
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    fn = count_fastq if exact else estimate_fastq
+    total = sum(fn(fastq).reads for fastq in fastqs_r1)
+    starts = _shard_starts(total=total, num_shards=num_shards)
+
+    ends = [1, 2] if fastqs_r2 else [1]
+    paths = {end: [out_dir / f'shard-{i:04d}{Environment.fq_ext(end=end)}' for i in range(num_shards)] for end in ends}
+    with ThreadPoolExecutor(max_workers=len(ends)) as executor:
+        futures = {end: executor.submit(_write_shards, fastqs_r1 if end == 1 else fastqs_r2, paths[end], starts, compress_level) for end in ends}
+        records = {end: future.result() for end, future in futures.items()}
+    if len(ends) == 2 and records[1] != records[2]:
+        raise Exception(f"R1 and R2 FASTQs for sample '{sample_name}' have different numbers of records ({sum(records[1])} and {sum(records[2])})")
+
+    shards = []
+    first_record = 0
+    for i in range(num_shards):
+        shards.append(FastqShard(
+                shard_idx    = i,
+                fastq_r1     = paths[1][i],
+                fastq_r2     = paths[2][i] if len(ends) == 2 else None,
+                first_record = first_record,
+                records      = records[1][i]
+                ))
+        first_record += records[1][i]
+    return shards
+
+
+# The magic bytes, compression method (deflate), and flags (FEXTRA) that start every BGZF block
+_BgzfMagic = b'\x1f\x8b\x08\x04'
+
+
+def _bgzf_block_size(header: bytes, extra: bytes) -> Optional[int]:
+    """ Gets the total size of a BGZF block from its header and extra field, or None if not BGZF. """
+    if not header.startswith(_BgzfMagic):
+        return None
+    offset = 0
+    while offset + 4 <= len(extra):
+        si1, si2, slen = extra[offset], extra[offset + 1], struct.unpack_from('<H', extra, offset + 2)[0]
+        if si1 == 66 and si2 == 67 and slen == 2:
+            return struct.unpack_from('<H', extra, offset + 4)[0] + 1
+        offset += 4 + slen
+    return None
+
+
+def is_bgzf(path: Path) -> bool:
+    """ True if the file starts with a BGZF block. """
+    with open(str(path), 'rb') as fh:
+        header = fh.read(12)
+        if len(header) < 12:
+            return False
+        return _bgzf_block_size(header=header, extra=fh.read(struct.unpack_from('<H', header, 10)[0])) is not None
+
+
+def _bgzf_blocks(path: Path, offset: int=0) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yields the offset of each BGZF block in the file, from the block at the given offset onwards,
+    and its decompressed data.
+    """
+    with open(str(path), 'rb') as fh:
+        fh.seek(offset)
+        while True:
+            header = fh.read(12)
+            if not header:
+                break
+            extra = fh.read(struct.unpack_from('<H', header, 10)[0]) if len(header) == 12 else b''
+            size = _bgzf_block_size(header=header, extra=extra)
+            if size is None:
+                raise Exception(f"Not a BGZF block at offset {offset} in '{path}'")
+            rest = fh.read(size - len(header) - len(extra))
+            yield offset, zlib.decompress(header + extra + rest, zlib.MAX_WBITS | 16)
+            offset += size
+
+
+class _BgzfLineIndex(object):
+    """ The number of lines before each block of a BGZF file, for finding the offset of a line. """
+
+    def __init__(self, path: Path):
+        self.path: Path = path
+        self.offsets: array = array('q')
+        self.lines_after: array = array('q')
+        lines = 0
+        ends_with_newline = True
+        for offset, data in _bgzf_blocks(path):
+            lines += data.count(b'\n')
+            self.offsets.append(offset)
+            self.lines_after.append(lines)
+            if data:
+                ends_with_newline = data.endswith(b'\n')
+        if not ends_with_newline:
+            lines += 1
+        if lines % 4 != 0:
+            raise Exception(f"Truncated FASTQ record at the end of '{path}'")
+        self.records: int = lines // 4
+
+    def virtual_offset(self, record: int) -> Optional[int]:
+        """ The virtual offset of the start of the given record, or None if the end of the file. """
+        if record == 0:
+            return 0
+        line = 4 * record
+        block = bisect.bisect_left(self.lines_after, line)
+        if block >= len(self.offsets):
+            return None
+        lines_before = self.lines_after[block - 1] if block > 0 else 0
+        with open(str(self.path), 'rb') as fh:
+            fh.seek(self.offsets[block])
+            header = fh.read(12)
+            extra = fh.read(struct.unpack_from('<H', header, 10)[0])
+            size = _bgzf_block_size(header=header, extra=extra)
+            data = zlib.decompress(header + extra + fh.read(size - len(header) - len(extra)), zlib.MAX_WBITS | 16)
+        position = -1
+        for _ in range(line - lines_before):
+            position = data.index(b'\n', position + 1)
+        if position + 1 < len(data):
+            return (self.offsets[block] << 16) | (position + 1)
+        # the record starts at the beginning of the next block
+        return None if block + 1 >= len(self.offsets) else self.offsets[block + 1] << 16
+
+
+def _bgzf_ranges(indexes: Sequence[_BgzfLineIndex], start: int, end: Optional[int]) -> List[BgzfRange]:
+    """ Gets the ranges of the files holding records [start, end) of their concatenation. """
+    ranges = []
+    first = 0
+    for index in indexes:
+        last = first + index.records
+        if first < last and start < last and (end is None or first < end):
+            range_start = index.virtual_offset(max(0, start - first))
+            range_end = None if end is None or end >= last else index.virtual_offset(end - first)
+            ranges.append(BgzfRange(path=index.path, start=range_start, end=range_end))
+        first = last
+    return ranges
+
+
+def bgzf_shards(env: Environment, sample_idx: int, num_shards: int, workers: int=4) -> List[BgzfShard]:
+    """
+    Splits the BGZF input FASTQs for the ith sample (see Environment.input_sample_fastqs()),
+    across all lanes, into the given number of shards with equal numbers of records (to within
+    one), without writing any files.  Each shard is given as the ranges of the input FASTQs (see
+    BgzfRange) holding its records, in order, which may span more than one lane.
+
+    Each FASTQ is decompressed once (without recompression) to count the lines in each BGZF block,
+    on a pool of at most the given number of threads.  Raises an exception if a FASTQ is not BGZF,
+    or the R1 and R2 FASTQs have different numbers of records.
+    """
+    assert num_shards > 0, f"num_shards must be greater than zero, was {num_shards}"
+    assert workers > 0, f"workers must be greater than zero, was {workers}"
+    sample_name, _ = env.sample_name_and_id(sample_idx)
+    fastqs_r1, fastqs_r2 = env.input_sample_fastqs(sample_idx=sample_idx)
+    for fastq in fastqs_r1 + fastqs_r2:
+        if not is_bgzf(fastq):
+            raise Exception(f"FASTQ is not BGZF: '{fastq}'")
+    with ThreadPoolExecutor(max_workers=min(workers, len(fastqs_r1) + len(fastqs_r2))) as executor:
+        indexes = list(executor.map(_BgzfLineIndex, fastqs_r1 + fastqs_r2))
+    indexes_r1, indexes_r2 = indexes[:len(fastqs_r1)], indexes[len(fastqs_r1):]
+
+    total = sum(index.records for index in indexes_r1)
+    if indexes_r2 and sum(index.records for index in indexes_r2) != total:
+        raise Exception(f"R1 and R2 FASTQs for sample '{sample_name}' have different numbers of records ({total} and {sum(index.records for index in indexes_r2)})")
+
+    starts = _shard_starts(total=total, num_shards=num_shards)
+    shards = []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < num_shards else None
+        shards.append(BgzfShard(
+                shard_idx    = i,
+                r1           = _bgzf_ranges(indexes=indexes_r1, start=start, end=end),
+                r2           = _bgzf_ranges(indexes=indexes_r2, start=start, end=end) if indexes_r2 else None,
+                first_record = start,
+                records      = (total if end is None else end) - start
+                ))
+    return shards
+
+
+def read_bgzf_range(bgzf_range: BgzfRange) -> Iterator[bytes]:
+    """ Yields the decompressed data in the given range of a BGZF file, a block at a time. """
+    start_block, start_offset = bgzf_range.start >> 16, bgzf_range.start & 0xFFFF
+    end_block, end_offset = (None, None) if bgzf_range.end is None else (bgzf_range.end >> 16, bgzf_range.end & 0xFFFF)
+    for offset, data in _bgzf_blocks(path=bgzf_range.path, offset=start_block):
+        if end_block is not None and offset >= end_block:
+            if offset == end_block:
+                yield data[start_offset if offset == start_block else 0:end_offset]
+            break
+        yield data[start_offset if offset == start_block else 0:]
+
+
+def gather(env: Environment, sample_name: str, parts: Sequence[Path], name: str) -> Path:
+    """
+    Concatenates the per-shard outputs, in order, into a file with the given name in the sample's
+    output directory (see Environment.output_sample_dir()), without recompression (see
+    merge.concatenate()).  Returns the path to the file.
+    """
+    return concatenate(sources=parts, dest=env.output_sample_dir(sample_name) / name)
@@ -0,0 +1,180 @@
+"""This module implements management of the scratch space in the temporary directory.
+
+* ScratchManager hands out per-sample and per-step workspaces, enforcing a quota by evicting the
+  least recently used reclaimable workspaces
+"""
+
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from pathlib import Path
+from collections import OrderedDict
+from basespace_commons.environment import Environment
+
+
+def disk_usage(path: Path) -> int:
+    """ Gets the total size in bytes of the files under the given path. """
+    total = 0
+    stack = [str(path)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_size
+        except FileNotFoundError:
+            pass
+    return total
+
+
+class _Workspace(object):
+    """ The state of a single workspace. """
+
+    __slots__ = ('path', 'size', 'reclaimable', 'pins')
+
+    def __init__(self, path: Path, reclaimable: bool):
+        self.path: Path = path
+        self.size: int = 0
+        self.reclaimable: bool = reclaimable
+        self.pins: int = 0
+
+
+class ScratchManager(object):
+    """
+    Hands out workspaces under the temporary directory (see Environment.tmp_dir()), one per sample
+    and step, at <tmp-dir>/workspaces/<sample-name>/<step>, and records their sizes.
+
+    A workspace is in use from when it is acquired until it is released, after which its size is
+    measured.  If a quota is given, the least recently used workspaces that are reclaimable (i.e.
+    contain intermediates that can be re-created) and not in use are evicted (deleted) to keep the
+    total size within the quota.  Workspaces for a sample should be cleaned up with
+    complete_sample() when all work for the sample completes.
+
+    Workspaces are tracked in memory, so a single manager should be shared by all the threads in a
+    process.
+    """
+
+    def __init__(self, env: Environment, quota_bytes: Optional[int]=None, root: Optional[Path]=None):
+        """ Creates a new manager with the given byte quota (None for unlimited). """
+        assert quota_bytes is None or quota_bytes >= 0, f"quota_bytes must be non-negative, was {quota_bytes}"
+        self.__root: Path = root if root is not None else env.tmp_dir() / 'workspaces'
+        self.__quota_bytes: Optional[int] = quota_bytes
+        self.__workspaces: 'OrderedDict[Tuple[str, str], _Workspace]' = OrderedDict()
+        self.__reserved: Dict[Tuple[str, str], int] = {}
+        self.__lock = threading.RLock()
+
+    def root(self) -> Path:
+        """ The directory containing all the workspaces. """
+        return self.__root
+
+    def quota_bytes(self) -> Optional[int]:
+        """ The byte quota, or None if unlimited. """
+        return self.__quota_bytes
+
+    def used_bytes(self) -> int:
+        """ The total measured size of all workspaces, plus the bytes reserved by those in use. """
+        with self.__lock:
+            return sum(w.size for w in self.__workspaces.values()) + sum(self.__reserved.values())
+
+    def workspaces(self) -> List[Path]:
+        """ The paths to all workspaces, from least to most recently used. """
+        with self.__lock:
+            return [w.path for w in self.__workspaces.values()]
+
+    def acquire(self, sample_name: str, step: str, reclaimable: bool=True, reserve_bytes: int=0) -> Path:
+        """
+        Gets the workspace for the given sample and step, creating it if necessary, and marks it as
+        in use.  If a quota is set, space for the given number of bytes is reserved until the
+        workspace is no longer in use, evicting other workspaces as needed.  Raises an exception if the
+        reservation cannot fit within the quota.
+        """
+        key = (sample_name, step)
+        with self.__lock:
+            # NB: check the reservation can fit before evicting anything, so a failure deletes nothing
+            if self.__quota_bytes is not None:
+                evictable = sum(w.size for k, w in self.__workspaces.items() if k != key and w.reclaimable and w.pins == 0)
+                if self.used_bytes() - evictable + reserve_bytes > self.__quota_bytes:
+                    raise Exception(f"Could not reserve {reserve_bytes} bytes for '{sample_name}/{step}' within the scratch quota of {self.__quota_bytes} bytes ({self.used_bytes()} bytes in use)")
+            workspace = self.__workspaces.get(key)
+            if workspace is None:
+                workspace = _Workspace(path=self.__root / sample_name / step, reclaimable=reclaimable)
+                self.__workspaces[key] = workspace
+            workspace.reclaimable = reclaimable
+            workspace.pins += 1
+            self.__workspaces.move_to_end(key)
+            self.__reserved[key] = self.__reserved.get(key, 0) + reserve_bytes
+            self.__enforce_quota()
+        workspace.path.mkdir(parents=True, exist_ok=True)
+        return workspace.path
+
+    def release(self, sample_name: str, step: str) -> int:
+        """
+        Marks the workspace for the given sample and step as no longer in use, measures its size,
+        and evicts workspaces as needed to keep within the quota.  Returns the workspace's size.
+        """
+        size = disk_usage(self.__root / sample_name / step)
+        with self.__lock:
+            workspace = self.__workspaces[(sample_name, step)]
+            workspace.size = size
+            self.__unpin(key=(sample_name, step))
+            self.__enforce_quota()
+        return size
+
+    def __unpin(self, key: Tuple[str, str]) -> None:
+        """ Marks the workspace as used by one fewer caller, removing its reservation once unused. """
+        workspace = self.__workspaces[key]
+        workspace.pins -= 1
+        if workspace.pins == 0:
+            self.__reserved.pop(key, None)
+
+    @contextmanager
+    def workspace(self, sample_name: str, step: str, reclaimable: bool=True, reserve_bytes: int=0) -> Iterator[Path]:
+        """ Acquires the workspace for the given sample and step, and releases it on exit.  See acquire(). """
+        path = self.acquire(sample_name=sample_name, step=step, reclaimable=reclaimable, reserve_bytes=reserve_bytes)
+        try:
+            yield path
+        finally:
+            self.release(sample_name=sample_name, step=step)
+
+    def touch(self, sample_name: str, step: str) -> None:
+        """ Marks the workspace for the given sample and step as the most recently used. """
+        with self.__lock:
+            self.__workspaces.move_to_end((sample_name, step))
+
+    def __enforce_quota(self) -> List[Path]:
+        """ Evicts the least recently used reclaimable workspaces not in use until within the quota. """
+        evicted = []
+        if self.__quota_bytes is None:
+            return evicted
+        for key, workspace in list(self.__workspaces.items()):
+            if self.used_bytes() <= self.__quota_bytes:
+                break
+            if workspace.reclaimable and workspace.pins == 0:
+                shutil.rmtree(str(workspace.path), ignore_errors=True)
+                del self.__workspaces[key]
+                evicted.append(workspace.path)
+        return evicted
+
+    def evict(self, sample_name: str, step: str) -> None:
+        """ Deletes the workspace for the given sample and step, which must not be in use. """
+        with self.__lock:
+            workspace = self.__workspaces.get((sample_name, step))
+            if workspace is None:
+                return
+            assert workspace.pins == 0, f"Workspace '{sample_name}/{step}' is in use"
+            shutil.rmtree(str(workspace.path), ignore_errors=True)
+            del self.__workspaces[(sample_name, step)]
+
+    def complete_sample(self, sample_name: str) -> None:
+        """ Deletes all the workspaces for the given sample, none of which may be in use. """
+        with self.__lock:
+            keys = [key for key in self.__workspaces.keys() if key[0] == sample_name]
+            for key in keys:
+                assert self.__workspaces[key].pins == 0, f"Workspace '{key[0]}/{key[1]}' is in use"
+            for key in keys:
+                del self.__workspaces[key]
+            shutil.rmtree(str(self.__root / sample_name), ignore_errors=True)
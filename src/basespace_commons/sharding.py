@@ -0,0 +1,109 @@
+"""This module implements assigning samples to shards (ex. nodes or cores) by cost.
+
+* ShardPlan bin-packs samples into shards, longest-processing-time first
+"""
+
+import os
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from basespace_commons.environment import Environment, EnvironmentDefaults
+
+
+class Shard(NamedTuple):
+    """ The samples, by index, assigned to a shard, and their total cost. """
+    shard_idx: int
+    sample_indexes: List[int]
+    cost: int
+
+
+class ShardPlan(object):
+    """
+    An assignment of samples to shards that balances the total cost per shard.
+
+    Samples are assigned with longest-processing-time-first scheduling: in order of decreasing cost,
+    each sample is assigned to the shard with the least total cost so far.  The plan is
+    deterministic, so every node computing the plan for the same inputs agrees on which samples
+    are its own.
+    """
+
+    def __init__(self, env: Environment, costs: Sequence[int], num_shards: int):
+        """ Assigns the samples in the environment, with the given costs, to the given number of shards. """
+        assert num_shards > 0, f"num_shards must be greater than zero, was {num_shards}"
+        assert len(costs) == env.num_samples(), f"Found {len(costs)} costs for {env.num_samples()} samples"
+        self.__env: Environment = env
+        self.__costs: List[int] = list(costs)
+        self.__sample_shards: List[int] = [0] * len(costs)
+
+        shard_samples: List[List[int]] = [[] for _ in range(num_shards)]
+        shard_costs: List[int] = [0] * num_shards
+        heap: List[Tuple[int, int]] = [(0, shard_idx) for shard_idx in range(num_shards)]
+        for sample_idx in sorted(range(len(costs)), key=lambda i: (-costs[i], i)):
+            cost, shard_idx = heapq.heappop(heap)
+            shard_samples[shard_idx].append(sample_idx)
+            shard_costs[shard_idx] = cost + costs[sample_idx]
+            self.__sample_shards[sample_idx] = shard_idx
+            heapq.heappush(heap, (shard_costs[shard_idx], shard_idx))
+
+        self.__shards: List[Shard] = [
+            Shard(shard_idx=shard_idx, sample_indexes=sorted(shard_samples[shard_idx]), cost=shard_costs[shard_idx])
+            for shard_idx in range(num_shards)
+        ]
+
+    def num_shards(self) -> int:
+        """ The number of shards. """
+        return len(self.__shards)
+
+    def shards(self) -> List[Shard]:
+        """ All the shards. """
+        return self.__shards
+
+    def shard(self, shard_idx: int) -> Shard:
+        """ Gets the shard with the given index. """
+        return self.__shards[shard_idx]
+
+    def shard_of(self, sample_idx: int) -> int:
+        """ Gets the index of the shard the given sample is assigned to. """
+        return self.__sample_shards[sample_idx]
+
+    def samples_for(self, shard_idx: int) -> List[Tuple[int, str, str]]:
+        """ Gets the index, name and id of each sample assigned to the given shard, in sample order. """
+        return [(sample_idx,) + self.__env.sample_name_and_id(sample_idx) for sample_idx in self.__shards[shard_idx].sample_indexes]
+
+    def cost(self, sample_idx: int) -> int:
+        """ Gets the cost of the given sample. """
+        return self.__costs[sample_idx]
+
+    def makespan(self) -> int:
+        """ The largest total cost of any shard. """
+        return max(shard.cost for shard in self.__shards)
+
+    @staticmethod
+    def input_bytes(env: Environment, workers: int=EnvironmentDefaults.DefaultIoWorkers) -> List[int]:
+        """
+        Gets the total size in bytes of the input FASTQs (see Environment.input_sample_fastqs()) for
+        each sample, in sample order.  The samples are processed concurrently on a pool of at most
+        the given number of threads.  Raises an exception if any sample's FASTQs cannot be found.
+        """
+        results = env.all_input_fastqs(workers=workers)
+        errors = [r for r in results if r.error is not None]
+        if errors:
+            raise Exception(f"Could not find the input FASTQs for {len(errors)} sample(s):\n\t" + '\n\t'.join(f"{r.sample_name}: {r.error}" for r in errors))
+
+        def total_bytes(paths) -> int:
+            return sum(os.stat(str(p)).st_size for p in paths)
+
+        if not results:
+            return []
+        with ThreadPoolExecutor(max_workers=min(workers, len(results))) as executor:
+            return list(executor.map(total_bytes, [r.fastqs_r1 + r.fastqs_r2 for r in results]))
+
+    @staticmethod
+    def plan(env: Environment, num_shards: int, costs: Optional[Sequence[int]]=None, workers: int=EnvironmentDefaults.DefaultIoWorkers) -> 'ShardPlan':
+        """
+        Assigns the samples in the environment to the given number of shards.  If costs are not
+        given, each sample's cost is the total size of its input FASTQs (see input_bytes()).
+        """
+        if costs is None:
+            costs = ShardPlan.input_bytes(env=env, workers=workers)
+        return ShardPlan(env=env, costs=costs, num_shards=num_shards)
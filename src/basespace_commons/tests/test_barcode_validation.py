@@ -0,0 +1,60 @@
+import unittest
+import itertools
+
+try:
+    import numpy
+    from basespace_commons.barcode_validation import pack_barcodes, validate_barcodes
+except ImportError:
+    numpy = None
+from basespace_commons.sample import Sample
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestBarcodeValidation(unittest.TestCase):
+
+    @staticmethod
+    def build_samples(barcodes, lanes=None):
+        if lanes is None:
+            data = "Sample_ID,Sample_Name,Sample_Barcode\n" + "\n".join(f"{i+1},N{i+1},{b}" for i, b in enumerate(barcodes))
+        else:
+            data = "Lane,Sample_ID,Sample_Name,Sample_Barcode\n" + "\n".join(f"{l},{i+1},N{i+1},{b}" for i, (l, b) in enumerate(zip(lanes, barcodes)))
+        return Sample.samples_from(data=data, sample_barcode_column='sample_barcode', logging=False)
+
+    def test_pack_barcodes(self):
+        packed, masks = pack_barcodes(['ACGT', 'AANA'])
+        self.assertEqual(packed.shape, (2, 1))
+        self.assertEqual(int(packed[0, 0]), 0 | (1 << 2) | (2 << 4) | (3 << 6))
+        self.assertEqual(int(masks[0, 0]), 0)
+        self.assertEqual(int(masks[1, 0]), 1 << 4)
+        packed, masks = pack_barcodes(['A' * 40])
+        self.assertEqual(packed.shape, (1, 2))
+
+    def test_validate_barcodes(self):
+        barcodes = ['AAAAAAAA', 'AAAAAACC', 'CCCCCCCC', 'AAAAAAAN']
+        validation = validate_barcodes(samples=TestBarcodeValidation.build_samples(barcodes), min_distance=3)
+        self.assertFalse(validation.ok())
+        self.assertSetEqual(set((c.sample_idx1, c.sample_idx2, c.distance) for c in validation.collisions), {(0, 1, 2), (0, 3, 1), (1, 3, 2)})
+        self.assertListEqual(validation.sample_min_distances, [1, 2, 6, 1])
+        self.assertDictEqual(validation.lane_collisions, {None: 3})
+
+        validation = validate_barcodes(samples=TestBarcodeValidation.build_samples(barcodes), min_distance=1)
+        self.assertTrue(validation.ok())
+
+    def test_validate_barcodes_by_lane(self):
+        samples = TestBarcodeValidation.build_samples(['AAAA-CCCC', 'AAAA-CCCC', 'AAAA-CCCG', 'GGGG-TTTT'], lanes=['1', '2', '2', '2'])
+        validation = validate_barcodes(samples=samples, min_distance=2)
+        self.assertListEqual([(c.lane, c.sample_idx1, c.sample_idx2) for c in validation.collisions], [('2', 1, 2)])
+        self.assertListEqual(validation.sample_min_distances, [None, 1, 1, 8])
+        self.assertDictEqual(validation.lane_collisions, {'1': 0, '2': 1})
+
+    def test_validate_barcodes_in_blocks(self):
+        barcodes = [''.join(b) for b in itertools.product('ACGT', repeat=4)]
+        samples = TestBarcodeValidation.build_samples(barcodes)
+        expected = validate_barcodes(samples=samples, min_distance=2, block_size=len(barcodes))
+        actual = validate_barcodes(samples=samples, min_distance=2, block_size=7)
+        self.assertEqual(len(expected.collisions), len(barcodes) * 12 // 2)
+        self.assertSetEqual(set(actual.collisions), set(expected.collisions))
+        self.assertListEqual(actual.sample_min_distances, [1] * len(barcodes))
+
+    def test_validate_barcodes_different_lengths(self):
+        with self.assertRaises(Exception):
+            validate_barcodes(samples=TestBarcodeValidation.build_samples(['AAAA', 'AAA']), min_distance=1)
@@ -0,0 +1,59 @@
+import unittest
+
+from basespace_commons.barcodes import BarcodeIndex
+from basespace_commons.sample import Sample
+
+class TestBarcodeIndex(unittest.TestCase):
+
+    @staticmethod
+    def build_samples(barcodes):
+        data = "Sample_ID,Sample_Name,Sample_Barcode\n" + "\n".join(f"{i+1},N{i+1},{b}" for i, b in enumerate(barcodes))
+        return Sample.samples_from(data=data, sample_barcode_column='Sample_Barcode', logging=False)
+
+    def test_neighbours(self):
+        self.assertListEqual(list(BarcodeIndex.neighbours('AC', 0)), [('AC', 0)])
+        neighbours = dict(BarcodeIndex.neighbours('AC', 1))
+        self.assertEqual(len(neighbours), 1 + 2 * 4)
+        self.assertEqual(neighbours['NC'], 1)
+        self.assertEqual(len(dict(BarcodeIndex.neighbours('AC', 2))), 5 * 5)
+
+    def test_lookup(self):
+        samples = TestBarcodeIndex.build_samples(['AAAAAAAA', 'CCCCCCCC', 'AAAAAATT'])
+        index = BarcodeIndex(samples=samples, max_mismatches=1)
+        self.assertEqual(index.max_mismatches(), 1)
+
+        match = index.lookup('AAAAAAAA')
+        self.assertEqual(match.status, BarcodeIndex.Matched)
+        self.assertEqual(match.sample.sample_id(), '1')
+        self.assertEqual(match.mismatches, 0)
+
+        match = index.lookup('CCCNCCCC')
+        self.assertEqual(match.status, BarcodeIndex.Matched)
+        self.assertEqual(match.sample.sample_id(), '2')
+        self.assertEqual(match.mismatches, 1)
+
+        # one mismatch from both the first and third samples
+        match = index.lookup('AAAAAAAT')
+        self.assertEqual(match.status, BarcodeIndex.Ambiguous)
+        self.assertIsNone(match.sample)
+        self.assertEqual(match.mismatches, 1)
+
+        match = index.lookup('GGGGGGGG')
+        self.assertEqual(match.status, BarcodeIndex.Unmatched)
+        self.assertIsNone(match.sample)
+        self.assertIsNone(match.mismatches)
+
+        self.assertListEqual([m.status for m in index.lookup_all(['aaaaaaaa', 'CCCCCCC'])], [BarcodeIndex.Matched, BarcodeIndex.Unmatched])
+
+    def test_lookup_dual_index(self):
+        samples = TestBarcodeIndex.build_samples(['ACGT-TTTT', 'ACGT-GGGG'])
+        index = BarcodeIndex(samples=samples, max_mismatches=1)
+        self.assertEqual(index.lookup('ACGA-TTTA').sample.sample_id(), '1')
+        self.assertEqual(index.lookup('ACGA+TTTA').mismatches, 2)
+        self.assertEqual(index.lookup('ACGAGGGA').sample.sample_id(), '2')
+        # two mismatches in a single index
+        self.assertEqual(index.lookup('ACGTTTAA').status, BarcodeIndex.Unmatched)
+
+    def test_inconsistent_lengths(self):
+        with self.assertRaises(Exception):
+            BarcodeIndex(samples=TestBarcodeIndex.build_samples(['ACGT', 'ACGTA']))
@@ -0,0 +1,61 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from basespace_commons.campaign import Campaign
+from basespace_commons.environment import Environment
+from basespace_commons.tests import test_environment
+
+class TestCampaign(unittest.TestCase):
+
+    @staticmethod
+    def build():
+        root_dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.root_dir')).resolve()
+        sessions_dir = root_dir / 'sessions'
+        write = test_environment.TestEnvironment.write_app_session
+        for name, samples_key, samples in [
+                ('s1', 'Input.Samples', [{'Id' : 'id1', 'Name' : 'name1'}, {'Id' : 'id2', 'Name' : 'name2'}]),
+                ('s2', 'Input.sample-id', [{'Id' : 'id2', 'Name' : 'name2'}]),
+                ('s3', 'Input.BioSamples', [{'Id' : 'id3', 'UserSampleId' : 'name3'}, {'Id' : 'id1', 'UserSampleId' : 'name1'}]),
+                ('s4', None, None)]:
+            (sessions_dir / name).mkdir(parents=True)
+            write(sessions_dir / name, samples_key=samples_key, samples=samples)
+        for sample_name, sample_id in [('name1', 'id1'), ('name3', 'id3')]:
+            sample_dir = root_dir / 'input' / 'samples' / sample_id
+            sample_dir.mkdir(parents=True)
+            (sample_dir / (sample_name + Environment.fq_ext(end=1))).write_text('r1')
+        return root_dir, sessions_dir
+
+    def test_load_dir(self):
+        root_dir, sessions_dir = TestCampaign.build()
+        campaign = Campaign.load_dir(sessions_dir, pattern='*/AppSession.json', root_dir=root_dir, workers=2, index=True)
+        self.assertEqual(len(campaign), 3)
+        self.assertListEqual(list(campaign.errors().keys()), [sessions_dir / 's4' / 'AppSession.json'])
+        self.assertListEqual(campaign.sample_ids(), ['id1', 'id2', 'id3'])
+        self.assertListEqual(campaign.merged().sample_names_and_ids(), [('name1', 'id1'), ('name2', 'id2'), ('name3', 'id3')])
+        self.assertListEqual([p.parent.name for p in campaign.sessions('id1')], ['s1', 's3'])
+        self.assertListEqual(campaign.sessions('missing'), [])
+        env = campaign.environments()[sessions_dir / 's3' / 'AppSession.json']
+        self.assertListEqual(env.sample_names_and_ids(), [('name3', 'id3'), ('name1', 'id1')])
+        self.assertEqual(env.root_dir(), root_dir)
+
+    def test_input_fastqs(self):
+        root_dir, sessions_dir = TestCampaign.build()
+        campaign = Campaign.load(sorted(sessions_dir.glob('s[123]/AppSession.json')), root_dir=root_dir, workers=2)
+        fastqs = campaign.all_input_fastqs(workers=2)
+        self.assertListEqual([f.sample_id for f in fastqs], ['id1', 'id2', 'id3'])
+        self.assertIsNone(fastqs[0].error)
+        self.assertIsNotNone(fastqs[1].error)
+        self.assertEqual(campaign.input_sample_fastqs('id3').fastqs_r1, [root_dir / 'input' / 'samples' / 'id3' / 'name3_R1_001.fastq.gz'])
+
+        session = campaign.session_input_fastqs(sessions_dir / 's3' / 'AppSession.json')
+        self.assertListEqual([(f.sample_idx, f.sample_id) for f in session], [(0, 'id3'), (1, 'id1')])
+        self.assertIs(session[1].fastqs_r1, fastqs[0].fastqs_r1)
+
+    def test_empty(self):
+        campaign = Campaign.load([], workers=1)
+        self.assertEqual(len(campaign), 0)
+        self.assertListEqual(campaign.all_input_fastqs(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import hashlib
+import unittest
+
+from basespace_commons import checksums
+from basespace_commons.checksums import ChecksumDefaults, ChecksumManifest, checksum_file
+from basespace_commons.tests import test_environment
+
+class TestChecksums(unittest.TestCase):
+
+    @staticmethod
+    def write_outputs(env):
+        sample_dir = env.output_sample_dir('name1')
+        (sample_dir / 'metrics').mkdir(parents=True)
+        (sample_dir / 'name1.bam').write_bytes(b'bam' * 1000)
+        (sample_dir / 'metrics' / 'name1.txt').write_text('metrics')
+        (env.output_project_dir() / 'summary.txt').write_text('summary')
+
+    def test_checksum_file(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        TestChecksums.write_outputs(env)
+        path = env.output_sample_dir('name1') / 'name1.bam'
+        md5, crc = checksum_file(path, buffer_size=7)
+        self.assertEqual(md5, hashlib.md5(b'bam' * 1000).hexdigest())
+        if checksums._crc32c is None:
+            self.assertIsNone(crc)
+        else:
+            self.assertEqual(crc, f'{checksums._crc32c.crc32c(b"bam" * 1000):08x}')
+
+    def test_build(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        TestChecksums.write_outputs(env)
+        manifest = ChecksumManifest.build(env, workers=2)
+        self.assertEqual(manifest.num_hashed(), 3)
+        self.assertListEqual([c.path for c in manifest], ['name1/metrics/name1.txt', 'name1/name1.bam', 'summary.txt'])
+        self.assertEqual(manifest.get('summary.txt').md5, hashlib.md5(b'summary').hexdigest())
+        self.assertTrue((env.tmp_dir() / ChecksumDefaults.ManifestFileName).exists())
+
+        # nothing changed
+        manifest = ChecksumManifest.build(env, workers=2)
+        self.assertEqual(manifest.num_hashed(), 0)
+        self.assertEqual(len(manifest), 3)
+
+        # one file changed, one added, and one removed
+        summary = env.output_project_dir() / 'summary.txt'
+        summary.write_text('changed summary')
+        os.utime(str(summary), ns=(0, 12345))
+        (env.output_sample_dir('name1') / 'new.txt').write_text('new')
+        (env.output_sample_dir('name1') / 'metrics' / 'name1.txt').unlink()
+        manifest = ChecksumManifest.build(env, workers=2)
+        self.assertEqual(manifest.num_hashed(), 2)
+        self.assertListEqual([c.path for c in manifest], ['name1/name1.bam', 'name1/new.txt', 'summary.txt'])
+        self.assertEqual(manifest.get('summary.txt').md5, hashlib.md5(b'changed summary').hexdigest())
+
+        md5sums = env.tmp_dir() / 'md5sums.txt'
+        manifest.write_md5sums(md5sums)
+        self.assertIn(f"{hashlib.md5(b'new').hexdigest()}  name1/new.txt\n", md5sums.read_text())
+
+    def test_manifest_in_dir_is_excluded(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        TestChecksums.write_outputs(env)
+        manifest_path = env.output_project_dir() / 'checksums.json'
+        ChecksumManifest.build(env, manifest_path=manifest_path)
+        manifest = ChecksumManifest.build(env, manifest_path=manifest_path)
+        self.assertEqual(manifest.num_hashed(), 0)
+        self.assertIsNone(manifest.get('checksums.json'))
+
+if __name__ == '__main__':
+    unittest.main()
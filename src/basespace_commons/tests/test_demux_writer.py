@@ -0,0 +1,62 @@
+import gzip
+import tempfile
+import unittest
+from pathlib import Path
+
+from basespace_commons.demux_writer import BgzfEof, DemuxWriter, bgzf_compress
+from basespace_commons.sample import Sample
+from basespace_commons.scatter import is_bgzf
+
+class TestDemuxWriter(unittest.TestCase):
+
+    @staticmethod
+    def build_samples(num_samples):
+        data = "Sample_ID,Sample_Name,Sample_Barcode\n" + "\n".join(f"{i},N{i},{'ACGT'[i % 4] * 8}" for i in range(1, num_samples + 1))
+        return Sample.samples_from(data=data, sample_barcode_column='sample_barcode', logging=False)
+
+    def test_bgzf_compress(self):
+        data = bytes(range(256)) * 1000
+        compressed = bgzf_compress(data) + BgzfEof
+        self.assertEqual(gzip.decompress(compressed), data)
+        self.assertEqual(bgzf_compress(b''), b'')
+
+    def test_write(self):
+        dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.demux_writer'))
+        samples = TestDemuxWriter.build_samples(num_samples=5)
+        expected = {}
+        with DemuxWriter(dir=dir, max_open=2, buffer_size=64) as writer:
+            for i in range(50):
+                for end in [1, 2]:
+                    # NB: a new view of the sample each time
+                    sample = samples[i % 5]
+                    record = f'@q{i}/{end}\nACGT\n+\nFFFF\n'.encode('ascii')
+                    writer.write_fq(sample=sample, end=end, data=record)
+                    path = sample.fq(dir=dir, end=end)
+                    expected[path] = expected.get(path, b'') + record
+                self.assertLessEqual(writer.num_open(), 2)
+            writer.write_bam(sample=samples[0], data=b'BAM\x01')
+            writer.write_fq(sample=samples[0], end=1, data=b'@u\nA\n+\nF\n', unmatched=True)
+        self.assertEqual(len(writer.paths()), 12)
+        self.assertEqual(len(expected), 10)
+        for path, data in expected.items():
+            self.assertTrue(is_bgzf(path))
+            self.assertEqual(gzip.decompress(path.read_bytes()), data)
+            self.assertTrue(path.read_bytes().endswith(BgzfEof))
+        self.assertEqual(gzip.decompress(samples[0].bam(dir=dir).read_bytes()), b'BAM\x01')
+        self.assertEqual(gzip.decompress(samples[0].fq(dir=dir, end=1, unmatched=True).read_bytes()), b'@u\nA\n+\nF\n')
+
+    def test_max_buffered(self):
+        dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.demux_writer'))
+        samples = TestDemuxWriter.build_samples(num_samples=3)
+        writer = DemuxWriter(dir=dir, buffer_size=1000, max_buffered=100)
+        writer.write_fq(sample=samples[0], end=1, data=b'0' * 60)
+        self.assertFalse(samples[0].fq(dir=dir, end=1).exists())
+        writer.write_fq(sample=samples[1], end=1, data=b'1' * 50)
+        self.assertTrue(samples[0].fq(dir=dir, end=1).exists())
+        self.assertFalse(samples[1].fq(dir=dir, end=1).exists())
+        writer.close()
+        with self.assertRaises(AssertionError):
+            writer.write_fq(sample=samples[2], end=1, data=b'2')
+
+if __name__ == '__main__':
+    unittest.main()
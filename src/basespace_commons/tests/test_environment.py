@@ -1,3 +1,7 @@
+import os
+import json
+import pickle
+import asyncio
 import unittest
 import tempfile
 from pathlib import Path
@@ -53,6 +57,13 @@ class TestEnvironment(unittest.TestCase):
         with self.assertRaises(AssertionError):
             Environment.fq_ext(end=3)
 
+    def test_make_output_sample_dirs(self):
+        env, root_dir = TestEnvironment.build_default()
+        env.output_sample_dir('name2').mkdir(parents=True)
+        dirs = env.make_output_sample_dirs(['name1', 'name2', 'name1'])
+        self.assertListEqual(dirs, [env.output_sample_dir('name1'), env.output_sample_dir('name2')])
+        self.assertTrue(all(d.is_dir() for d in dirs))
+
     def test_input_sample_dir(self):
         env, root_dir = TestEnvironment.build_default()
         sample_ids = [tup[1] for tup in env.sample_names_and_ids()]
@@ -102,23 +113,144 @@ class TestEnvironment(unittest.TestCase):
             self.assertListEqual(f1_actual, [f1])
             self.assertListEqual(f2_actual, [f2])
 
-            # read two has two FASTQs
-            f2buggy = sample_dir / (sample_name + ".buggy" + Environment.fq_ext(end=1))
-            with open(f2buggy, 'w') as fh: fh.write("dummy")
+            # read one has two FASTQs
+            f1lane2 = sample_dir / f"{sample_name}_S1_L002{Environment.fq_ext(end=1)}"
+            with open(f1lane2, 'w') as fh: fh.write("dummy")
             with self.assertRaises(Exception):
                 env.input_sample_fastqs(sample_idx=sample_idx)
 
-    # TODO: input_sample_fastqs() sample name has underscores, replaced by dashes
+            # read one and two have different lanes
+            f2lane3 = sample_dir / f"{sample_name}_S1_L003{Environment.fq_ext(end=2)}"
+            with open(f2lane3, 'w') as fh: fh.write("dummy")
+            with self.assertRaises(Exception):
+                env.input_sample_fastqs(sample_idx=sample_idx)
+
+    def test_input_sample_fastqs_exact_names_and_lane_order(self):
+        env = Environment(app_option_dict={}, sample_ids=['id1', 'id2'], sample_names=['A1', 'my_sample'],
+                          output_project_id='output_project_id', output_project_name='output_project_name',
+                          app_result_name='app_result_name', root_dir=Path(tempfile.mkdtemp(prefix='tmp.', suffix='.root_dir')).resolve())
+        sample_dir = env.root_dir() / 'input' / 'samples' / 'id1'
+        sample_dir.mkdir(parents=True)
+        for name in ['A1_S1_L002', 'A1_S1_L001', 'A10_S10_L001']:
+            for end in [1, 2]:
+                (sample_dir / f"{name}{Environment.fq_ext(end=end)}").write_text("dummy")
+        (sample_dir / 'A1_S1_L001_I1_001.fastq.gz').write_text("dummy")
+        (sample_dir / 'A1_S1_L003_R1_001.fastq.gz.md5').write_text("dummy")
+        fastqs_r1, fastqs_r2 = env.input_sample_fastqs(sample_idx=0)
+        self.assertListEqual([p.name for p in fastqs_r1], ['A1_S1_L001_R1_001.fastq.gz', 'A1_S1_L002_R1_001.fastq.gz'])
+        self.assertListEqual([p.name for p in fastqs_r2], ['A1_S1_L001_R2_001.fastq.gz', 'A1_S1_L002_R2_001.fastq.gz'])
+
+        # underscores in the sample name are replaced by dashes
+        sample_dir = env.root_dir() / 'input' / 'samples' / 'id2'
+        sample_dir.mkdir(parents=True)
+        (sample_dir / f"my-sample_S2_L001{Environment.fq_ext(end=1)}").write_text("dummy")
+        self.assertListEqual([p.name for p in env.input_sample_fastqs(sample_idx=1)[0]], ['my-sample_S2_L001_R1_001.fastq.gz'])
+
+    def test_all_input_fastqs(self):
+        env, root_dir = TestEnvironment.build_default()
+        sample_name, sample_id = env.sample_names_and_ids()[1]
+        sample_dir = env.root_dir() / 'input' / 'samples' / sample_id
+        sample_dir.mkdir(parents=True)
+        f1 = (sample_dir / (sample_name + Environment.fq_ext(end=1))).resolve()
+        with open(f1, 'w') as fh: fh.write("dummy")
+
+        def check(results):
+            self.assertListEqual([r.sample_idx for r in results], [0, 1])
+            self.assertListEqual([r.sample_name for r in results], ['name1', 'name2'])
+            self.assertListEqual([r.sample_id for r in results], ['id1', 'id2'])
+            self.assertIsNotNone(results[0].error)
+            self.assertListEqual(results[0].fastqs_r1, [])
+            self.assertIsNone(results[1].error)
+            self.assertListEqual(results[1].fastqs_r1, [f1])
+            self.assertListEqual(results[1].fastqs_r2, [])
+
+        check(env.all_input_fastqs(workers=2))
+        loop = asyncio.new_event_loop()
+        try:
+            check(loop.run_until_complete(env.all_input_fastqs_async(workers=2)))
+        finally:
+            loop.close()
+
+    @staticmethod
+    def write_app_session(root_dir, samples_key='Input.Samples', samples=None):
+        if samples is None:
+            samples = [{'Id' : 'id1', 'Name' : 'name1'}, {'Id' : 'id2', 'Name' : 'name2'}]
+        items = [
+            {'Name' : 'Input.project-id', 'Content' : {'Id' : 'output_project_id', 'Name' : 'output_project_name'}},
+            {'Name' : 'Input.some-key', 'Content' : 'some-value'},
+            {'Name' : 'Input.no-value'},
+        ]
+        if samples_key == 'Input.sample-id':
+            items.append({'Name' : samples_key, 'Content' : samples[0]})
+        elif samples_key is not None:
+            items.append({'Name' : samples_key, 'Items' : samples})
+        path = root_dir / 'AppSession.json'
+        with path.open('w') as fh:
+            json.dump({'Name' : 'app_result_name', 'Properties' : {'Items' : items}, 'Other' : list(range(10))}, fh)
+        return path
 
-    # from() handle app options with "Content"
-    # from() handle app options with "Items"
-    # from() handle input samples Input.BioSamples
-    # from() handle input samples Input.sample-id
-    # from() handle input samples Input.Samples
-    # from() exception with missing input samples
     def test_from_json(self):
+        root_dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.root_dir')).resolve()
+
+        # Input.Samples, with app options with "Content" and "Items"
+        env = Environment.from_json(TestEnvironment.write_app_session(root_dir), root_dir=root_dir)
+        self.assertListEqual(env.sample_names_and_ids(), [('name1', 'id1'), ('name2', 'id2')])
+        self.assertEqual(env.output_project_id(), 'output_project_id')
+        self.assertEqual(env.output_project_name(), 'output_project_name')
+        self.assertEqual(env.app_result_name(), 'app_result_name')
+        self.assertEqual(env.root_dir(), root_dir)
+        self.assertEqual(env['Input.some-key'], 'some-value')
+        self.assertListEqual(env['Input.Samples'], [{'Id' : 'id1', 'Name' : 'name1'}, {'Id' : 'id2', 'Name' : 'name2'}])
+        self.assertNotIn('Input.no-value', env)
+
+        # Input.sample-id
+        env = Environment.from_json(TestEnvironment.write_app_session(root_dir, samples_key='Input.sample-id'), root_dir=root_dir)
+        self.assertListEqual(env.sample_names_and_ids(), [('name1', 'id1')])
+
+        # Input.BioSamples
+        samples = [{'Id' : 'id1', 'UserSampleId' : 'name1'}]
+        env = Environment.from_json(TestEnvironment.write_app_session(root_dir, samples_key='Input.BioSamples', samples=samples), root_dir=root_dir)
+        self.assertListEqual(env.sample_names_and_ids(), [('name1', 'id1')])
+
+        # missing input samples
+        with self.assertRaises(Exception):
+            Environment.from_json(TestEnvironment.write_app_session(root_dir, samples_key=None), root_dir=root_dir)
 
-        pass
+    def test_from_json_use_snapshot(self):
+        root_dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.root_dir')).resolve()
+        path = TestEnvironment.write_app_session(root_dir)
+        env = Environment.from_json(path, root_dir=root_dir, use_snapshot=True)
+        self.assertEqual(len(list(env.tmp_dir().glob('*.pickle'))), 1)
+        self.assertListEqual(env.sample_names_and_ids(), [('name1', 'id1'), ('name2', 'id2')])
+
+        # loaded from the snapshot, even if the file is unreadable
+        stat = path.stat()
+        with path.open('r+') as fh:
+            fh.write('X')
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        env = Environment.from_json(path, root_dir=root_dir, use_snapshot=True)
+        self.assertListEqual(env.sample_names_and_ids(), [('name1', 'id1'), ('name2', 'id2')])
+        self.assertEqual(env['Input.some-key'], 'some-value')
+
+        # the snapshot is stale once the file is modified
+        path = TestEnvironment.write_app_session(root_dir, samples_key='Input.sample-id')
+        env = Environment.from_json(path, root_dir=root_dir, use_snapshot=True)
+        self.assertListEqual(env.sample_names_and_ids(), [('name1', 'id1')])
+        self.assertEqual(len(list(env.tmp_dir().glob('*.pickle'))), 1)
+
+        # a snapshot that is not a (key, snapshot) pair, or whose snapshot is not a dict, is re-parsed
+        snapshot_path = next(env.tmp_dir().glob('*.pickle'))
+        for data in [pickle.dumps(['not', 'a', 'pair']), pickle.dumps(42), pickle.dumps((pickle.loads(snapshot_path.read_bytes())[0], 'not a dict'))]:
+            snapshot_path.write_bytes(data)
+            env = Environment.from_json(path, root_dir=root_dir, use_snapshot=True)
+            self.assertListEqual(env.sample_names_and_ids(), [('name1', 'id1')])
+
+    def test_snapshot(self):
+        env, root_dir = TestEnvironment.build_default()
+        copy = Environment.from_snapshot(pickle.loads(pickle.dumps(env.snapshot())))
+        self.assertListEqual(copy.sample_names_and_ids(), env.sample_names_and_ids())
+        self.assertEqual(copy.output_project_dir(), env.output_project_dir())
+        self.assertEqual(copy['some-key'], 'some-value')
 
     # tests for set/get/del from the environment
     def test_get(self):
@@ -0,0 +1,32 @@
+import unittest
+from pathlib import Path
+
+from basespace_commons.fastq_names import FastqName, group_fastqs, read_fastqs
+
+class TestFastqNames(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(FastqName.parse('A1_S1_L002_R1_001.fastq.gz'), FastqName(name='A1', sample_number=1, lane=2, read='R1', chunk=1))
+        self.assertEqual(FastqName.parse('my_sample_S12_L001_I2_003.fastq.gz'), FastqName(name='my_sample', sample_number=12, lane=1, read='I2', chunk=3))
+        self.assertEqual(FastqName.parse('name1_R2_001.fastq.gz'), FastqName(name='name1', sample_number=None, lane=None, read='R2', chunk=1))
+        self.assertEqual(FastqName.parse('name1_L001_R1_001.fastq.gz'), FastqName(name='name1', sample_number=None, lane=1, read='R1', chunk=1))
+        self.assertIsNone(FastqName.parse('A1_S1_L001_R1_001.fastq.gz.md5'))
+        self.assertIsNone(FastqName.parse('A1_S1_L001_R3_001.fastq.gz'))
+        self.assertIsNone(FastqName.parse('A1.fastq.gz'))
+
+    def test_group_fastqs(self):
+        names = ['A1_S1_L002_R1_001.fastq.gz', 'A1_S1_L001_R1_002.fastq.gz', 'A1_S1_L001_R1_001.fastq.gz',
+                 'A1_S1_L001_R2_001.fastq.gz', 'A1_S1_L001_I1_001.fastq.gz', 'A10_S2_L001_R1_001.fastq.gz', 'README']
+        groups = group_fastqs((name, Path(name)) for name in names)
+        self.assertListEqual(sorted(groups.keys()), ['A1', 'A10'])
+        self.assertListEqual(list(groups['A1'].keys()), [1, 2])
+        self.assertListEqual(sorted(groups['A1'][1].keys()), ['I1', 'R1', 'R2'])
+        self.assertListEqual([(order, p.name) for order, p in read_fastqs(groups['A1'], 'R1')], [
+            ((1, 1), 'A1_S1_L001_R1_001.fastq.gz'),
+            ((1, 2), 'A1_S1_L001_R1_002.fastq.gz'),
+            ((2, 1), 'A1_S1_L002_R1_001.fastq.gz')
+        ])
+        self.assertListEqual(read_fastqs(groups['A10'], 'R2'), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import gzip
+import tempfile
+import unittest
+from pathlib import Path
+
+try:
+    import numpy
+    from basespace_commons.fastq_reader import read_batches, sample_batches
+except ImportError:
+    numpy = None
+from basespace_commons.tests import test_environment
+
+def write_fastq(path, names, records_per_member=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    records = [f'@{name}\nACGT{i % 10}\n+\nFFFF{i % 10}\n'.encode('ascii') for i, name in enumerate(names)]
+    step = records_per_member or max(1, len(records))
+    path.write_bytes(b''.join(gzip.compress(b''.join(records[i:i + step])) for i in range(0, len(records), step)))
+    return path
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestFastqReader(unittest.TestCase):
+
+    def test_read_batches(self):
+        dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.fastq_reader'))
+        names = [f'q{i} 1:N:0:ACGT' for i in range(10)]
+        path = write_fastq(dir / 'test.fastq.gz', names, records_per_member=3)
+        batches = list(read_batches(path, batch_size=4, buffer_size=16, prefetch=1))
+        self.assertListEqual([len(b.names) for b in batches], [4, 4, 2])
+        self.assertListEqual([n.decode() for b in batches for n in b.names], names)
+        self.assertEqual(batches[0].seqs[1], b'ACGT1')
+        self.assertEqual(batches[2].quals[1], b'FFFF9')
+        self.assertEqual(batches[0].seqs.dtype.kind, 'S')
+
+    def test_read_batches_truncated(self):
+        dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.fastq_reader'))
+        path = dir / 'test.fastq.gz'
+        path.write_bytes(gzip.compress(b'@q0\nACGT\n+\nFFFF\n@q1\nACGT\n'))
+        with self.assertRaises(Exception):
+            list(read_batches(path, batch_size=1))
+
+    def test_read_batches_closed_early(self):
+        dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.fastq_reader'))
+        path = write_fastq(dir / 'test.fastq.gz', [f'q{i}' for i in range(100)])
+        batches = read_batches(path, batch_size=1, prefetch=1)
+        self.assertEqual(next(batches).names[0], b'q0')
+        batches.close()
+
+    def test_sample_batches(self):
+        env, root_dir = test_environment.TestEnvironment.build_default()
+        sample_dir = root_dir / 'input' / 'samples' / 'id1'
+        for lane in [2, 1]:
+            for end in [1, 2]:
+                write_fastq(sample_dir / f'name1_S1_L00{lane}_R{end}_001.fastq.gz', [f'L{lane}q{i}/{end}' for i in range(5)])
+        batches = list(sample_batches(env, sample_idx=0, batch_size=2))
+        self.assertListEqual([b.fastq_r1.name for b in batches], ['name1_S1_L001_R1_001.fastq.gz'] * 3 + ['name1_S1_L002_R1_001.fastq.gz'] * 3)
+        self.assertListEqual([n for b in batches for n in b.r1.names][:3], [b'L1q0/1', b'L1q1/1', b'L1q2/1'])
+        self.assertListEqual([n for b in batches for n in b.r2.names][-1:], [b'L2q4/2'])
+
+        write_fastq(sample_dir / 'name1_S1_L002_R2_001.fastq.gz', [f'L2q{i}/2' for i in range(4)])
+        with self.assertRaises(Exception):
+            list(sample_batches(env, sample_idx=0, batch_size=2))
+
+if __name__ == '__main__':
+    unittest.main()
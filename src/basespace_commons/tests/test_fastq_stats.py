@@ -0,0 +1,89 @@
+import gzip
+import random
+import unittest
+import tempfile
+from pathlib import Path
+
+from basespace_commons.environment import Environment
+from basespace_commons.fastq_stats import count_fastq, estimate_fastq, line_batches, sample_fastq_stats
+from basespace_commons.tests import test_environment
+
+def fastq_records(num_records, length=100, seed=42):
+    rng = random.Random(seed)
+    for i in range(num_records):
+        bases = ''.join(rng.choice('ACGT') for _ in range(length))
+        quals = ''.join(rng.choice('#,:F') for _ in range(length))
+        yield f'@read:{i} 1:N:0:ACGT\n{bases}\n+\n{quals}\n'.encode('ascii')
+
+def write_fastq(path, num_records, length=100, records_per_member=None):
+    records = list(fastq_records(num_records, length))
+    with open(path, 'wb') as fh:
+        if records_per_member is None:
+            fh.write(gzip.compress(b''.join(records)))
+        else:
+            for i in range(0, len(records), records_per_member):
+                fh.write(gzip.compress(b''.join(records[i:i + records_per_member])))
+    return Path(path)
+
+class TestFastqStats(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.fastq_stats'))
+
+    def test_count_fastq(self):
+        for records_per_member in [None, 7]:
+            path = write_fastq(self.dir / 'test.fastq.gz', num_records=101, length=50, records_per_member=records_per_member)
+            stats = count_fastq(path, buffer_size=1000)
+            self.assertTrue(stats.exact)
+            self.assertEqual(stats.reads, 101)
+            self.assertEqual(stats.bases, 101 * 50)
+            self.assertEqual(stats.file_size, path.stat().st_size)
+
+    def test_count_fastq_without_trailing_newline(self):
+        path = self.dir / 'test.fastq.gz'
+        path.write_bytes(gzip.compress(b'@r1\nACGT\n+\nFFFF\n@r2\nAC\n+\nFF'))
+        stats = count_fastq(path)
+        self.assertEqual(stats.reads, 2)
+        self.assertEqual(stats.bases, 6)
+
+    def test_truncated_fastq(self):
+        for records_per_member in [None, 100]:
+            path = write_fastq(self.dir / 'test.fastq.gz', num_records=1000, records_per_member=records_per_member)
+            data = path.read_bytes()
+            path.write_bytes(data[:len(data) // 2])
+            with self.assertRaises(Exception):
+                count_fastq(path)
+            with self.assertRaises(Exception):
+                list(line_batches(path, batch_size=10))
+
+    def test_estimate_fastq_multi_member(self):
+        path = write_fastq(self.dir / 'test.fastq.gz', num_records=5000, length=100, records_per_member=50)
+        stats = estimate_fastq(path, num_windows=4, window_size=8192)
+        self.assertFalse(stats.exact)
+        self.assertAlmostEqual(stats.reads, 5000, delta=500)
+        self.assertAlmostEqual(stats.bases, 5000 * 100, delta=50000)
+
+    def test_estimate_fastq_single_member(self):
+        path = write_fastq(self.dir / 'test.fastq.gz', num_records=5000, length=100)
+        stats = estimate_fastq(path, num_windows=4, window_size=8192)
+        self.assertFalse(stats.exact)
+        self.assertAlmostEqual(stats.reads, 5000, delta=500)
+        self.assertAlmostEqual(stats.bases, 5000 * 100, delta=50000)
+
+    def test_estimate_small_fastq_is_exact(self):
+        path = write_fastq(self.dir / 'test.fastq.gz', num_records=10)
+        stats = estimate_fastq(path)
+        self.assertTrue(stats.exact)
+        self.assertEqual(stats.reads, 10)
+
+    def test_sample_fastq_stats(self):
+        env, root_dir = test_environment.TestEnvironment.build_default()
+        sample_dir = env.root_dir() / 'input' / 'samples' / 'id2'
+        sample_dir.mkdir(parents=True)
+        write_fastq(sample_dir / ('name2' + Environment.fq_ext(end=1)), num_records=10, length=30)
+        write_fastq(sample_dir / ('name2' + Environment.fq_ext(end=2)), num_records=10, length=20)
+        stats = sample_fastq_stats(env, sample_idx=1, exact=True)
+        self.assertEqual(stats.sample_name, 'name2')
+        self.assertEqual(stats.reads, 20)
+        self.assertEqual(stats.bases, 10 * 30 + 10 * 20)
+        self.assertEqual(len(stats.fastqs), 2)
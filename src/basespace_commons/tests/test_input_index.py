@@ -0,0 +1,109 @@
+import os
+import unittest
+import tempfile
+from pathlib import Path
+
+from basespace_commons.input_index import InputIndex
+from basespace_commons.tests import test_environment
+
+class TestInputIndex(unittest.TestCase):
+
+    @staticmethod
+    def build_samples_dir():
+        samples_dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.samples')).resolve()
+        basecalls = samples_dir / 'id1' / 'Data' / 'Intensities' / 'BaseCalls'
+        basecalls.mkdir(parents=True)
+        (basecalls / 'name1_R1_001.fastq.gz').write_text('r1')
+        (basecalls / 'name1_R2_001.fastq.gz').write_text('r2')
+        (basecalls / 'SampleSheet.csv').write_text('sheet')
+        flat = samples_dir / 'id2'
+        flat.mkdir()
+        (flat / 'name2_R1_001.fastq.gz').write_text('r1')
+        return samples_dir
+
+    def test_scan(self):
+        samples_dir = TestInputIndex.build_samples_dir()
+        index = InputIndex(samples_dir=samples_dir)
+        self.assertEqual(index.scan(), 2)
+        self.assertListEqual(index.sample_ids(), ['id1', 'id2'])
+
+        basecalls = samples_dir / 'id1' / 'Data' / 'Intensities' / 'BaseCalls'
+        self.assertEqual(index.input_dir('id1', try_alternate=False), basecalls)
+        self.assertEqual(index.input_dir('id1', try_alternate=True), basecalls)
+        self.assertListEqual([f.name for f in index.fastqs('id1')], ['name1_R1_001.fastq.gz', 'name1_R2_001.fastq.gz'])
+        self.assertListEqual([f.size for f in index.fastqs('id1')], [2, 2])
+
+        self.assertIsNone(index.input_dir('id2', try_alternate=False))
+        self.assertEqual(index.input_dir('id2', try_alternate=True), samples_dir / 'id2')
+        self.assertListEqual([f.path for f in index.fastqs('id2')], [str(samples_dir / 'id2' / 'name2_R1_001.fastq.gz')])
+
+        self.assertIsNone(index.input_dir('id3'))
+        self.assertListEqual(index.fastqs('id3'), [])
+
+    def test_scan_requires_full_basecalls_path(self):
+        samples_dir = TestInputIndex.build_samples_dir()
+        (samples_dir / 'idBaseCalls').mkdir()
+        (samples_dir / 'idBaseCalls' / 'name3_R1_001.fastq.gz').write_text('r1')
+        (samples_dir / 'id4' / 'Data' / 'Intensities').mkdir(parents=True)
+        (samples_dir / 'id4' / 'name4_R1_001.fastq.gz').write_text('r1')
+        index = InputIndex(samples_dir=samples_dir)
+        index.scan()
+        self.assertIsNone(index.input_dir('idBaseCalls', try_alternate=False))
+        self.assertEqual(index.input_dir('idBaseCalls', try_alternate=True), samples_dir / 'idBaseCalls')
+        self.assertIsNone(index.input_dir('id4', try_alternate=False))
+        self.assertListEqual([f.name for f in index.fastqs('id4')], ['name4_R1_001.fastq.gz'])
+
+    def test_refresh_only_rescans_changed(self):
+        samples_dir = TestInputIndex.build_samples_dir()
+        index = InputIndex(samples_dir=samples_dir)
+        index.scan()
+        self.assertEqual(index.refresh(), 0)
+
+        # add a FASTQ to the second sample
+        flat = samples_dir / 'id2'
+        (flat / 'name2_R2_001.fastq.gz').write_text('r2')
+        os.utime(flat, ns=(0, 1))
+        self.assertEqual(index.refresh(), 1)
+        self.assertEqual(len(index.fastqs('id2')), 2)
+
+        # add a new sample
+        (samples_dir / 'id3').mkdir()
+        os.utime(samples_dir, ns=(0, 1))
+        self.assertEqual(index.refresh(), 1)
+        self.assertListEqual(index.sample_ids(), ['id1', 'id2', 'id3'])
+
+    def test_save_and_load(self):
+        samples_dir = TestInputIndex.build_samples_dir()
+        cache_path = samples_dir.parent / (samples_dir.name + '.index.json')
+
+        index = InputIndex.build(samples_dir=samples_dir, cache_path=cache_path)
+        self.assertTrue(cache_path.exists())
+
+        loaded = InputIndex.load(cache_path, samples_dir=samples_dir)
+        self.assertListEqual(loaded.sample_ids(), index.sample_ids())
+        self.assertListEqual(loaded.fastqs('id1'), index.fastqs('id1'))
+        self.assertEqual(loaded.refresh(), 0)
+
+        # a different directory does not use the cache
+        self.assertIsNone(InputIndex.load(cache_path, samples_dir=samples_dir / 'other'))
+        self.assertIsNone(InputIndex.load(cache_path.with_name('does-not-exist'), samples_dir=samples_dir))
+
+    def test_environment_served_from_index(self):
+        env, root_dir = test_environment.TestEnvironment.build_default()
+        for sample_name, sample_id in env.sample_names_and_ids():
+            sample_dir = env.input_samples_dir() / sample_id / 'Data' / 'Intensities' / 'BaseCalls'
+            sample_dir.mkdir(parents=True)
+            (sample_dir / (sample_name + '_R1_001.fastq.gz')).write_text('r1')
+        env.index_inputs()
+        self.assertTrue((env.tmp_dir() / InputIndex.CacheFileName).exists())
+
+        sample_dir = env.input_samples_dir() / 'id1' / 'Data' / 'Intensities' / 'BaseCalls'
+        self.assertEqual(env.input_sample_dir(sample_idx=0, try_alternate=False), sample_dir)
+        self.assertEqual(env.input_sample_fastqs(sample_idx=0), ([sample_dir / 'name1_R1_001.fastq.gz'], []))
+
+        # served from memory until re-indexed
+        (sample_dir / 'name1_R2_001.fastq.gz').write_text('r2')
+        self.assertEqual(env.input_sample_fastqs(sample_idx=0), ([sample_dir / 'name1_R1_001.fastq.gz'], []))
+        os.utime(sample_dir, ns=(0, 1))
+        env.index_inputs()
+        self.assertEqual(env.input_sample_fastqs(sample_idx=0), ([sample_dir / 'name1_R1_001.fastq.gz'], [sample_dir / 'name1_R2_001.fastq.gz']))
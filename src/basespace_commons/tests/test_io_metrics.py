@@ -0,0 +1,62 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from basespace_commons import io_metrics
+from basespace_commons.environment import Environment
+from basespace_commons.tests import test_environment
+
+class TestIoMetrics(unittest.TestCase):
+
+    def tearDown(self):
+        io_metrics.disable()
+
+    def test_disabled(self):
+        self.assertIsNone(io_metrics.metrics())
+        fs = io_metrics.filesystem
+        self.assertIs(fs.bind(operation='op', sample='name1'), fs)
+
+    def test_record(self):
+        metrics = io_metrics.IoMetrics()
+        metrics.record(sample='name1', operation='op1', call='stat', seconds=1.0)
+        metrics.record(sample='name1', operation='op1', call='stat', seconds=2.0)
+        metrics.record(sample='name2', operation='op2', call='scandir', seconds=0.5)
+        metrics.record(sample=None, operation='op2', call='stat', seconds=0.25)
+        self.assertEqual(metrics.total(), io_metrics.IoStats(count=4, seconds=3.75))
+        self.assertEqual(metrics.by_sample()['name1'], io_metrics.IoStats(count=2, seconds=3.0))
+        self.assertEqual(metrics.by_operation()['op2'], io_metrics.IoStats(count=2, seconds=0.75))
+        self.assertEqual(metrics.by_call()['stat'], io_metrics.IoStats(count=3, seconds=3.25))
+        self.assertListEqual([(c.sample, c.call, c.count) for c in metrics.calls()], [(None, 'stat', 1), ('name1', 'stat', 2), ('name2', 'scandir', 1)])
+        metrics.reset()
+        self.assertEqual(metrics.total().count, 0)
+
+    def test_environment(self):
+        env, root_dir = test_environment.TestEnvironment.build_default()
+        for sample_name, sample_id in env.sample_names_and_ids():
+            sample_dir = root_dir / 'input' / 'samples' / sample_id
+            sample_dir.mkdir(parents=True)
+            for end in [1, 2]:
+                (sample_dir / (sample_name + Environment.fq_ext(end=end))).touch()
+
+        dump_path = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.io_metrics')) / 'metrics.json'
+        metrics = Environment.enable_io_metrics(dump_path=dump_path)
+        self.assertIs(io_metrics.metrics(), metrics)
+        for sample_idx in range(env.num_samples()):
+            env.input_sample_fastqs(sample_idx=sample_idx)
+        env.make_output_sample_dirs(['name1', 'name2'])
+
+        by_sample = metrics.by_sample()
+        self.assertSetEqual(set(by_sample.keys()), set([None, 'name1', 'name2']))
+        self.assertEqual(by_sample['name1'].count, by_sample['name2'].count)
+        self.assertGreater(by_sample['name1'].count, 0)
+        self.assertSetEqual(set(metrics.by_operation().keys()), set(['input_sample_dir', 'input_sample_fastqs', 'make_output_sample_dirs']))
+        self.assertEqual(metrics.by_call()['scandir'].count, 3)
+
+        io_metrics._dump_at_exit()
+        with dump_path.open('r') as fh:
+            data = json.load(fh)
+        self.assertEqual(data['total']['count'], metrics.total().count)
+
+if __name__ == '__main__':
+    unittest.main()
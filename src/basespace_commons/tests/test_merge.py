@@ -0,0 +1,77 @@
+import os
+import gzip
+import errno
+import unittest
+from unittest import mock
+import tempfile
+from pathlib import Path
+
+from basespace_commons.merge import _copy, concatenate, lane_order, merge_all_lanes, merge_lanes
+from basespace_commons.tests import test_environment
+
+class TestMerge(unittest.TestCase):
+
+    @staticmethod
+    def write_lanes(env, sample_idx, lanes, paired=True):
+        sample_name, sample_id = env.sample_name_and_id(sample_idx)
+        sample_dir = env.root_dir() / 'input' / 'samples' / sample_id
+        sample_dir.mkdir(parents=True, exist_ok=True)
+        for lane in lanes:
+            for end in ([1, 2] if paired else [1]):
+                path = sample_dir / f'{sample_name}_S{sample_idx + 1}_L{lane:03d}_R{end}_001.fastq.gz'
+                path.write_bytes(gzip.compress(f'@{sample_name}:{lane}\nACGT\n+\nFFFF\n'.encode('ascii')))
+
+    def test_concatenate(self):
+        dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.merge'))
+        sources = []
+        for i in range(3):
+            sources.append(dir / f'{i}.txt')
+            sources[-1].write_bytes(str(i).encode('ascii') * (i + 1) * 1000)
+        dest = concatenate(sources=sources, dest=dir / 'out' / 'all.txt', buffer_size=100)
+        self.assertEqual(dest.read_bytes(), b''.join(s.read_bytes() for s in sources))
+        self.assertListEqual([p.name for p in dest.parent.iterdir()], ['all.txt'])
+
+    def test_copy_fallback(self):
+        dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.merge'))
+        (dir / 'src.txt').write_bytes(b'0123456789' * 100)
+
+        def unsupported(*args):
+            raise OSError(errno.ENOSYS, 'not supported')
+
+        # neither copy_file_range nor sendfile are supported, so read and write
+        with mock.patch.object(os, 'copy_file_range', unsupported, create=True), mock.patch.object(os, 'sendfile', unsupported, create=True):
+            src_fd = os.open(str(dir / 'src.txt'), os.O_RDONLY)
+            dst_fd = os.open(str(dir / 'dst.txt'), os.O_WRONLY | os.O_CREAT)
+            try:
+                _copy(src_fd=src_fd, dst_fd=dst_fd, size=1000, buffer_size=7)
+            finally:
+                os.close(src_fd)
+                os.close(dst_fd)
+        self.assertEqual((dir / 'dst.txt').read_bytes(), b'0123456789' * 100)
+
+    def test_lane_order(self):
+        paths = [Path('s_S1_L010_R1_001.fastq.gz'), Path('s_S1_L002_R1_001.fastq.gz'), Path('s_R1_001.fastq.gz')]
+        self.assertListEqual([p.name for p in lane_order(paths)], ['s_R1_001.fastq.gz', 's_S1_L002_R1_001.fastq.gz', 's_S1_L010_R1_001.fastq.gz'])
+
+    def test_merge_lanes(self):
+        env, root_dir = test_environment.TestEnvironment.build_default()
+        TestMerge.write_lanes(env, sample_idx=0, lanes=[3, 1, 2])
+        merged = merge_lanes(env, sample_idx=0)
+        self.assertEqual(merged.fastq_r1, env.output_sample_dir('name1') / 'name1_R1_001.fastq.gz')
+        self.assertEqual(merged.fastq_r2, env.output_sample_dir('name1') / 'name1_R2_001.fastq.gz')
+        expected = b''.join(f'@name1:{lane}\nACGT\n+\nFFFF\n'.encode('ascii') for lane in [1, 2, 3])
+        with gzip.open(merged.fastq_r1) as fh:
+            self.assertEqual(fh.read(), expected)
+        with gzip.open(merged.fastq_r2) as fh:
+            self.assertEqual(fh.read(), expected)
+
+    def test_merge_all_lanes(self):
+        env, root_dir = test_environment.TestEnvironment.build_default()
+        TestMerge.write_lanes(env, sample_idx=1, lanes=[1, 2], paired=False)
+        results = merge_all_lanes(env, to_tmp_dir=True, workers=2)
+        self.assertIsNotNone(results[0].error)
+        self.assertIsNone(results[1].error)
+        self.assertEqual(results[1].fastq_r1, env.tmp_dir() / 'name2' / 'name2_R1_001.fastq.gz')
+        self.assertIsNone(results[1].fastq_r2)
+        with gzip.open(results[1].fastq_r1) as fh:
+            self.assertEqual(fh.read().count(b'@name2'), 2)
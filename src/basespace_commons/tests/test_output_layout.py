@@ -0,0 +1,60 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+from basespace_commons.output_layout import OutputLayout
+from basespace_commons.sample import Sample
+
+class TestOutputLayout(unittest.TestCase):
+
+    @staticmethod
+    def build_samples(illumina_naming=False):
+        sample_sheet = """
+Sample_ID,Sample_Name,Sample_Barcode
+1,N1,AAAAAAAA
+2,N2,CCCCCCCC
+3,N3,GGGGGGGG
+        """
+        return Sample.samples_from(data=sample_sheet, illumina_naming=illumina_naming, sample_barcode_column='sample_barcode', logging=False)
+
+    def test_plan_matches_sample(self):
+        dir = Path('dir')
+        unmatched = Sample({'sample_name' : 'unmatched', 'sample_id' : 'id', 'sample_barcode' : 'NNNNNNNN'}, 4, sample_barcode_column='sample_barcode')
+        for illumina_naming in [False, True]:
+            samples = TestOutputLayout.build_samples(illumina_naming=illumina_naming)
+            layout = OutputLayout.plan(samples=samples, dir=dir, unmatched=unmatched)
+            self.assertEqual(len(layout), 4)
+            for i, sample in enumerate(samples):
+                self.assertEqual(layout[i].prefix, sample.prefix(illumina_naming=illumina_naming))
+                self.assertEqual(layout.bam(i), sample.bam(dir=dir))
+                self.assertEqual(layout.fq(i, end=1), sample.fq(dir=dir, end=1))
+                self.assertEqual(layout.fq(i, end=2), sample.fq(dir=dir, end=2))
+            self.assertTrue(layout[3].unmatched)
+            self.assertEqual(layout.bam(3), unmatched.bam(dir=dir, unmatched=True))
+
+        # override the naming
+        layout = OutputLayout.plan(samples=TestOutputLayout.build_samples(), dir=dir, illumina_naming=True)
+        self.assertEqual(layout.bam(0), dir / 'N1_S1_L001.bam')
+        self.assertEqual(layout.by_prefix('N2_S2_L001').sample_id, '2')
+        self.assertIsNone(layout.by_prefix('N4_S4_L001'))
+
+    def test_plan_collisions(self):
+        samples = [
+            Sample({'sample_name' : 'N1', 'sample_id' : '1', 'sample_barcode' : 'AAAAAAAA'}, 1),
+            Sample({'sample_name' : 'N1', 'sample_id' : '1', 'sample_barcode' : 'AAAAAAAA'}, 2),
+        ]
+        with self.assertRaises(Exception):
+            OutputLayout.plan(samples=samples, dir=Path('dir'), sample_barcode_column='sample_barcode')
+        layout = OutputLayout.plan(samples=samples, dir=Path('dir'), sample_barcode_column='sample_barcode', allow_collisions=True)
+        self.assertListEqual(list(layout.collisions().keys()), ['1-N1-AAAAAAAA'])
+        layout = OutputLayout.plan(samples=samples, dir=Path('dir'), illumina_naming=True)
+        self.assertDictEqual(layout.collisions(), {})
+
+    def test_save_and_load(self):
+        layout = OutputLayout.plan(samples=TestOutputLayout.build_samples(), dir=Path('dir'))
+        path = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.layout')) / 'manifest.json'
+        layout.save(path)
+        loaded = OutputLayout.load(path)
+        self.assertEqual(loaded.dir(), layout.dir())
+        self.assertListEqual(list(loaded), list(layout))
+
@@ -0,0 +1,58 @@
+import json
+import unittest
+
+from basespace_commons.output_writer import OutputWriter
+from basespace_commons.tests import test_environment
+
+class TestOutputWriter(unittest.TestCase):
+
+    def test_write(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        with OutputWriter(env=env, workers=2, max_pending=2) as writer:
+            for i in range(10):
+                writer.write_text(sample_name='name1', relpath=f'metrics/{i}.txt', text=str(i))
+            json_path = writer.write_json(sample_name='name2', relpath='summary.json', data={'reads': 10})
+            bytes_path = writer.write_bytes(sample_name=None, relpath='all.bin', data=b'\x00\x01')
+            writer.flush()
+            self.assertEqual(json.loads(json_path.read_text()), {'reads': 10})
+        metrics_dir = env.output_sample_dir('name1') / 'metrics'
+        self.assertListEqual(sorted(p.name for p in metrics_dir.iterdir()), sorted(f'{i}.txt' for i in range(10)))
+        self.assertEqual((metrics_dir / '7.txt').read_text(), '7')
+        self.assertEqual(bytes_path, env.output_project_dir() / 'all.bin')
+        self.assertEqual(bytes_path.read_bytes(), b'\x00\x01')
+
+    def test_overwrite(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        with OutputWriter(env=env) as writer:
+            path = writer.write_text(sample_name='name1', relpath='out.txt', text='first')
+            writer.flush()
+            writer.write_text(sample_name='name1', relpath='out.txt', text='second')
+        self.assertEqual(path.read_text(), 'second')
+        self.assertListEqual([p.name for p in path.parent.iterdir()], ['out.txt'])
+
+    def test_writes_to_the_same_path_in_order(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        with OutputWriter(env=env, workers=4) as writer:
+            for i in range(20):
+                path = writer.write_bytes(sample_name='name1', relpath='out.txt', data=b'first' * 1024 * 1024)
+                writer.write_text(sample_name='name1', relpath='out.txt', text='second')
+                writer.flush()
+                self.assertEqual(path.read_text(), 'second')
+        self.assertListEqual([p.name for p in path.parent.iterdir()], ['out.txt'])
+
+    def test_errors_raised_on_flush(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        writer = OutputWriter(env=env)
+        env.output_project_dir().mkdir(parents=True)
+        (env.output_project_dir() / 'name1').write_text('not a directory')
+        writer.write_text(sample_name='name1', relpath='out.txt', text='data')
+        with self.assertRaises(Exception):
+            writer.flush()
+        writer.write_text(sample_name='name2', relpath='out.txt', text='data')
+        writer.close()
+        self.assertEqual((env.output_sample_dir('name2') / 'out.txt').read_text(), 'data')
+        with self.assertRaises(AssertionError):
+            writer.write_text(sample_name='name2', relpath='out.txt', text='data')
+
+if __name__ == '__main__':
+    unittest.main()
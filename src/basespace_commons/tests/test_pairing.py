@@ -0,0 +1,66 @@
+import gzip
+import tempfile
+import unittest
+from pathlib import Path
+
+from basespace_commons.pairing import read_name, sample_pairs, validate_pair, validate_pairs
+from basespace_commons.tests import test_environment
+
+class TestPairing(unittest.TestCase):
+
+    @staticmethod
+    def write_fastq(path, names):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(gzip.compress(''.join(f'@{name}\nACGT\n+\nFFFF\n' for name in names).encode('ascii')))
+        return path
+
+    def test_read_name(self):
+        self.assertEqual(read_name(b'@q1/1\n'), b'q1')
+        self.assertEqual(read_name(b'@q1/2\n'), b'q1')
+        self.assertEqual(read_name(b'@M1:1:FC:1:1:1:1 1:N:0:ACGT\n'), b'M1:1:FC:1:1:1:1')
+        self.assertEqual(read_name(b'@q1\tcomment\n'), b'q1')
+
+    def test_validate_pair(self):
+        dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.pairing'))
+        r1 = TestPairing.write_fastq(dir / 'r1.fastq.gz', [f'q{i} 1:N:0:ACGT' for i in range(5)])
+
+        result = validate_pair(r1, TestPairing.write_fastq(dir / 'ok.fastq.gz', [f'q{i} 2:N:0:ACGT' for i in range(5)]))
+        self.assertTrue(result.ok())
+        self.assertEqual(result.records, 5)
+
+        result = validate_pair(r1, TestPairing.write_fastq(dir / 'names.fastq.gz', ['q0', 'q1', 'x2', 'q3', 'q4']))
+        self.assertFalse(result.ok())
+        self.assertEqual(result.mismatch_record, 2)
+
+        result = validate_pair(r1, TestPairing.write_fastq(dir / 'short.fastq.gz', [f'q{i}' for i in range(3)]))
+        self.assertEqual(result.mismatch_record, 3)
+        self.assertIn('R2 ended', result.mismatch)
+
+        truncated = dir / 'truncated.fastq.gz'
+        truncated.write_bytes(gzip.compress(b'@q0\nACGT\n+\nFFFF\n@q1\nACGT\n'))
+        result = validate_pair(r1, truncated)
+        self.assertEqual(result.mismatch_record, 1)
+        self.assertIn('Truncated', result.mismatch)
+
+    def test_validate_pairs(self):
+        env, root_dir = test_environment.TestEnvironment.build_default()
+        names = [f'q{i}' for i in range(10)]
+        for lane in [1, 2]:
+            for end in [1, 2]:
+                sample_dir = root_dir / 'input' / 'samples' / 'id1'
+                TestPairing.write_fastq(sample_dir / f'name1_S1_L00{lane}_R{end}_001.fastq.gz', names if lane == 1 or end == 1 else names[:-1])
+        TestPairing.write_fastq(root_dir / 'input' / 'samples' / 'id2' / 'name2_S2_L001_R1_001.fastq.gz', names)
+        TestPairing.write_fastq(root_dir / 'input' / 'samples' / 'id2' / 'name2_S2_L002_R2_001.fastq.gz', names)
+
+        self.assertListEqual(sorted(r2.name for _, r2 in sample_pairs(env, 0)), ['name1_S1_L001_R2_001.fastq.gz', 'name1_S1_L002_R2_001.fastq.gz'])
+        results = validate_pairs(env, workers=2)
+        self.assertEqual(len(results), 3)
+        by_lane = {r.fastq_r1.name: r for r in results[:2]}
+        self.assertTrue(by_lane['name1_S1_L001_R1_001.fastq.gz'].ok())
+        self.assertEqual(by_lane['name1_S1_L002_R1_001.fastq.gz'].mismatch_record, 9)
+        self.assertEqual(results[2].sample_name, 'name2')
+        self.assertIsNone(results[2].fastq_r1)
+        self.assertFalse(results[2].ok())
+
+if __name__ == '__main__':
+    unittest.main()
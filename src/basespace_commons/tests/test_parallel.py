@@ -0,0 +1,81 @@
+import os
+import unittest
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+from basespace_commons.environment import Environment
+from basespace_commons.tests import test_environment
+
+def write_fastqs(env):
+    for sample_name, sample_id in env.sample_names_and_ids():
+        sample_dir = env.root_dir() / 'input' / 'samples' / sample_id
+        sample_dir.mkdir(parents=True)
+        with open(sample_dir / (sample_name + Environment.fq_ext(end=1)), 'w') as fh: fh.write("dummy")
+
+def describe(env, task):
+    return (env.output_project_id(), task.sample_id, [p.name for p in task.fastqs_r1], task.fastqs_r2, task.output_dir)
+
+def crash_first(env, task):
+    # exits the worker process the first time sample zero is run
+    marker = env.root_dir() / 'crashed'
+    if task.sample_idx == 0 and not marker.exists():
+        marker.write_text('crashed')
+        os._exit(1)
+    return task.sample_name
+
+class TestParallel(unittest.TestCase):
+
+    def test_map_samples(self):
+        env, root_dir = test_environment.TestEnvironment.build_default()
+        write_fastqs(env)
+        for backend in ['thread', 'process']:
+            results = sorted(env.map_samples(describe, workers=2, backend=backend), key=lambda r: r.sample_idx)
+            self.assertListEqual([r.sample_idx for r in results], [0, 1])
+            self.assertListEqual([r.sample_name for r in results], ['name1', 'name2'])
+            self.assertListEqual([r.error for r in results], [None, None])
+            self.assertListEqual([r.attempts for r in results], [1, 1])
+            self.assertEqual(results[1].value, ('output_project_id', 'id2', ['name2_R1_001.fastq.gz'], [], env.output_sample_dir('name2')))
+
+    def test_map_samples_failures_and_retries(self):
+        env, root_dir = test_environment.TestEnvironment.build_default()
+        write_fastqs(env)
+        lock = threading.Lock()
+        attempts = {}
+
+        def flaky(env, task):
+            with lock:
+                attempts[task.sample_idx] = attempts.get(task.sample_idx, 0) + 1
+                if task.sample_idx == 0 or attempts[task.sample_idx] < 3:
+                    raise ValueError(f"failed {task.sample_name}")
+            return task.sample_name
+
+        results = sorted(env.map_samples(flaky, workers=2, retries=2), key=lambda r: r.sample_idx)
+        self.assertIsInstance(results[0].error, ValueError)
+        self.assertEqual(results[0].attempts, 3)
+        self.assertIsNone(results[1].error)
+        self.assertEqual(results[1].value, 'name2')
+        self.assertEqual(results[1].attempts, 3)
+
+        # only the given samples
+        results = list(env.map_samples(describe, workers=1, sample_indexes=[1]))
+        self.assertEqual(len(results), 1)
+        self.assertIsNone(results[0].error)
+
+    def test_map_samples_missing_inputs(self):
+        env, root_dir = test_environment.TestEnvironment.build_default()
+        results = list(env.map_samples(describe, workers=1))
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all(r.error is not None and r.value is None for r in results))
+
+    def test_map_samples_broken_process_pool(self):
+        env, root_dir = test_environment.TestEnvironment.build_default()
+        write_fastqs(env)
+        results = sorted(env.map_samples(crash_first, workers=1, backend='process'), key=lambda r: r.sample_idx)
+        self.assertIsInstance(results[0].error, BrokenProcessPool)
+        self.assertIsNone(results[1].error)
+        self.assertEqual(results[1].value, 'name2')
+
+        (root_dir / 'crashed').unlink()
+        results = sorted(env.map_samples(crash_first, workers=2, backend='process', retries=1), key=lambda r: r.sample_idx)
+        self.assertListEqual([r.error for r in results], [None, None])
+        self.assertListEqual([r.value for r in results], ['name1', 'name2'])
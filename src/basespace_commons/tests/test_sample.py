@@ -1,7 +1,10 @@
+import io
+import tracemalloc
 import unittest
+import tempfile
 from pathlib import Path
 
-from basespace_commons.sample import Sample
+from basespace_commons.sample import Sample, SampleTable
 
 class TestSample(unittest.TestCase):
 
@@ -138,3 +141,108 @@ Sample_ID,Sample_Name,Sample_Plate,Sample_Well,Sample_Barcode,R2_Barcode_Bases,I
         self.assertListEqual([s.sample_name() for s in samples], ["N1", "N2", "N3", "N4", "N5"])
         self.assertListEqual([s.get('sample_barcode') for s in samples], ["A"*8, "C"*8, "G"*8, "T"*8, "N"*8])
         self.assertEqual(samples[0].bam(dir=dir), dir / "N1_S1_L001.bam")
+
+    def test_iter_samples_from(self):
+        sample_sheet = """[Header],,,
+IEMFileVersion,4,,
+,,,
+[Data],,,
+Sample_ID,Sample_Name,Sample_Barcode,Description
+1,N1,AAAAAAAA,"first, with a comma"
+2,N2,CCCCCCCC,second
+,,,
+[Extra],,,
+3,N3,GGGGGGGG,third
+"""
+        # from a text stream, lazily
+        samples = Sample.iter_samples_from(source=io.StringIO(sample_sheet), logging=False)
+        sample = next(samples)
+        self.assertEqual(sample.sample_id(), "1")
+        self.assertEqual(sample.sample_ordinal(), 1)
+        self.assertEqual(sample.get('description'), "first, with a comma")
+        self.assertListEqual([s.sample_name() for s in samples], ["N2"])
+
+        # the samples are independent of each other
+        samples = list(Sample.iter_samples_from(source=io.StringIO(sample_sheet), logging=False))
+        self.assertIsNot(samples[0].table(), samples[1].table())
+        self.assertEqual(len(samples[1].table()), 1)
+        self.assertEqual(samples[1].sample_ordinal(), 2)
+
+        # from a path
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as fh:
+            fh.write(sample_sheet)
+        samples = list(Sample.iter_samples_from(source=Path(fh.name), logging=False))
+        self.assertListEqual([s.sample_name() for s in samples], ["N1", "N2"])
+        samples = list(Sample.iter_samples_from(source=fh.name, illumina_naming=True, logging=False))
+        self.assertEqual(samples[1].bam(dir=Path("dir")), Path("dir") / "N2_S2_L001.bam")
+
+    def test_iter_samples_from_memory_does_not_grow(self):
+        def held_after(num_rows):
+            lines = ["Sample_ID,Sample_Name,Sample_Barcode\n"] + [f"{i},N{i},ACGTACGT{i}\n" for i in range(1, num_rows + 1)]
+            source = io.StringIO(''.join(lines))
+            samples = Sample.iter_samples_from(source=source, logging=False)
+            next(samples)
+            tracemalloc.start()
+            try:
+                for _ in range(num_rows - 2):
+                    next(samples)
+                return tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+
+        self.assertLess(held_after(20000), held_after(200) + 16 * 1024)
+
+    def test_iter_samples_from_without_data_section(self):
+        with self.assertRaises(Exception):
+            list(Sample.iter_samples_from(source=io.StringIO("[Header],,\nIEMFileVersion,4,\n"), logging=False))
+        self.assertListEqual(list(Sample.iter_samples_from(source=io.StringIO(""), logging=False)), [])
+
+    def test_sample_table(self):
+        table = SampleTable(columns=['sample_id', 'sample_name', 'sample_project', 'library_id'], sample_barcode_column='sample_id')
+        self.assertEqual(table.append(['1', 'N1', 'P', 'L1']), 0)
+        self.assertEqual(table.append(['2', 'N2', 'P']), 1)
+        with self.assertRaises(AssertionError):
+            table.append(['', 'N3', 'P'])
+        with self.assertRaises(KeyError):
+            table.append(['3'])
+        self.assertEqual(len(table), 2)
+
+        first, second = table
+        self.assertFalse(hasattr(first, '__dict__'))
+        self.assertIs(first.table(), table)
+        self.assertEqual(first.sample_ordinal(), 1)
+        self.assertEqual(second.sample_ordinal(), 2)
+        self.assertEqual(first.library_id(), 'L1')
+        self.assertEqual(second.library_id(), '2')
+        self.assertEqual(second.get('sample_project'), 'P')
+        with self.assertRaises(KeyError):
+            second.get('library_id')
+        self.assertEqual(second.prefix(illumina_naming=None), '2-N2-2')
+        self.assertDictEqual(dict(second.to_dict()), {'sample_id': '2', 'sample_name': 'N2', 'sample_project': 'P'})
+        self.assertListEqual(table.column('library_id'), ['L1', None])
+        self.assertIs(table.column('sample_project')[0], table.column('sample_project')[1])
+
+        self.assertEqual(table[-1].sample_name(), 'N2')
+        self.assertListEqual([s.sample_name() for s in table[0:1]], ['N1'])
+        with self.assertRaises(IndexError):
+            table[2]
+
+    def test_unhashable_values(self):
+        sample = Sample({'sample_name' : 'name', 'sample_id' : 'id', 'lanes' : [1, 2]}, 1)
+        self.assertListEqual(sample.get('lanes'), [1, 2])
+        table = sample.table()
+        table.append(['name2', 'id2', [1, 2]])
+        self.assertListEqual(table.column('lanes'), [[1, 2], [1, 2]])
+
+    def test_samples_from_as_table(self):
+        sample_sheet = """
+Sample_ID,Sample_Name,Sample_Barcode
+1,N1,AAAAAAAA
+2,N2,CCCCCCCC
+        """
+        table = Sample.samples_from(data=sample_sheet, illumina_naming=True, logging=False, as_table=True)
+        self.assertIsInstance(table, SampleTable)
+        self.assertListEqual(table.columns(), ['sample_id', 'sample_name', 'sample_barcode'])
+        self.assertListEqual([s.sample_id() for s in table], ["1", "2"])
+        self.assertListEqual(table.column('sample_barcode'), ["AAAAAAAA", "CCCCCCCC"])
+        self.assertEqual(table[1].bam(dir=Path("dir")), Path("dir") / "N2_S2_L001.bam")
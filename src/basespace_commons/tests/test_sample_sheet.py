@@ -0,0 +1,80 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from basespace_commons.sample import Sample
+from basespace_commons.sample_sheet import SampleSheet
+
+class TestSampleSheet(unittest.TestCase):
+
+    SampleSheetData = """
+[Header],,,,,
+IEMFileVersion,4,,,,
+Investigator Name,Joe,,,,
+,,,,,
+[Reads],,,,,
+151,,,,,
+151,,,,,
+,,,,,
+[Settings],,,,,
+Adapter,AGATCGGAAGAGCACACGTCTGAACTCCAGTCA,,,,
+,,,,,
+[Data],,,,,
+Lane,Sample_ID,Sample_Name,Sample_Barcode,Sample_Project,Description
+1,S1,my_sample,AAAAAAAA,P1,
+1,S2,N2,CCCCCCCC,P1,
+2,S1,my_sample,AAAAAAAA,P1,
+2,S3,N3,GGGGGGGG,P2,third
+        """
+
+    def test_sections(self):
+        sheet = SampleSheet.from_string(TestSampleSheet.SampleSheetData)
+        self.assertListEqual(sheet.section_names(), ['Header', 'Reads', 'Settings', 'Data'])
+        self.assertEqual(sheet.header()['IEMFileVersion'], '4')
+        self.assertEqual(sheet.header()['Investigator Name'], 'Joe')
+        self.assertListEqual(sheet.reads(), [151, 151])
+        self.assertEqual(sheet.settings()['Adapter'], 'AGATCGGAAGAGCACACGTCTGAACTCCAGTCA')
+        self.assertListEqual(sheet.section('Reads'), [['151'], ['151']])
+        self.assertEqual(len(sheet), 4)
+        self.assertListEqual([s.sample_id() for s in sheet.samples()], ['S1', 'S2', 'S1', 'S3'])
+        self.assertEqual(sheet.samples()[0].get('description'), '')
+        self.assertEqual(sheet.samples()[3].get('description'), 'third')
+
+    def test_same_samples_as_samples_from(self):
+        sheet = SampleSheet.from_string(TestSampleSheet.SampleSheetData, sample_barcode_column='sample_barcode')
+        samples = Sample.samples_from(data=TestSampleSheet.SampleSheetData, sample_barcode_column='sample_barcode', logging=False)
+        self.assertListEqual([s.to_dict() for s in sheet.samples()], [s.to_dict() for s in samples])
+        self.assertListEqual([s.sample_ordinal() for s in sheet.samples()], [s.sample_ordinal() for s in samples])
+
+    def test_indexes(self):
+        sheet = SampleSheet.from_string(TestSampleSheet.SampleSheetData)
+        self.assertListEqual([s.get('lane') for s in sheet.by_sample_id('S1')], ['1', '2'])
+        self.assertListEqual(sheet.by_sample_id('missing'), [])
+        self.assertListEqual([s.sample_id() for s in sheet.by_sample_name('my_sample')], ['S1', 'S1'])
+        self.assertListEqual([s.sample_id() for s in sheet.by_sample_name('my-sample')], ['S1', 'S1'])
+        self.assertListEqual([s.sample_id() for s in sheet.by_lane('2')], ['S1', 'S3'])
+        self.assertListEqual([s.sample_id() for s in sheet.by_project('P1')], ['S1', 'S2', 'S1'])
+        self.assertListEqual(sheet.lanes(), ['1', '2'])
+        self.assertListEqual(sheet.projects(), ['P1', 'P2'])
+        self.assertListEqual([[s.sample_id() for s in samples] for samples in sheet.samples_by_lane().values()], [['S1', 'S2'], ['S1', 'S3']])
+        self.assertEqual(sheet.lookup('S1', lane='2').get('lane'), '2')
+        self.assertIsNone(sheet.lookup('S2', lane='2'))
+
+    def test_simple_csv(self):
+        sheet = SampleSheet.from_string("Sample_ID,Sample_Name\n1,N1\n2,N2\n")
+        self.assertListEqual(sheet.section_names(), ['Data'])
+        self.assertListEqual(sheet.lanes(), [])
+        self.assertEqual(sheet.lookup('2').sample_name(), 'N2')
+        self.assertDictEqual(dict(sheet.header()), {})
+
+    def test_read(self):
+        path = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.sample_sheet')) / 'SampleSheet.csv'
+        path.write_text(TestSampleSheet.SampleSheetData)
+        self.assertEqual(len(SampleSheet.read(path)), 4)
+        self.assertEqual(len(SampleSheet.read(str(path))), 4)
+        with self.assertRaises(Exception):
+            SampleSheet.read(io.StringIO("[Header],,\nIEMFileVersion,4,\n"))
+
+if __name__ == '__main__':
+    unittest.main()
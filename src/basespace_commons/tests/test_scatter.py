@@ -0,0 +1,83 @@
+import gzip
+import zlib
+import struct
+import unittest
+
+from basespace_commons.scatter import bgzf_shards, gather, is_bgzf, read_bgzf_range, scatter_fastqs
+from basespace_commons.tests import test_environment
+
+def records(lane, end, num_records):
+    return b''.join(f'@L{lane}q{i}/{end}\nACGT\n+\nFFFF\n'.encode('ascii') for i in range(num_records))
+
+def bgzf(data, block_size):
+    blocks = []
+    for i in range(0, len(data), block_size):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        chunk = data[i:i + block_size]
+        deflated = compressor.compress(chunk) + compressor.flush()
+        header = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00' + struct.pack('<H', 18 + len(deflated) + 8 - 1)
+        blocks.append(header + deflated + struct.pack('<II', zlib.crc32(chunk), len(chunk)))
+    eof = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+    return b''.join(blocks) + eof
+
+class TestScatter(unittest.TestCase):
+
+    @staticmethod
+    def write_sample(env, lanes, num_records, compress):
+        sample_dir = env.root_dir() / 'input' / 'samples' / 'id1'
+        sample_dir.mkdir(parents=True, exist_ok=True)
+        for lane in lanes:
+            for end in [1, 2]:
+                path = sample_dir / f'name1_S1_L00{lane}_R{end}_001.fastq.gz'
+                path.write_bytes(compress(records(lane, end, num_records)))
+
+    def test_scatter_fastqs(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        TestScatter.write_sample(env, lanes=[1, 2], num_records=10, compress=gzip.compress)
+        shards = scatter_fastqs(env, sample_idx=0, num_shards=3, exact=True)
+        self.assertListEqual([s.records for s in shards], [6, 7, 7])
+        self.assertListEqual([s.first_record for s in shards], [0, 6, 13])
+        self.assertEqual(shards[0].fastq_r1, env.tmp_dir() / 'scatter' / 'name1' / 'shard-0000_R1_001.fastq.gz')
+        expected = records(1, 1, 10) + records(2, 1, 10)
+        self.assertEqual(b''.join(gzip.decompress(s.fastq_r1.read_bytes()) for s in shards), expected)
+        for shard in shards:
+            names_r1 = gzip.decompress(shard.fastq_r1.read_bytes()).split(b'\n')[0::4]
+            names_r2 = gzip.decompress(shard.fastq_r2.read_bytes()).split(b'\n')[0::4]
+            self.assertListEqual([n[:-2] for n in names_r1], [n[:-2] for n in names_r2])
+
+        # gather the shards back into the output directory
+        merged = gather(env, 'name1', [s.fastq_r1 for s in shards], 'name1_R1_001.fastq.gz')
+        self.assertEqual(merged, env.output_sample_dir('name1') / 'name1_R1_001.fastq.gz')
+        self.assertEqual(gzip.decompress(merged.read_bytes()), expected)
+
+    def test_scatter_fastqs_mismatched_pairs(self):
+        env, root_dir = test_environment.TestEnvironment.build_default()
+        TestScatter.write_sample(env, lanes=[1], num_records=10, compress=gzip.compress)
+        (root_dir / 'input' / 'samples' / 'id1' / 'name1_S1_L001_R2_001.fastq.gz').write_bytes(gzip.compress(records(1, 2, 9)))
+        with self.assertRaises(Exception):
+            scatter_fastqs(env, sample_idx=0, num_shards=2, exact=True)
+
+    def test_bgzf_shards(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        TestScatter.write_sample(env, lanes=[1, 2], num_records=25, compress=lambda data: bgzf(data, block_size=50))
+        fastqs_r1, _ = env.input_sample_fastqs(sample_idx=0)
+        self.assertTrue(is_bgzf(fastqs_r1[0]))
+
+        for num_shards in [1, 3, 4, 50]:
+            shards = bgzf_shards(env, sample_idx=0, num_shards=num_shards)
+            self.assertEqual(sum(s.records for s in shards), 50)
+            for end in [1, 2]:
+                data = [b''.join(b''.join(read_bgzf_range(r)) for r in (s.r1 if end == 1 else s.r2)) for s in shards]
+                self.assertEqual(b''.join(data), records(1, end, 25) + records(2, end, 25))
+                self.assertListEqual([d.count(b'\n') // 4 for d in data], [s.records for s in shards])
+                for d in data:
+                    self.assertTrue(len(d) == 0 or d.startswith(b'@L'))
+
+    def test_bgzf_shards_not_bgzf(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        TestScatter.write_sample(env, lanes=[1], num_records=5, compress=gzip.compress)
+        with self.assertRaises(Exception):
+            bgzf_shards(env, sample_idx=0, num_shards=2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+
+from basespace_commons.scratch import ScratchManager, disk_usage
+from basespace_commons.tests import test_environment
+
+class TestScratch(unittest.TestCase):
+
+    def test_workspace(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        scratch = ScratchManager(env=env)
+        with scratch.workspace(sample_name='name1', step='align') as path:
+            self.assertEqual(path, env.tmp_dir() / 'workspaces' / 'name1' / 'align')
+            self.assertTrue(path.is_dir())
+            (path / 'out.bam').write_bytes(b'0' * 100)
+            self.assertEqual(scratch.used_bytes(), 0)
+        self.assertEqual(scratch.used_bytes(), 100)
+        self.assertEqual(disk_usage(path), 100)
+
+    def test_quota_evicts_least_recently_used(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        scratch = ScratchManager(env=env, quota_bytes=250)
+        for step in ['a', 'b', 'c']:
+            with scratch.workspace(sample_name='name1', step=step) as path:
+                (path / 'out').write_bytes(b'0' * 100)
+        self.assertEqual(scratch.used_bytes(), 200)
+        self.assertListEqual([p.name for p in scratch.workspaces()], ['b', 'c'])
+        self.assertFalse((env.tmp_dir() / 'workspaces' / 'name1' / 'a').exists())
+
+        # touching b makes c the least recently used
+        scratch.touch(sample_name='name1', step='b')
+        with scratch.workspace(sample_name='name2', step='a') as path:
+            (path / 'out').write_bytes(b'0' * 100)
+        self.assertListEqual([str(p.relative_to(scratch.root())) for p in scratch.workspaces()], ['name1/b', 'name2/a'])
+
+    def test_quota_keeps_in_use_and_non_reclaimable(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        scratch = ScratchManager(env=env, quota_bytes=150)
+        with scratch.workspace(sample_name='name1', step='final', reclaimable=False) as path:
+            (path / 'out').write_bytes(b'0' * 100)
+        in_use = scratch.acquire(sample_name='name1', step='tmp')
+        (in_use / 'out').write_bytes(b'0' * 100)
+        with scratch.workspace(sample_name='name2', step='a') as path:
+            (path / 'out').write_bytes(b'0' * 100)
+        self.assertListEqual([p.name for p in scratch.workspaces()], ['final', 'tmp'])
+        self.assertEqual(scratch.release(sample_name='name1', step='tmp'), 100)
+        self.assertListEqual([p.name for p in scratch.workspaces()], ['final'])
+
+    def test_reservation(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        scratch = ScratchManager(env=env, quota_bytes=150)
+        with scratch.workspace(sample_name='name1', step='a') as path:
+            (path / 'out').write_bytes(b'0' * 100)
+        with scratch.workspace(sample_name='name2', step='a', reserve_bytes=100):
+            self.assertListEqual([p.parent.name for p in scratch.workspaces()], ['name2'])
+            self.assertEqual(scratch.used_bytes(), 100)
+            with self.assertRaises(Exception):
+                scratch.acquire(sample_name='name2', step='b', reserve_bytes=100)
+            self.assertListEqual([p.name for p in scratch.workspaces()], ['a'])
+        self.assertEqual(scratch.used_bytes(), 0)
+
+    def test_failed_reservation_evicts_nothing(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        scratch = ScratchManager(env=env, quota_bytes=300)
+        with scratch.workspace(sample_name='name1', step='a') as path:
+            (path / 'out').write_bytes(b'0' * 100)
+        with scratch.workspace(sample_name='name1', step='b', reclaimable=False) as path:
+            (path / 'out').write_bytes(b'0' * 100)
+        with self.assertRaises(Exception):
+            scratch.acquire(sample_name='name2', step='a', reserve_bytes=250)
+        self.assertListEqual([p.name for p in scratch.workspaces()], ['a', 'b'])
+        self.assertTrue((scratch.root() / 'name1' / 'a' / 'out').exists())
+        self.assertEqual(scratch.used_bytes(), 200)
+
+        # a reservation that fits once the reclaimable workspace is evicted
+        scratch.acquire(sample_name='name2', step='a', reserve_bytes=200)
+        self.assertListEqual([str(p.relative_to(scratch.root())) for p in scratch.workspaces()], ['name1/b', 'name2/a'])
+        self.assertFalse((scratch.root() / 'name1' / 'a').exists())
+
+    def test_failed_reservation_on_workspace_in_use(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        scratch = ScratchManager(env=env, quota_bytes=150)
+        scratch.acquire(sample_name='name1', step='a', reserve_bytes=100)
+        with self.assertRaises(Exception):
+            scratch.acquire(sample_name='name1', step='a', reclaimable=False, reserve_bytes=100)
+        self.assertEqual(scratch.used_bytes(), 100)
+
+        # the workspace is still in use, with only the first reservation
+        with scratch.workspace(sample_name='name2', step='a', reserve_bytes=50):
+            self.assertEqual(scratch.used_bytes(), 150)
+        scratch.release(sample_name='name1', step='a')
+        self.assertEqual(scratch.used_bytes(), 0)
+
+        # the failed call did not make the workspace non-reclaimable
+        with scratch.workspace(sample_name='name2', step='a') as path:
+            (path / 'out').write_bytes(b'0' * 200)
+        self.assertListEqual([str(p.relative_to(scratch.root())) for p in scratch.workspaces()], [])
+
+    def test_complete_sample(self):
+        env, _ = test_environment.TestEnvironment.build_default()
+        scratch = ScratchManager(env=env)
+        for sample_name in ['name1', 'name2']:
+            with scratch.workspace(sample_name=sample_name, step='a') as path:
+                (path / 'out').write_bytes(b'0' * 100)
+        scratch.complete_sample(sample_name='name1')
+        self.assertFalse((scratch.root() / 'name1').exists())
+        self.assertListEqual([p.parent.name for p in scratch.workspaces()], ['name2'])
+        self.assertEqual(scratch.used_bytes(), 100)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+from basespace_commons.environment import Environment
+from basespace_commons.sharding import ShardPlan
+
+class TestSharding(unittest.TestCase):
+
+    @staticmethod
+    def build_env(num_samples):
+        root_dir = Path(tempfile.mkdtemp(prefix='tmp.', suffix='.root_dir')).resolve()
+        env = Environment(
+                app_option_dict = {},
+                sample_ids = [f'id{i}' for i in range(num_samples)],
+                sample_names = [f'name{i}' for i in range(num_samples)],
+                output_project_id = 'output_project_id',
+                output_project_name = 'output_project_name',
+                app_result_name = 'app_result_name',
+                root_dir = root_dir
+                )
+        return env
+
+    def test_plan_lpt(self):
+        env = TestSharding.build_env(6)
+        plan = ShardPlan.plan(env=env, num_shards=2, costs=[50, 10, 10, 10, 10, 10])
+        self.assertEqual(plan.num_shards(), 2)
+        self.assertListEqual(plan.shard(0).sample_indexes, [0])
+        self.assertListEqual(plan.shard(1).sample_indexes, [1, 2, 3, 4, 5])
+        self.assertEqual(plan.makespan(), 50)
+        self.assertEqual(plan.shard_of(3), 1)
+        self.assertEqual(plan.cost(0), 50)
+        self.assertListEqual(plan.samples_for(0), [(0, 'name0', 'id0')])
+
+        plan = ShardPlan.plan(env=env, num_shards=3, costs=[7, 5, 4, 3, 3, 2])
+        self.assertListEqual([s.cost for s in plan.shards()], [9, 8, 7])
+        self.assertListEqual(sorted(i for s in plan.shards() for i in s.sample_indexes), list(range(6)))
+
+    def test_plan_more_shards_than_samples(self):
+        plan = ShardPlan.plan(env=TestSharding.build_env(2), num_shards=4, costs=[1, 2])
+        self.assertListEqual([s.sample_indexes for s in plan.shards()], [[1], [0], [], []])
+
+    def test_plan_by_input_bytes(self):
+        env = TestSharding.build_env(3)
+        for sample_idx, size in enumerate([100, 300, 150]):
+            sample_name, sample_id = env.sample_name_and_id(sample_idx)
+            sample_dir = env.root_dir() / 'input' / 'samples' / sample_id
+            sample_dir.mkdir(parents=True)
+            (sample_dir / (sample_name + Environment.fq_ext(end=1))).write_bytes(b'A' * size)
+            (sample_dir / (sample_name + Environment.fq_ext(end=2))).write_bytes(b'A' * size)
+        self.assertListEqual(ShardPlan.input_bytes(env=env), [200, 600, 300])
+        plan = ShardPlan.plan(env=env, num_shards=2)
+        self.assertListEqual([s.sample_indexes for s in plan.shards()], [[1], [0, 2]])
+
+        # missing inputs
+        with self.assertRaises(Exception):
+            ShardPlan.plan(env=TestSharding.build_env(1), num_shards=2)
@@ -0,0 +1,86 @@
+import os
+import unittest
+
+from basespace_commons.environment import Environment
+from basespace_commons.tests import test_environment
+
+class TestTracker(unittest.TestCase):
+
+    @staticmethod
+    def build():
+        env, root_dir = test_environment.TestEnvironment.build_default()
+        for sample_name, sample_id in env.sample_names_and_ids():
+            sample_dir = root_dir / 'input' / 'samples' / sample_id
+            sample_dir.mkdir(parents=True)
+            for end in [1, 2]:
+                (sample_dir / (sample_name + Environment.fq_ext(end=end))).write_text(f'{sample_name} {end}')
+        env.make_output_sample_dirs(['name1', 'name2'])
+        return env
+
+    def test_mark_complete_and_status(self):
+        env = TestTracker.build()
+        tracker = env.run_tracker()
+        bam = env.output_sample_dir('name1') / 'name1.bam'
+
+        self.assertEqual(tracker.status(0, 'align', outputs=[bam]).reason, 'not complete')
+        with self.assertRaises(FileNotFoundError):
+            tracker.mark_complete(0, 'align', outputs=[bam])
+        bam.write_text('bam')
+        marker = tracker.mark_complete(0, 'align', outputs=[bam])
+        self.assertEqual(marker, env.tmp_dir() / 'run_state' / 'name1' / 'align.json')
+        self.assertFalse(tracker.status(0, 'align', outputs=[bam]).stale)
+        self.assertTrue(tracker.status(0, 'sort', outputs=[bam]).stale)
+
+        # output changed, then removed
+        bam.write_text('changed bam')
+        os.utime(str(bam), ns=(0, 12345))
+        self.assertEqual(tracker.status(0, 'align', outputs=[bam]).reason, f'output changed: {bam}')
+        bam.unlink()
+        self.assertEqual(tracker.status(0, 'align', outputs=[bam]).reason, f'output missing: {bam}')
+
+        # input changed
+        bam.write_text('bam')
+        tracker.mark_complete(0, 'align', outputs=[bam])
+        fastq = env.input_sample_fastqs(0)[0][0]
+        fastq.write_text('new data')
+        os.utime(str(fastq), ns=(0, 12345))
+        self.assertEqual(tracker.status(0, 'align', outputs=[bam]).reason, 'inputs changed')
+
+        # an output recorded but no longer expected
+        bai = env.output_sample_dir('name1') / 'name1.bai'
+        bai.write_text('bai')
+        tracker.mark_complete(0, 'align', outputs=[bam, bai])
+        self.assertFalse(tracker.status(0, 'align', outputs=[bai, bam]).stale)
+        self.assertEqual(tracker.status(0, 'align', outputs=[bam]).reason, f'output no longer expected: {bai}')
+
+        tracker.mark_complete(0, 'align', outputs=[bam])
+        tracker.invalidate(0)
+        self.assertEqual(tracker.status(0, 'align', outputs=[bam]).reason, 'not complete')
+
+    def test_stale_samples(self):
+        env = TestTracker.build()
+        tracker = env.run_tracker(state_dir=env.root_dir() / 'state')
+
+        def outputs(sample_idx):
+            sample_name, _ = env.sample_name_and_id(sample_idx)
+            return [env.output_sample_dir(sample_name) / f'{sample_name}.txt']
+
+        self.assertListEqual([s.sample_idx for s in tracker.stale_samples('count', outputs=outputs, workers=2)], [0, 1])
+        outputs(1)[0].write_text('count')
+        tracker.mark_complete(1, 'count', outputs=outputs(1))
+        self.assertTrue((env.root_dir() / 'state' / 'name2' / 'count.json').exists())
+        stale = tracker.stale_samples('count', outputs=outputs, workers=2)
+        self.assertListEqual([(s.sample_name, s.reason) for s in stale], [('name1', 'not complete')])
+
+        # custom inputs
+        other = env.root_dir() / 'other.txt'
+        other.write_text('other')
+        tracker.mark_complete(0, 'other', outputs=[], inputs=[other])
+        self.assertListEqual(tracker.stale_samples('other', outputs=lambda i: [], inputs=lambda i: [other], sample_indexes=[0]), [])
+        other.unlink()
+        self.assertTrue(tracker.status(0, 'other', outputs=[], inputs=[other]).reason.startswith('inputs not found'))
+        with self.assertRaises(TypeError):
+            tracker.status(0, 'other', outputs=[], inputs=5)
+
+if __name__ == '__main__':
+    unittest.main()
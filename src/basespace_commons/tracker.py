@@ -0,0 +1,179 @@
+"""This module implements tracking which samples' steps are complete and up to date, so that a
+run can be resumed.
+
+* RunTracker records the inputs and outputs of each completed step per sample, and finds stale samples
+"""
+
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, NamedTuple, Optional, Sequence
+from pathlib import Path
+from basespace_commons.environment import Environment, EnvironmentDefaults
+
+
+class Fingerprint(NamedTuple):
+    """ The path, size and modification time of a file. """
+    path: str
+    size: int
+    mtime_ns: int
+
+
+class StepStatus(NamedTuple):
+    """ Whether a step for a sample is stale (must be re-run), and why. """
+    sample_idx: int
+    sample_name: str
+    step: str
+    stale: bool
+    reason: Optional[str]
+
+
+def fingerprint(paths: Iterable[Path]) -> List[Fingerprint]:
+    """ Fingerprints the given files.  Raises an exception if a file does not exist. """
+    fingerprints = []
+    for path in paths:
+        st = os.stat(str(path))
+        fingerprints.append(Fingerprint(path=str(path), size=st.st_size, mtime_ns=st.st_mtime_ns))
+    return fingerprints
+
+
+class RunTracker(object):
+    """
+    Tracks the completion of each step (ex. 'align') for each sample.  When a step completes, a
+    marker is written recording the fingerprints (see Fingerprint) of the step's inputs (by default
+    the sample's input FASTQs; see Environment.input_sample_fastqs()) and outputs (ex. from
+    Sample.bam() or Sample.fq()), at <state-dir>/<sample-name>/<step>.json.  The state directory
+    is <tmp-dir>/run_state by default.
+
+    A step for a sample is stale if it has no marker, its inputs have changed (been added, removed
+    or modified), its outputs are missing or have changed since the marker was written, or the
+    outputs expected now are not the same as those recorded.
+    """
+
+    MarkerVersion = 1
+
+    def __init__(self, env: Environment, state_dir: Optional[Path]=None):
+        """ Creates a new tracker for the given environment. """
+        self.__env: Environment = env
+        self.__state_dir: Path = state_dir if state_dir is not None else env.tmp_dir() / 'run_state'
+
+    def state_dir(self) -> Path:
+        """ The directory containing the completion markers. """
+        return self.__state_dir
+
+    def marker(self, sample_idx: int, step: str) -> Path:
+        """ The path to the completion marker for the given step for the ith sample. """
+        return self.__sample_state_dir(sample_idx=sample_idx) / f'{step}.json'
+
+    def __sample_state_dir(self, sample_idx: int) -> Path:
+        """ The directory containing the completion markers for the ith sample. """
+        sample_name, _ = self.__env.sample_name_and_id(sample_idx)
+        return self.__state_dir / sample_name
+
+    def __inputs(self, sample_idx: int, inputs: Optional[Sequence[Path]]) -> Sequence[Path]:
+        """ The given inputs, or the input FASTQs for the ith sample by default. """
+        if inputs is not None:
+            return inputs
+        fastqs_r1, fastqs_r2 = self.__env.input_sample_fastqs(sample_idx=sample_idx)
+        return fastqs_r1 + fastqs_r2
+
+    def mark_complete(self, sample_idx: int, step: str, outputs: Sequence[Path], inputs: Optional[Sequence[Path]]=None) -> Path:
+        """
+        Records that the given step for the ith sample is complete, fingerprinting its inputs and
+        outputs, all of which must exist.  Returns the path to the marker.
+        """
+        sample_name, sample_id = self.__env.sample_name_and_id(sample_idx)
+        data = {
+            'version': RunTracker.MarkerVersion,
+            'sample_id': sample_id,
+            'inputs': [list(f) for f in fingerprint(self.__inputs(sample_idx=sample_idx, inputs=inputs))],
+            'outputs': [list(f) for f in fingerprint(outputs)]
+        }
+        path = self.marker(sample_idx=sample_idx, step=step)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        with tmp_path.open('w') as fh:
+            json.dump(data, fh)
+        os.replace(str(tmp_path), str(path))
+        return path
+
+    def invalidate(self, sample_idx: int, step: Optional[str]=None) -> None:
+        """ Removes the completion marker for the given step, or all steps, for the ith sample. """
+        if step is not None:
+            markers = [self.marker(sample_idx=sample_idx, step=step)]
+        else:
+            sample_dir = self.__sample_state_dir(sample_idx=sample_idx)
+            markers = list(sample_dir.glob('*.json')) if sample_dir.is_dir() else []
+        for marker in markers:
+            if marker.exists():
+                marker.unlink()
+
+    def status(self, sample_idx: int, step: str, outputs: Sequence[Path], inputs: Optional[Sequence[Path]]=None) -> StepStatus:
+        """ Gets whether the given step for the ith sample is stale, and why. """
+        sample_name, sample_id = self.__env.sample_name_and_id(sample_idx)
+
+        def status(reason: Optional[str]) -> StepStatus:
+            return StepStatus(sample_idx=sample_idx, sample_name=sample_name, step=step, stale=reason is not None, reason=reason)
+
+        try:
+            with self.marker(sample_idx=sample_idx, step=step).open('r') as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return status("not complete")
+        if data.get('version') != RunTracker.MarkerVersion or data.get('sample_id') != sample_id:
+            return status("not complete")
+
+        if inputs is None:
+            # NB: the environment raises a plain Exception when the input FASTQs cannot be found
+            try:
+                inputs = self.__inputs(sample_idx=sample_idx, inputs=None)
+            except Exception as e:
+                return status(f"inputs not found: {e}")
+        try:
+            current_inputs = fingerprint(inputs)
+        except OSError as e:
+            return status(f"inputs not found: {e}")
+        if current_inputs != [Fingerprint(*f) for f in data['inputs']]:
+            return status("inputs changed")
+
+        recorded_outputs = {f[0]: Fingerprint(*f) for f in data['outputs']}
+        expected_outputs = set(str(output) for output in outputs)
+        for output in sorted(set(recorded_outputs.keys()) - expected_outputs):
+            return status(f"output no longer expected: {output}")
+        for output in outputs:
+            recorded = recorded_outputs.get(str(output))
+            if recorded is None:
+                return status(f"output not recorded: {output}")
+            try:
+                current = fingerprint([output])[0]
+            except FileNotFoundError:
+                return status(f"output missing: {output}")
+            if current != recorded:
+                return status(f"output changed: {output}")
+        return status(None)
+
+    def stale_samples(self,
+                      step: str,
+                      outputs: Callable[[int], Sequence[Path]],
+                      inputs: Optional[Callable[[int], Sequence[Path]]]=None,
+                      sample_indexes: Optional[Iterable[int]]=None,
+                      workers: int=EnvironmentDefaults.DefaultIoWorkers) -> List[StepStatus]:
+        """
+        Gets the status of the given step for every sample (or only those with the given indexes)
+        that is stale, in sample order.  The expected outputs (and inputs, if not the input FASTQs)
+        for each sample are given by calling the given functions with the sample index.  The samples
+        are checked concurrently on a pool of at most the given number of threads.
+        """
+        assert workers > 0, f"workers must be greater than zero, was {workers}"
+        if sample_indexes is None:
+            sample_indexes = range(self.__env.num_samples())
+        sample_indexes = list(sample_indexes)
+        if not sample_indexes:
+            return []
+
+        def get_status(sample_idx: int) -> StepStatus:
+            return self.status(sample_idx=sample_idx, step=step, outputs=outputs(sample_idx),
+                               inputs=None if inputs is None else inputs(sample_idx))
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(sample_indexes))) as executor:
+            return [s for s in executor.map(get_status, sample_indexes) if s.stale]